@@ -26,6 +26,86 @@ static uint32_t spi_flash_read(uint32_t addr) {
 
     return csr_read_simple(CSR_SPIFLASH_SPI_MISO_ADDR + 4);
 }
+
+static uint32_t spi_flash_read_word(uint32_t addr) {
+    // select
+    spiflash_spi_cs_write(1);
+
+    // set mosi, the command and address then 32 bits of data
+    csr_write_simple((0x03<<24) | addr, CSR_SPIFLASH_SPI_MOSI_ADDR);
+    csr_write_simple(0, CSR_SPIFLASH_SPI_MOSI_ADDR + 4);
+
+    // transfer
+    spiflash_spi_control_write((64 << 8) | 1);
+
+    while (!(spiflash_spi_status_read() & 1)) {
+    }
+
+    // big endian, first byte in the top bits
+    return csr_read_simple(CSR_SPIFLASH_SPI_MISO_ADDR + 4);
+}
+
+#define CONFIG_MAGIC 0x52373543 // "R75C"
+#define CONFIG_VERSION 1
+#define IMAGE_REPLICATE 1
+#define PANEL_WORDS (64*48)
+
+static void load_boot_image(uint32_t config_idx, uint32_t words, uint32_t addr, uint32_t flags) {
+#ifdef CSR_DRAM_WRITER_BASE
+    dram_writer_address_write(addr);
+    for (uint32_t i = 0; i < words; i += 2) {
+        uint64_t data = spi_flash_read_word(config_idx + 4);
+        data = (data << 32) | spi_flash_read_word(config_idx);
+        config_idx += 8;
+        dram_writer_data_write(data);
+    }
+#endif
+
+#ifdef CSR_BLIT_BASE
+    if (flags & IMAGE_REPLICATE) {
+        // copy the first panel over the rest of the bank
+        blit_src_write(addr);
+        blit_dst_write(addr + PANEL_WORDS);
+        blit_width_write(PANEL_WORDS);
+        blit_height_write(15);
+        blit_src_stride_write(0);
+        blit_dst_stride_write(PANEL_WORDS);
+        blit_start_write(1);
+
+        while (blit_busy_read()) {
+        }
+    }
+#endif
+}
+
+static void load_extended_config(uint32_t config_idx) {
+    if (spi_flash_read_word(config_idx) != CONFIG_MAGIC) {
+        return;
+    }
+
+    uint32_t header = spi_flash_read_word(config_idx + 4);
+    if ((header >> 24) != CONFIG_VERSION) {
+        return;
+    }
+    uint32_t preset_count = (header >> 16) & 0xff;
+    uint32_t image_flags = header & 0xffff;
+    uint32_t image_words = spi_flash_read_word(config_idx + 8);
+    uint32_t image_addr = spi_flash_read_word(config_idx + 12);
+
+    uint32_t preset_idx = config_idx + 16;
+    uint32_t image_idx = preset_idx + preset_count * 8;
+
+    if (image_words) {
+        load_boot_image(image_idx, image_words, image_addr, image_flags);
+    }
+
+    for (uint32_t i = 0; i < preset_count; i++) {
+        uint32_t addr = spi_flash_read_word(preset_idx);
+        uint32_t value = spi_flash_read_word(preset_idx + 4);
+        preset_idx += 8;
+        csr_write_simple(value, addr);
+    }
+}
 #endif
 
 
@@ -62,6 +142,11 @@ int main(int i, char **c)
 
     sdram_init();
 
+#ifdef CSR_SPIFLASH_SPI_MOSI_ADDR
+    // The boot image needs DRAM, so this comes after sdram_init.
+    load_extended_config(config_idx);
+#endif
+
     while(1) {
     }
 
@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from csr_mixin import CSRMixin
+
+
+class AnimationSequencer(Module, CSRMixin):
+    '''
+    Steps the controller's base address through a ring of banks.
+
+    Bank i is at first_addr + i*stride. Each bank is shown for interval
+    frames, then the next one is staged. At the end of the ring it goes
+    back to the first bank if loop is set, or stays on the last one.
+    '''
+    def __init__(self, controller, stride=48*64*16, with_csr=False):
+        # Interface
+        self.enable = Signal()
+        self.first_addr = Signal(32)
+        self.stride = Signal(32, reset=stride)
+        self.count = Signal(8, reset=1)
+        self.interval = Signal(16, reset=1)
+        self.loop = Signal(reset=1)
+
+        self.index = Signal(8)
+        self.done = Signal()
+
+        # State
+        addr = Signal(32)
+        frames = Signal(16)
+
+        controller.add_addr_source(self.enable, addr)
+
+        # Only frames that show the staged bank count towards its
+        # interval. A bank is staged while the frame before it is shown,
+        # and the first one after being enabled can come a frame late.
+        shown = Signal()
+        self.comb += shown.eq(controller.current_addr == addr)
+
+        self.sync += If(~self.enable,
+            self.index.eq(0),
+            self.done.eq(0),
+            addr.eq(self.first_addr),
+            frames.eq(0),
+        ).Elif(controller.frame_start & shown & ~self.done,
+            If(frames >= self.interval - 1,
+                frames.eq(0),
+                If(self.index >= self.count - 1,
+                    If(self.loop,
+                        self.index.eq(0),
+                        addr.eq(self.first_addr),
+                    ).Else(
+                        self.done.eq(1),
+                    ),
+                ).Else(
+                    self.index.eq(self.index+1),
+                    addr.eq(addr + self.stride),
+                ),
+            ).Else(
+                frames.eq(frames+1),
+            ),
+        )
+
+        if with_csr:
+            self.add_csrs()
+
+    def add_csrs(self):
+        self.add_storage_csrs(
+            'enable',
+            'first_addr',
+            'stride',
+            'count',
+            'interval',
+            'loop',
+        )
+        self.add_status_csrs('index', 'done')
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates AnimationSequencer stepping the display through a ring of
+banks, looping and then one-shot, and checks the base address of every
+frame shown: each bank for interval frames, in order, the last bank held
+after a one-shot, and base_addr again once it is disabled.
+
+The display is the real Hub75Controller with stand-ins for the driver
+and row filler.
+'''
+
+import argparse
+
+from migen import *
+
+from animation_sequencer import AnimationSequencer
+from bench_time_sync import DriverModel, FillerModel
+from hub75_controller import Hub75Controller
+from udp_dram_writer import BANK_SIZE
+
+
+class Bench(Module):
+    def __init__(self, row_cycles):
+        self.submodules.controller = Hub75Controller(
+            DriverModel(row_cycles // 2), FillerModel(row_cycles // 2))
+        self.submodules.animation = AnimationSequencer(self.controller)
+        self.comb += [
+            self.controller.enable.eq(1),
+            self.controller.cycle_length.eq(row_cycles),
+        ]
+
+
+def expected_frames(first_bank, count, interval, loop, frames):
+    banks = []
+    for frame in range(frames):
+        step = frame // interval
+        if loop:
+            step %= count
+        else:
+            step = min(step, count - 1)
+        banks.append(first_bank + step)
+    return [bank * BANK_SIZE for bank in banks]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--row-cycles', type=int, default=100)
+    parser.add_argument('--first-bank', type=int, default=2)
+    parser.add_argument('--count', type=int, default=3)
+    parser.add_argument('--interval', type=int, default=2)
+    parser.add_argument('--frames', type=int, default=14, help="Frames to watch in each mode")
+    args = parser.parse_args()
+
+    bench = Bench(args.row_cycles)
+    controller = bench.controller
+    animation = bench.animation
+    shown = {}
+
+    def watch(frames):
+        addrs = []
+        while len(addrs) < frames:
+            if (yield controller.frame_start):
+                addrs.append((yield controller.current_addr))
+            yield
+        return addrs
+
+    def gen():
+        yield controller.base_addr.eq(0x1000)
+        yield animation.first_addr.eq(args.first_bank * BANK_SIZE)
+        yield animation.count.eq(args.count)
+        yield animation.interval.eq(args.interval)
+        for loop in (True, False):
+            yield animation.loop.eq(loop)
+            if loop:
+                # Enabled as a frame starts, so the first bank is staged
+                # in time for the next frame.
+                yield from watch(1)
+            else:
+                # Enabled during the last row, when the next frame's
+                # first row is already filled from base_addr.
+                yield from watch(1)
+                rows = 1
+                while rows < 32:
+                    if (yield controller.row_start):
+                        rows += 1
+                    yield
+            yield animation.enable.eq(1)
+            addrs = yield from watch(args.frames + 1)
+            # Base addresses shown before the first bank.
+            shown[loop, 'late'] = addrs.index(args.first_bank * BANK_SIZE)
+            shown[loop] = addrs[shown[loop, 'late']:][:args.frames]
+            shown[loop, 'done'] = yield animation.done
+            yield animation.enable.eq(0)
+            yield from watch(1)
+            shown[loop, 'off'] = yield from watch(2)
+
+    run_simulation(bench, gen())
+
+    for loop in (True, False):
+        mode = 'loop' if loop else 'one-shot'
+        banks = [addr // BANK_SIZE for addr in shown[loop]]
+        print(
+            f'{mode}: banks {banks}, done {shown[loop, "done"]}, '
+            f'{shown[loop, "late"]} frames of base_addr first'
+        )
+        expected = expected_frames(
+            args.first_bank, args.count, args.interval, loop, args.frames)
+        if shown[loop, 'late'] > 1 or shown[loop] != expected:
+            raise SystemExit(f'{mode}: expected banks {[a // BANK_SIZE for a in expected]}')
+        if shown[loop, 'done'] != (not loop and args.frames > args.count * args.interval):
+            raise SystemExit(f'{mode}: done is wrong')
+        if shown[loop, 'off'] != [0x1000, 0x1000]:
+            raise SystemExit(f'{mode}: disabling did not go back to base_addr')
+
+
+if __name__ == '__main__':
+    main()
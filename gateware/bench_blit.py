@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates BlitEngine copying a strided block through the litedram
+controller and an SDRAM model, with a reader competing for the SDRAM, as
+the row filler does. As soon as done is set the destination is read back
+through another port and checked, words either side of each row
+included, so done is only trusted if the copy can already be seen.
+
+It reports the cycles from start to done, and from the controller taking
+the last write to done.
+'''
+
+import argparse
+
+from migen import *
+
+from litedram.core import LiteDRAMCore
+from litedram.frontend.dma import LiteDRAMDMAReader, LiteDRAMDMAWriter
+from litedram.phy import HalfRateGENSDRPHY
+from litedram.phy.model import SDRAMPHYModel
+
+from bench_row_buffers import SDRAMPads
+from bench_udp_ingest import SYS_CLK_FREQ, SmallM12L64322A
+from blit_engine import BlitEngine
+
+
+class Bench(Module):
+    def __init__(self, display_load=True):
+        module = SmallM12L64322A(SYS_CLK_FREQ, '1:2')
+        module.geom_settings.addressbits = 11
+        settings = HalfRateGENSDRPHY(SDRAMPads(), SYS_CLK_FREQ).settings
+        self.submodules.sdrphy = SDRAMPHYModel(module, settings, clk_freq=SYS_CLK_FREQ)
+        self.submodules.sdram = LiteDRAMCore(
+            self.sdrphy, module.geom_settings, module.timing_settings,
+            SYS_CLK_FREQ,
+        )
+
+        # Fills the source, and reads back the destination.
+        self.submodules.filler = LiteDRAMDMAWriter(
+            self.sdram.crossbar.get_port(mode='write', data_width=64), 8)
+        self.submodules.checker = LiteDRAMDMAReader(
+            self.sdram.crossbar.get_port(mode='read', data_width=64), 8)
+
+        self.submodules.blit = BlitEngine(self.sdram)
+
+        if display_load:
+            port = self.sdram.crossbar.get_port(mode='read', data_width=64)
+            self.submodules.reader = reader = LiteDRAMDMAReader(port, 8)
+            address = Signal(port.address_width)
+            self.comb += [
+                reader.sink.valid.eq(1),
+                reader.sink.address.eq(address),
+                reader.source.ready.eq(1),
+            ]
+            self.sync += If(reader.sink.ready, address.eq(address + 1))
+
+
+def pattern(address):
+    '''The 64 bit word written to the source at address.'''
+    return (address << 32) | (address ^ 0x5a5a5a5a)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', type=int, default=2000, help="In 32 bit words")
+    parser.add_argument('--dst', type=int, default=6000, help="In 32 bit words")
+    parser.add_argument('--width', type=int, default=24, help="In 32 bit words")
+    parser.add_argument('--height', type=int, default=6)
+    parser.add_argument('--src-stride', type=int, default=64)
+    parser.add_argument('--dst-stride', type=int, default=40)
+    parser.add_argument('--no-display-load', action='store_true')
+    args = parser.parse_args()
+
+    bench = Bench(display_load=not args.no_display_load)
+    blit = bench.blit
+    write_port = blit.writer.port
+    src = [args.src//2 + y*args.src_stride//2 + x
+           for y in range(args.height) for x in range(args.width//2)]
+    # Each destination row with a word either side.
+    check = [args.dst//2 + y*args.dst_stride//2 + x
+             for y in range(args.height) for x in range(-1, args.width//2 + 1)]
+    expected = {}
+    for y in range(args.height):
+        for x in range(args.width//2):
+            expected[args.dst//2 + y*args.dst_stride//2 + x] = pattern(
+                args.src//2 + y*args.src_stride//2 + x)
+    results = {}
+
+    def write(dma, addresses, data):
+        for address, word in zip(addresses, data):
+            yield dma.sink.valid.eq(1)
+            yield dma.sink.address.eq(address)
+            yield dma.sink.data.eq(word)
+            yield
+            while not (yield dma.sink.ready):
+                yield
+        yield dma.sink.valid.eq(0)
+
+    def read(dma, addresses):
+        words = []
+        yield dma.source.ready.eq(1)
+        pending = list(addresses)
+        while len(words) < len(addresses):
+            yield dma.sink.valid.eq(bool(pending))
+            if pending:
+                yield dma.sink.address.eq(pending[0])
+            yield
+            if pending and (yield dma.sink.ready):
+                pending.pop(0)
+            if (yield dma.source.valid):
+                words.append((yield dma.source.data))
+        yield dma.sink.valid.eq(0)
+        return words
+
+    def gen():
+        # Clear the destination, then fill the source.
+        yield from write(bench.filler, check, [0]*len(check))
+        yield from write(bench.filler, src, [pattern(a) for a in src])
+        for _ in range(200):
+            yield
+
+        for signal, value in (
+                (blit.src, args.src),
+                (blit.dst, args.dst),
+                (blit.width, args.width),
+                (blit.height, args.height),
+                (blit.src_stride, args.src_stride),
+                (blit.dst_stride, args.dst_stride)):
+            yield signal.eq(value)
+        yield blit.begin.set.inp.eq(1)
+        yield
+        cycle = 0
+        last_write = None
+        while not (yield blit.done):
+            if (yield write_port.wdata.valid) and (yield write_port.wdata.ready):
+                last_write = cycle
+            yield
+            cycle += 1
+        results['cycles'] = cycle
+        results['after_last_write'] = cycle - last_write
+        results['words'] = yield from read(bench.checker, check)
+
+    run_simulation(bench, gen())
+
+    print(f'{args.width}x{args.height} words: done after {results["cycles"]} cycles, '
+          f'{results["after_last_write"]} after the last write was taken')
+    bad = 0
+    for address, word in zip(check, results['words']):
+        if word != expected.get(address, 0):
+            print(f'{address*2}: {word:#018x}, expected {expected.get(address, 0):#018x}')
+            bad += 1
+    if bad:
+        raise SystemExit(f'{bad} bad words')
+    print('destination and surrounding words correct')
+
+
+if __name__ == '__main__':
+    main()
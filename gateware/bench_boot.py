@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates the --hw-boot BootSequencer running the config and SDRAM init
+programs, and reports the cycles and time to ready. It checks the IP and
+MAC addresses stored against the config in flash, and the DFII writes
+against litedram's init sequence.
+
+The bus is a model of the CSR bridge, with its latency, and of the SPI
+master, which takes --spi-cycles per bit.
+'''
+
+import argparse
+
+from migen import *
+
+from litex.soc.interconnect import csr
+from litedram.modules import M12L64322A
+from litedram.phy import HalfRateGENSDRPHY
+
+from bench_row_buffers import SDRAMPads
+from bench_udp_ingest import SYS_CLK_FREQ
+from boot_sequencer import (
+    CONFIG_ADDR, DFII_CONTROL_HARDWARE, BootSequencer, config_program,
+    sdram_init_program,
+)
+
+
+class Region:
+    def __init__(self, origin, obj):
+        self.origin = origin
+        self.busword = 32
+        self.obj = obj
+
+
+class CSRMap:
+    '''The CSRs the programs use, laid out as the SoC would.'''
+    def __init__(self):
+        def storage(name, size=32):
+            return csr.CSRStorage(size, name=name)
+
+        self.regions = {
+            'hub75_soc': Region(0xf0000000, [
+                storage('mac_address', 48),
+                storage('ip_address'),
+            ]),
+            'sdram': Region(0xf0001000, [
+                storage(name) for name in [
+                    'dfii_control',
+                    'dfii_pi0_command',
+                    'dfii_pi0_command_issue',
+                    'dfii_pi0_address',
+                    'dfii_pi0_baddress',
+                ]
+            ]),
+            'spiflash': Region(0xf0002000, [
+                storage('spi_control'),
+                storage('spi_status'),
+                storage('spi_mosi', 64),
+                storage('spi_miso', 64),
+                storage('spi_cs'),
+            ]),
+        }
+
+
+class Bus:
+    data_width = 32
+    address_width = 30
+
+    def add_master(self, name, master):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--eth-ip', default='192.168.0.39')
+    parser.add_argument('--spi-cycles', type=int, default=13, help="Cycles per SPI bit")
+    parser.add_argument('--bridge-latency', type=int, default=3)
+    args = parser.parse_args()
+
+    # As make_config.py writes it.
+    ip = bytes(int(part) for part in args.eth_ip.split('.'))
+    flash = {CONFIG_ADDR + i: b for i, b in enumerate(ip + b'\x06\xd5' + ip)}
+
+    phy = HalfRateGENSDRPHY(SDRAMPads(), SYS_CLK_FREQ)
+    module = M12L64322A(SYS_CLK_FREQ, '1:2')
+    init = sdram_init_program(phy.settings, module.timing_settings)
+    sequencer = BootSequencer(Bus(), CSRMap(), config_program() + init)
+    sequencer.finalize()
+
+    names = {}
+    for region_name, region in sequencer.csr.regions.items():
+        for c in region.obj:
+            name = region_name + '_' + c.name
+            address = sequencer.csr_address(name)
+            for word in range((c.size + 31) // 32):
+                names[(address >> 2) + word] = (name, word*4)
+
+    writes = []
+    results = {}
+
+    @passive
+    def bus():
+        wb = sequencer.wb
+        mosi = 0
+        miso = 0
+        busy_until = 0
+        cycle = 0
+        while True:
+            yield
+            cycle += 1
+            if not ((yield wb.cyc) and (yield wb.stb)):
+                continue
+            for _ in range(args.bridge_latency):
+                yield
+                cycle += 1
+            name = names[(yield wb.adr)]
+            if (yield wb.we):
+                value = yield wb.dat_w
+                writes.append((name, value))
+                if name == ('spiflash_spi_mosi', 0):
+                    mosi = value
+                elif name == ('spiflash_spi_control', 0):
+                    busy_until = cycle + (value >> 8) * args.spi_cycles
+                    address = mosi & 0xffffff
+                    miso = int.from_bytes(
+                        bytes(flash.get(address + i, 0xff) for i in range(4)), 'big')
+            else:
+                value = 0
+                if name == ('spiflash_spi_status', 0):
+                    value = int(cycle >= busy_until)
+                elif name == ('spiflash_spi_miso', 4):
+                    value = miso
+                yield wb.dat_r.eq(value)
+            yield wb.ack.eq(1)
+            yield
+            cycle += 1
+            yield wb.ack.eq(0)
+
+    def gen():
+        while not (yield sequencer.done):
+            yield
+        results['cycles'] = yield sequencer.cycles
+
+    run_simulation(sequencer, [gen(), bus()])
+
+    cycles = results['cycles']
+    print(f'ready after {cycles} cycles, {cycles / SYS_CLK_FREQ * 1e3:.2f}ms')
+
+    stored = dict(writes)
+    ip_address = stored[('hub75_soc_ip_address', 0)]
+    mac_address = (stored[('hub75_soc_mac_address', 0)] << 32) | stored[('hub75_soc_mac_address', 4)]
+    print(f'ip {ip_address:#010x} mac {mac_address:#014x}')
+    if ip_address != int.from_bytes(ip, 'big'):
+        raise SystemExit('wrong IP address')
+    if mac_address != int.from_bytes(b'\x06\xd5' + ip, 'big'):
+        raise SystemExit('wrong MAC address')
+
+    # Every DFII write of the init program, in order.
+    dfii = [(name, value) for name, value in writes if name[0].startswith('sdram_')]
+    expected = [((name, 0), value) for op, name, value in
+                [step for step in init if step[0] == 'write']]
+    print(f'{len(dfii)} DFII writes')
+    if dfii != expected:
+        raise SystemExit('the DFII writes do not match the init sequence')
+    if dfii[-1] != (('sdram_dfii_control', 0), DFII_CONTROL_HARDWARE):
+        raise SystemExit('the SDRAM was not handed to the controller')
+
+
+if __name__ == '__main__':
+    main()
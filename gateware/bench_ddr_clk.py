@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates shifting one bit plane of a row out of the row memories, with
+the sys/3 domain and with --hub75-ddr-clk at each clk_div, and reports
+the sys cycles from start to latch.
+
+The bits clocked out on each panel clock edge are checked against the
+sys/3 path, so every divider shifts out the same data.
+'''
+
+import argparse
+import random
+
+from migen import *
+
+from bram import BRAM
+from hub75_driver import HUB75DataDriver
+
+
+class Bench(Module):
+    def __init__(self, data, ddr_clk):
+        self.ports = [Signal(6) for _ in range(8)]
+        self.submodules.mems = [
+            BRAM(32, 256, init=words, cd_read='read', has_re=ddr_clk)
+            for words in data
+        ]
+        self.submodules.driver = HUB75DataDriver(
+            self.ports,
+            [mem.read for mem in self.mems],
+            cd_read='sys' if ddr_clk else 'sys_div3',
+            ddr_clk=ddr_clk,
+        )
+
+
+def shift(data, plane, clk_div=None):
+    '''Returns the sys cycles to latch, and the bits on each clock edge.'''
+    ddr_clk = clk_div is not None
+    bench = Bench(data, ddr_clk)
+    driver = bench.driver
+    outputs = Cat(*bench.ports)
+    result = {'bits': []}
+
+    def gen():
+        if ddr_clk:
+            yield driver.clk_div.eq(clk_div)
+        yield driver.plane.eq(plane)
+        yield
+        yield driver.begin.set.inp.eq(1)
+        last = 0
+        for cycle in range(10000):
+            yield
+            if ddr_clk:
+                rise = yield driver.clk_rise
+                fall = yield driver.clk_fall
+                # A rising edge, mid cycle or on the cycle boundary.
+                edge = (rise and not last) or (fall and not rise)
+                last = fall
+            else:
+                clk = yield driver.clk
+                edge = clk and not last
+                last = clk
+            if edge:
+                result['bits'].append((yield outputs))
+            if (yield driver.lat) and 'latch' not in result:
+                result['latch'] = cycle
+            if not (yield driver.busy):
+                break
+
+    clocks = {'sys': 10}
+    if not ddr_clk:
+        clocks['sys_div3'] = 30
+    run_simulation(bench, {'sys': gen()}, clocks=clocks)
+    return result['latch'], result['bits']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clk-divs', default='1,2,3,4', help="Dividers to compare, comma separated")
+    parser.add_argument('--plane', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    data = [[rng.getrandbits(32) for _ in range(256)] for _ in range(16)]
+
+    cycles, expected = shift(data, args.plane)
+    print(f'sys/3 domain: {cycles} cycles, {len(expected)} pixels')
+    for clk_div in map(int, args.clk_divs.split(',')):
+        cycles, bits = shift(data, args.plane, clk_div)
+        same = 'same bits' if bits == expected else 'DIFFERENT BITS'
+        print(f'clk_div {clk_div}: {cycles} cycles, {same}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates a broadcast discovery request reaching several cards, each a
+DiscoveryResponder on its own UDP port model, and checks every reply:
+that it goes back to the sender, carries the request's tag, and holds
+the card's addresses, status and ident as discover() in sender75.py
+reads them.
+
+It also checks the replies arrive staggered in order of the low byte of
+the cards' IP addresses, and that a second, longer request is answered
+with its own tag.
+'''
+
+import argparse
+import struct
+
+from migen import *
+
+from discovery import DiscoveryResponder
+from udp_model import UDPModel, receive_datagram, send_datagram
+
+
+PORT = 4348
+HOST_IP = 0xc0a8000a
+HOST_PORT = 5555
+
+
+class ControllerModel:
+    '''The status the responder reports, as Hub75Controller has it.'''
+    def __init__(self, enable, base_addr, frames, underruns):
+        self.enable = Signal(reset=enable)
+        self.base_addr = Signal(32, reset=base_addr)
+        self.frames = Signal(32, reset=frames)
+        self.underruns = Signal(32, reset=underruns)
+
+
+class Card(Module):
+    def __init__(self, index, ident):
+        self.ip_address = 0xc0a80000 | [3, 1, 2][index]
+        self.mac_address = 0x10e2d5000000 | self.ip_address & 0xffff
+        self.status = (index & 1, 0xc000 * index, 1000 + index, 7 * index)
+        self.udp = UDPModel()
+        self.submodules.responder = DiscoveryResponder(
+            self.udp, PORT, ident,
+            Constant(self.mac_address, 48), Constant(self.ip_address, 32),
+            Constant(0xe0000001, 32), ControllerModel(*self.status),
+        )
+        self.port = self.udp.crossbar.ports[PORT]
+
+
+class Bench(Module):
+    def __init__(self, ident, cards=3):
+        self.cards = [Card(i, ident) for i in range(cards)]
+        self.submodules += self.cards
+        self.clock_domains.cd_eth_rx = ClockDomain()
+
+
+def decode(reply):
+    '''A reply's fields, read as discover() reads the datagram.'''
+    data = struct.pack(f'<{len(reply["words"])}I', *reply['words'])
+    fields = struct.unpack('<10I', data[:40])
+    return fields, data[40:40 + fields[9]].decode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ident', default='receiver75 bench build')
+    args = parser.parse_args()
+
+    bench = Bench(args.ident)
+    requests = [[0x1234abcd], [0x55aa0001, 0xffffffff, 0]]
+    replies = {card: [] for card in bench.cards}
+    cycle = [0]
+
+    @passive
+    def clock():
+        while True:
+            yield
+            cycle[0] += 1
+
+    def host(card):
+        for request in requests:
+            yield from send_datagram(
+                card.port, PORT, request, ip_address=HOST_IP, src_port=HOST_PORT)
+            sent = cycle[0]
+            reply = yield from receive_datagram(card.port, 4000)
+            replies[card].append((cycle[0] - sent, reply))
+
+    run_simulation(bench, {'eth_rx': [clock()] + [host(card) for card in bench.cards]},
+                   clocks={'sys': 16, 'eth_rx': 8})
+
+    ident_bytes = args.ident.encode()
+    for card in bench.cards:
+        for request, (after, reply) in zip(requests, replies[card]):
+            name = f'card {card.ip_address & 0xff}, tag {request[0]:#x}'
+            if reply is None:
+                raise SystemExit(f'{name}: no reply')
+            print(f'{name}: replied after {after} cycles')
+            # 256 sys cycles, at half the eth_rx clock, for each count.
+            if after < 512 * (card.ip_address & 0xff):
+                raise SystemExit(f'{name}: replied before its delay')
+            if (reply['ip_address'], reply['dst_port']) != (HOST_IP, HOST_PORT):
+                raise SystemExit(f'{name}: the reply did not go back to the sender')
+            if reply['length'] != 4*len(reply['words']):
+                raise SystemExit(f'{name}: length {reply["length"]} for {len(reply["words"])} words')
+            fields, ident = decode(reply)
+            expected = (
+                request[0], card.mac_address >> 32, card.mac_address & 0xffffffff,
+                card.ip_address, 0xe0000001, *card.status, len(ident_bytes),
+            )
+            if fields != expected:
+                raise SystemExit(f'{name}: fields {fields}, expected {expected}')
+            if ident != args.ident:
+                raise SystemExit(f'{name}: ident {ident!r}')
+
+    # Replies are staggered by the low byte of the IP address.
+    for i in range(len(requests)):
+        order = sorted(bench.cards, key=lambda card: replies[card][i][0])
+        if [card.ip_address for card in order] != sorted(card.ip_address for card in order):
+            raise SystemExit('the replies did not arrive in order of IP address')
+    print(f'{len(bench.cards)} cards answered both requests, in order of IP address')
+
+
+if __name__ == '__main__':
+    main()
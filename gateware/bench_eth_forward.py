@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates an --eth-forward card between the host and a chained card, with
+two LiteEthPHYModels and the UDP/IP core, and checks:
+
+- frames for other MACs, of 60 to 1514 bytes, are forwarded downstream
+  byte exact;
+- a UDP datagram to this card reaches it and is not forwarded;
+- a broadcast ARP request is both forwarded and answered;
+- frames from the chained card reach the host byte exact, sharing the
+  upstream port with the card's own reply.
+'''
+
+import argparse
+import random
+import struct
+
+from migen import *
+
+from liteeth.common import convert_ip
+from liteeth.core import LiteEthUDPIPCore
+from liteeth.phy.model import LiteEthPHYModel
+
+from bench_udp_ingest import (
+    ETH_CLK_FREQ, IP_ADDRESS, MAC_ADDRESS, EthPads, udp_frame,
+)
+from eth_forwarder import EthForwarder
+
+
+HOST_MAC = 0x020000000001
+OTHER_MAC = MAC_ADDRESS + 1
+
+
+class Bench(Module):
+    def __init__(self):
+        for name in ['eth_rx', 'eth_tx', 'eth1_rx', 'eth1_tx']:
+            setattr(self.clock_domains, 'cd_' + name, ClockDomain(name))
+
+        # The models tie their clocks to sys, so leave their CRGs out.
+        phys = []
+        self.pads = []
+        for cd in ['eth_rx', 'eth1_rx']:
+            pads = EthPads()
+            phy = LiteEthPHYModel(pads)
+            phy._submodules = [(n, m) for n, m in phy._submodules if n != 'crg']
+            self.submodules += ClockDomainsRenamer(cd)(phy)
+            phys.append(phy)
+            self.pads.append(pads)
+
+        self.submodules.forwarder = EthForwarder(
+            phys[0], phys[1], Constant(MAC_ADDRESS, 48))
+        ethcore = LiteEthUDPIPCore(
+            self.forwarder, MAC_ADDRESS, convert_ip(IP_ADDRESS), ETH_CLK_FREQ,
+            with_icmp=False,
+        )
+        self.submodules.ethcore = ClockDomainsRenamer({'sys': 'eth_rx'})(ethcore)
+        self.udp_port = self.ethcore.udp.crossbar.get_port(4343, 8)
+        self.comb += self.udp_port.source.ready.eq(1)
+
+
+def eth_frame(dst, payload, ethertype=0x88b5, src=HOST_MAC):
+    return dst.to_bytes(6, 'big') + src.to_bytes(6, 'big') + struct.pack('!H', ethertype) + payload
+
+
+def arp_request():
+    arp = struct.pack(
+        '!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, 1,
+        HOST_MAC.to_bytes(6, 'big'), bytes([192, 168, 0, 10]),
+        bytes(6), bytes(int(p) for p in IP_ADDRESS.split('.')),
+    )
+    return eth_frame(0xffffffffffff, arp + bytes(18), 0x0806)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--cycles', type=int, default=14000)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    def payload(length):
+        return bytes(random.randrange(256) for _ in range(length))
+
+    mine = udp_frame(1, bytes(range(200)))
+    others = [eth_frame(OTHER_MAC, payload(length)) for length in [46, 500, 1500, 46, 1500, 500]]
+    arp = arp_request()
+    from_host = [mine] + others[:2] + [arp] + others[2:]
+    from_chain = [eth_frame(HOST_MAC, payload(300), src=OTHER_MAC) for _ in range(3)]
+
+    bench = Bench()
+    to_host = []
+    to_chain = []
+    udp_bytes = []
+
+    def send(pads, frames, start, gap):
+        for _ in range(start):
+            yield
+        for frame in frames:
+            for byte in frame:
+                yield pads.sink_valid.eq(1)
+                yield pads.sink_data.eq(byte)
+                yield
+            yield pads.sink_valid.eq(0)
+            for _ in range(gap):
+                yield
+
+    def receive(pads, frames):
+        frame = []
+        for _ in range(args.cycles):
+            if (yield pads.source_valid):
+                frame.append((yield pads.source_data))
+            elif frame:
+                frames.append(bytes(frame))
+                frame = []
+            yield
+
+    def card():
+        for _ in range(args.cycles):
+            if (yield bench.udp_port.source.valid):
+                udp_bytes.append((yield bench.udp_port.source.data))
+            yield
+
+    run_simulation(bench, {
+        'eth_rx': [send(bench.pads[0], from_host, 50, 12), card()],
+        'eth1_rx': [send(bench.pads[1], from_chain, 1500, 40)],
+        'eth_tx': [receive(bench.pads[0], to_host)],
+        'eth1_tx': [receive(bench.pads[1], to_chain)],
+    }, clocks={'eth_rx': 8, 'eth_tx': 8, 'eth1_rx': 8, 'eth1_tx': 8})
+
+    expected_chain = others[:2] + [arp] + others[2:]
+    arp_replies = [f for f in to_host if f[12:14] == b'\x08\x06']
+    forwarded_up = [f for f in to_host if f[12:14] != b'\x08\x06']
+    print(f'downstream: {len(to_chain)} frames, {len(expected_chain)} expected')
+    print(f'to the card: {len(udp_bytes)} UDP payload bytes')
+    print(f'upstream: {len(forwarded_up)} frames forwarded, {len(arp_replies)} ARP replies')
+
+    if to_chain != expected_chain:
+        raise SystemExit('downstream frames are not the ones expected')
+    if bytes(udp_bytes) != bytes(range(200)):
+        raise SystemExit('the datagram to the card did not arrive intact')
+    if forwarded_up != from_chain:
+        raise SystemExit('upstream frames are not the ones sent')
+    if len(arp_replies) != 1:
+        raise SystemExit('the ARP request was not answered once')
+
+
+if __name__ == '__main__':
+    main()
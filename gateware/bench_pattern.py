@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates PatternGenerator drawing each pattern into a bank, through a
+model of a DRAM port that takes commands now and then and their data
+some cycles later, as the controller does. Every word of the bank is
+checked against the pattern, and frames must not count a bank until the
+port has taken all of its data.
+
+Then runs it continuously with a stand-in for the controller, and checks
+it alternates between the two banks, only draws over the bank the
+display has moved off, and hands the display back when stopped.
+'''
+
+import argparse
+import random
+
+from migen import *
+
+from litedram.common import LiteDRAMNativeWritePort
+
+from pattern_generator import (
+    BAR, GRADIENT_X, GRADIENT_Y, PANEL_ID, PANELS, SOLID, PatternGenerator,
+)
+from udp_dram_writer import BANK_SIZE
+
+
+class CrossbarModel:
+    def get_port(self, mode, data_width):
+        self.port = LiteDRAMNativeWritePort(24, data_width)
+        return self.port
+
+
+class SDRAMModel:
+    def __init__(self):
+        self.crossbar = CrossbarModel()
+
+
+class ControllerModel:
+    '''Takes the generator's address source, and shows frame_addr.'''
+    def __init__(self):
+        self.frame_addr = Signal(32)
+
+    def add_addr_source(self, active, addr):
+        self.active = active
+        self.addr = addr
+
+
+def pixel(pattern, color, x, y, panel, position, width):
+    '''The RGB bytes the pattern has at x, y of panel.'''
+    rgb = [(color >> shift) & 0xff for shift in (16, 8, 0)]
+
+    def ramp(level):
+        return [level if c else 0 for c in rgb]
+
+    if pattern == SOLID:
+        return rgb
+    if pattern == GRADIENT_X:
+        return ramp((x << 2 | x >> 4) & 0xff)
+    if pattern == GRADIENT_Y:
+        return ramp((y << 2 | y >> 4) & 0xff)
+    if pattern == PANEL_ID:
+        if x == 0 or y == 0:
+            return [0xff]*3
+        return ramp(0xff) if panel >> (3 - x // 16) & 1 else [0]*3
+    return rgb if (x - position) % 64 < width else [0]*3
+
+
+def bank_words(pattern, color, position, width):
+    '''The bank as 64 bit words, as the host's datagrams would write it.'''
+    data = bytearray()
+    for panel in range(PANELS):
+        for y in range(64):
+            for x in range(64):
+                data += bytes(pixel(pattern, color, x, y, panel, position, width))
+    return [
+        int.from_bytes(data[i:i + 4], 'big') | int.from_bytes(data[i + 4:i + 8], 'big') << 32
+        for i in range(0, len(data), 8)
+    ]
+
+
+@passive
+def dram(port, writes, latency):
+    '''Takes commands at random, and their data latency cycles later.'''
+    addresses = []
+    cycle = 0
+    while True:
+        yield port.cmd.ready.eq(random.random() < 0.7)
+        yield port.wdata.ready.eq(bool(addresses) and addresses[0][0] <= cycle
+                                  and random.random() < 0.7)
+        yield
+        cycle += 1
+        if (yield port.cmd.valid) and (yield port.cmd.ready):
+            addresses.append((cycle + latency, (yield port.cmd.addr)))
+        if (yield port.wdata.valid) and (yield port.wdata.ready):
+            writes[addresses.pop(0)[1]] = yield port.wdata.data
+        writes['pending'] = len(addresses)
+
+
+def patterns(args):
+    addr = 100
+    for pattern, color, position, width in [
+            (SOLID, 0x123456, 0, 8),
+            (GRADIENT_X, 0xff00ff, 0, 8),
+            (GRADIENT_Y, 0x00ff00, 0, 8),
+            (PANEL_ID, 0x0000ff, 0, 8),
+            (BAR, 0xff8000, 60, 10)]:
+        generator = PatternGenerator(SDRAMModel())
+        port = generator.writer.port
+        writes = {}
+        results = {}
+
+        def gen():
+            for signal, value in (
+                    (generator.addr, addr),
+                    (generator.pattern, pattern),
+                    (generator.color, color),
+                    (generator.position, position),
+                    (generator.width, width)):
+                yield signal.eq(value)
+            yield generator.begin.set.inp.eq(1)
+            yield
+            yield generator.begin.set.inp.eq(0)
+            cycles = 1
+            while not (yield generator.frames):
+                yield
+                cycles += 1
+            results['cycles'] = cycles
+            results['pending'] = writes['pending']
+
+        run_simulation(generator, [gen(), dram(port, writes, args.latency)])
+
+        expected = bank_words(pattern, color, position, width)
+        bad = sum(writes.get(addr//2 + i) != word for i, word in enumerate(expected))
+        print(f'pattern {pattern}: {results["cycles"]} cycles, {bad} wrong words, '
+              f'{results["pending"]} writes pending when counted')
+        if bad:
+            raise SystemExit(f'pattern {pattern} not drawn exactly')
+        if results['pending']:
+            raise SystemExit(f'pattern {pattern} counted before its writes were taken')
+
+
+def continuous(args):
+    controller = ControllerModel()
+    generator = PatternGenerator(SDRAMModel(), controller)
+    port = generator.writer.port
+    writes = {}
+    addr = 100
+    shown = []
+
+    def gen():
+        yield generator.addr.eq(addr)
+        yield generator.pattern.eq(BAR)
+        yield generator.step.eq(3)
+        yield generator.continuous.eq(1)
+        yield generator.begin.set.inp.eq(1)
+        yield
+        yield generator.begin.set.inp.eq(0)
+        frames = 0
+        while frames < args.frames:
+            yield
+            if (yield generator.frames) == frames:
+                continue
+            frames = yield generator.frames
+            shown.append((yield controller.addr))
+            # The display moves on to the new bank a while later, and
+            # nothing may be drawn over it until then.
+            for _ in range(args.display_delay):
+                yield
+                if (yield port.cmd.valid) and (yield port.cmd.ready):
+                    raise SystemExit('drew over the bank still on display')
+            yield controller.frame_addr.eq((yield controller.addr))
+        yield generator.continuous.eq(0)
+        for _ in range(2*BANK_SIZE):
+            yield
+            if not (yield generator.busy):
+                break
+        shown.append(((yield generator.busy), (yield controller.active)))
+
+    run_simulation(generator, [gen(), dram(port, writes, args.latency)])
+
+    *banks, (busy, active) = shown
+    print(f'continuous: showed {", ".join(str(bank) for bank in banks)}, '
+          f'then busy {busy}, showing {active}')
+    if banks != [addr + (i % 2)*BANK_SIZE for i in range(args.frames)]:
+        raise SystemExit('did not alternate between the two banks')
+    if busy or active:
+        raise SystemExit('did not hand the display back when stopped')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=int, default=12, help="Cycles from a command to taking its data")
+    parser.add_argument('--frames', type=int, default=3, help="Continuous frames")
+    parser.add_argument('--display-delay', type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    patterns(args)
+    continuous(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates ProtocolHandler taking a mix of RGB888, RGB565 and RGB666
+packets, packed by encode_pixels() in sender75.py, with gaps in the input
+and back pressure on the output. Every 64 bit DRAM write is checked
+against the RGB888 the card should expand each format to, bit for bit.
+
+Packets with a format the card does not know, 3 to 15, are sent between
+them and must not write anything.
+'''
+
+import argparse
+import os
+import random
+import struct
+import sys
+
+import numpy as np
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from pixel_expander import FORMAT_RGB888, FORMAT_RGB565, FORMAT_RGB666
+from udp_dram_writer import ProtocolHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tools'))
+from sender75 import encode_pixels  # noqa: E402
+
+
+class Bench(Module):
+    def __init__(self):
+        self.source = stream.Endpoint([('data', 32), ('end', 1)])
+        self.sink = stream.Endpoint([('data', 64), ('we', 8), ('address', 32)])
+        self.submodules.handler = ProtocolHandler(self.source, self.sink)
+
+
+def expand(value, bits):
+    return (value << (8 - bits)) | (value >> (2*bits - 8))
+
+
+def reference(rgb, wire_format):
+    '''The RGB888 bytes the card should write for rgb sent in wire_format.'''
+    if wire_format == FORMAT_RGB888:
+        return rgb
+    px = np.frombuffer(rgb, dtype=np.uint8).reshape((-1, 3)).astype(int)
+    bits = (5, 6, 5) if wire_format == FORMAT_RGB565 else (6, 6, 6)
+    return np.stack([
+        expand(px[:, c] >> (8 - bits[c]), bits[c]) for c in range(3)
+    ], 1).astype(np.uint8).tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+
+    # (address, format, wire bytes, expected RGB888 or None to drop)
+    packets = []
+    addr = 0
+    formats = [0, 1, 2, 3, 1, 2, 15, 0, 2, 7]
+    for wire_format in formats:
+        pixels = 512 if wire_format else 256
+        rgb = rng.integers(0, 256, pixels*3, dtype=np.uint8).tobytes()
+        if wire_format > FORMAT_RGB666:
+            # Sent over where the next packet goes, in case it is written.
+            packets.append((addr, wire_format, rgb[:1152], None))
+            continue
+        wire = rgb if wire_format == FORMAT_RGB888 else encode_pixels(rgb, wire_format)
+        packets.append((addr, wire_format, wire, reference(rgb, wire_format)))
+        addr += pixels*3 // 4
+
+    writes = {}
+
+    def feed():
+        for addr, wire_format, wire, _ in packets:
+            words = [addr | (wire_format << 24)] + list(
+                struct.unpack(f'<{len(wire)//4}I', wire))
+            for i, word in enumerate(words):
+                yield bench.source.valid.eq(1)
+                yield bench.source.data.eq(word)
+                yield bench.source.end.eq(i == len(words) - 1)
+                yield
+                while not (yield bench.source.ready):
+                    yield
+                yield bench.source.valid.eq(0)
+                for _ in range(random.choice([0, 0, 1, 3])):
+                    yield
+        for _ in range(200):
+            yield
+
+    @passive
+    def drain():
+        while True:
+            ready = random.random() < 0.8
+            yield bench.sink.ready.eq(ready)
+            yield
+            if ready and (yield bench.sink.valid):
+                address = yield bench.sink.address
+                if address in writes:
+                    writes[address] = None
+                else:
+                    writes[address] = yield bench.sink.data
+
+    bench = Bench()
+    run_simulation(bench, [feed(), drain()])
+
+    def swap(word):
+        return int.from_bytes(word.to_bytes(4, 'little'), 'big')
+
+    expected = {}
+    for addr, wire_format, _, rgb in packets:
+        if rgb is None:
+            continue
+        words = struct.unpack(f'<{len(rgb)//4}I', rgb)
+        for i in range(0, len(words), 2):
+            expected[(addr + i) >> 1] = swap(words[i]) | (swap(words[i + 1]) << 32)
+
+    bad = sum(writes.get(address) != word for address, word in expected.items())
+    extra = len(set(writes) - set(expected))
+    twice = sum(word is None for word in writes.values())
+    print(f'{len(expected)} words expected, {len(writes)} written, '
+          f'{bad} wrong, {extra} outside the packets, {twice} written twice')
+    print(f'{sum(rgb is None for *_, rgb in packets)} packets of unknown formats sent')
+    if bad or extra or twice:
+        raise SystemExit('not bit exact')
+
+
+if __name__ == '__main__':
+    main()
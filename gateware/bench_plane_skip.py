@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates the display showing different kinds of content, with and
+without skipping the bit planes a row does not use, and reports the row
+period and the refresh rate it gives.
+
+The display is the real row filler, controller and driver, clocked as
+in receiver75.py without --hub75-ddr-clk. The DRAM is a memory that
+answers every read the next cycle, so only the display is measured.
+'''
+
+import argparse
+import random
+import time
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from hub75_controller import Hub75Controller
+from hub75_multi_driver import Hub75MultiDriver
+from mem_stream import MemStreamWriter
+from row_filler import RowFiller
+
+
+SYS_CLK_FREQ = 64e6
+PANELS = 16
+ROW_BYTES = 64 * 3
+
+
+def make_bank(content, seed=1):
+    '''A bank of PANELS stacked 64x64 panels, as bytes.'''
+    rng = random.Random(seed)
+    rows = []
+    for y in range(PANELS * 64):
+        panel_row = y % 64
+        if content == 'random':
+            row = [rng.randrange(256) for _ in range(ROW_BYTES)]
+        elif content == 'text':
+            # Lines of white text, 5 rows high with 3 blank rows between.
+            if panel_row % 8 < 5:
+                row = [255 if rng.random() < 0.3 else 0 for _ in range(ROW_BYTES)]
+            else:
+                row = [0] * ROW_BYTES
+        elif content == 'dim':
+            # Everything below 16, as dark scenes are after gamma.
+            row = [rng.randrange(16) for _ in range(ROW_BYTES)]
+        elif content == 'black':
+            row = [0] * ROW_BYTES
+        rows.append(bytes(row))
+    return b''.join(rows)
+
+
+class DMAModel(Module):
+    '''Stands in for LiteDRAMDMAReader, reading 64 bit words from a memory.'''
+    def __init__(self, data):
+        words = [
+            int.from_bytes(data[i:i+8], 'big')
+            for i in range(0, len(data), 8)
+        ]
+        self.sink = stream.Endpoint([('address', 32)])
+        self.source = stream.Endpoint([('data', 64)])
+        self.rsv_level = Signal(4)
+
+        self.specials.mem = Memory(64, len(words), init=words)
+        port = self.mem.get_port(has_re=True)
+        self.specials += port
+
+        advance = Signal()
+        self.comb += [
+            advance.eq(~self.source.valid | self.source.ready),
+            port.adr.eq(self.sink.address),
+            port.re.eq(advance),
+            self.sink.ready.eq(advance),
+            self.source.data.eq(port.dat_r),
+            self.rsv_level.eq(self.source.valid),
+        ]
+        self.sync += If(advance,
+            self.source.valid.eq(self.sink.valid),
+        )
+
+
+class Bench(Module):
+    def __init__(self, data, skip, cycle_length):
+        self.clock_domains.cd_sys = ClockDomain()
+        self.clock_domains.cd_sys_div3 = ClockDomain()
+
+        self.submodules.dma = DMAModel(data)
+        driver = Hub75MultiDriver(
+            Signal(5), Signal(), Signal(), Signal(),
+            [Signal(6) for _ in range(8)],
+            cd_read='sys_div3',
+            row_buffers=4,
+        )
+        self.submodules.writers = [
+            MemStreamWriter(mem.write)
+            for mem in driver.mems
+        ]
+        row_filler = RowFiller(self.dma, [w.sink for w in self.writers])
+        self.submodules.controller = Hub75Controller(driver, row_filler)
+        self.comb += [
+            self.controller.enable.eq(1),
+            self.controller.cycle_length.eq(cycle_length),
+            driver.driver.skip_blank_planes.eq(skip),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--content',
+        default='random,text,dim,black',
+        help="Kinds of content to compare, comma separated, from random, "
+             "text, dim and black",
+    )
+    parser.add_argument('--rows', type=int, default=8, help="Rows to time")
+    parser.add_argument(
+        '--cycle-length',
+        type=int,
+        default=0,
+        help="The controller's shortest row period, 0 so the driver sets it",
+    )
+    args = parser.parse_args()
+
+    for content in args.content.split(','):
+        data = make_bank(content)
+        periods = {}
+        for skip in (False, True):
+            bench = Bench(data, skip, args.cycle_length)
+            starts = []
+
+            def gen():
+                cycle = 0
+                while len(starts) < args.rows + 1:
+                    if (yield bench.controller.row_start):
+                        starts.append(cycle)
+                    cycle += 1
+                    yield
+
+            start = time.time()
+            run_simulation(
+                bench, {'sys': gen()},
+                clocks={'sys': 10, 'sys_div3': 30},
+            )
+            # The first row waits for the ring to start filling.
+            periods[skip] = (starts[-1] - starts[1]) / (args.rows - 1)
+            elapsed = time.time() - start
+
+        refresh = {
+            skip: SYS_CLK_FREQ / (32 * period)
+            for skip, period in periods.items()
+        }
+        print(
+            f'{content}: row period {periods[False]:.0f} cycles, '
+            f'{periods[True]:.0f} skipping blank planes; refresh '
+            f'{refresh[False]:.0f}Hz -> {refresh[True]:.0f}Hz '
+            f'({refresh[True] / refresh[False] - 1:+.0%}) ({elapsed:.0f}s)',
+            flush=True,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates rectangle packets, as draw_rect() in sender75.py sends them,
+arriving back to back at gigabit line rate through the UDP core, the UDP
+to DRAM path and the litedram controller. Every byte written to DRAM is
+checked against the rectangles.
+
+A full datagram of an RGB565 rectangle is sent between the RGB888 ones.
+It would expand to more bytes than RectPlacer can place at line rate, so
+the card has to drop it without writing anything, and still place the
+rectangles after it.
+'''
+
+import argparse
+import random
+import struct
+
+from migen import *
+
+from bench_udp_ingest import FRAME_OVERHEAD, SYS_CLK_FREQ, Bench, udp_frame
+from pixel_expander import FORMAT_RGB888, FORMAT_RGB565
+from udp_dram_writer import BANK_SIZE, ROW_BYTES
+
+
+RECT = 1 << 31
+
+
+def rect_packet(bank, x, y, width, height, wire_format, data):
+    return struct.pack(
+        '<III', RECT | wire_format << 24 | bank, x | y << 16, width | height << 16,
+    ) + data
+
+
+def lane(offset):
+    '''The byte of a 64 bit DRAM word that holds byte offset of a bank.'''
+    return 4*(offset % 8 // 4) + 3 - offset % 4
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--cycles', type=int, default=4000, help="In sys cycles")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    # (bank, x, y, width, height, format), each as many rows as fit in
+    # a datagram.
+    rects = [
+        (0, 1, 0, 63, 7, FORMAT_RGB888),
+        (0, 0, 20, 64, 11, FORMAT_RGB565),
+        (1, 5, 40, 40, 12, FORMAT_RGB888),
+        (1, 0, 0, 64, 7, FORMAT_RGB888),
+    ]
+    frames = []
+    expected = {}
+    for ident, (bank, x, y, width, height, wire_format) in enumerate(rects):
+        pixel_bytes = 3 if wire_format == FORMAT_RGB888 else 2
+        data = bytes(random.randrange(256) for _ in range(width*height*pixel_bytes))
+        frames.append(udp_frame(ident, rect_packet(bank, x, y, width, height, wire_format, data)))
+        if wire_format != FORMAT_RGB888:
+            continue
+        for row in range(height):
+            for i in range(width*3):
+                offset = bank*BANK_SIZE*4 + (y + row)*ROW_BYTES + x*3 + i
+                expected[offset] = data[row*width*3 + i]
+
+    bench = Bench()
+    port = bench.writer.dma.port
+    cmds = []
+    wdata = []
+
+    def eth_gen():
+        for _ in range(40):
+            yield
+        for frame in frames:
+            for byte in frame:
+                yield bench.pads.sink_valid.eq(1)
+                yield bench.pads.sink_data.eq(byte)
+                yield
+            yield bench.pads.sink_valid.eq(0)
+            for _ in range(FRAME_OVERHEAD):
+                yield
+
+    def sys_gen():
+        for _ in range(args.cycles):
+            if (yield port.cmd.valid) and (yield port.cmd.ready):
+                cmds.append((yield port.cmd.addr))
+            if (yield port.wdata.valid) and (yield port.wdata.ready):
+                wdata.append(((yield port.wdata.data), (yield port.wdata.we)))
+            yield
+
+    run_simulation(bench, {'eth_rx': eth_gen(), 'sys': sys_gen()},
+                   clocks={'sys': 1e9/SYS_CLK_FREQ, 'eth_rx': 8, 'eth_tx': 8})
+
+    written = {}
+    for address, (data, we) in zip(cmds, wdata):
+        for offset in range(8*address, 8*address + 8):
+            if we >> lane(offset) & 1:
+                written[offset] = data >> 8*lane(offset) & 0xff
+
+    wrong = sum(written.get(offset) != byte for offset, byte in expected.items())
+    outside = len(set(written) - set(expected))
+    print(f'{len(frames)} rectangles at line rate, '
+          f'{sum(r[5] != FORMAT_RGB888 for r in rects)} in RGB565')
+    print(f'{len(expected)} bytes expected, {len(written)} written, '
+          f'{wrong} wrong or missing, {outside} outside the RGB888 rectangles')
+    if wrong or outside:
+        raise SystemExit('rectangles not placed exactly')
+
+
+if __name__ == '__main__':
+    main()
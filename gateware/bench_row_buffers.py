@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates the display sharing the SDRAM with line rate UDP ingest, and
+reports how often it was left waiting for a row, for each depth of the
+row buffer ring.
+
+The display runs on its own for --load-after cycles, filling rows faster
+than the short default rows are shown, so the ring fills ahead. Then the
+ingest starts, with a --blit-words BlitEngine copy as --copy-bank makes.
+Under that load a row takes longer to fill than to show, and the display
+uses up the rows filled ahead until the copy is done. A deeper ring holds
+more of them, so the display waits for fewer rows.
+
+The ingest is modelled at the DRAM: 64 bit writes arriving as back to
+back datagrams at gigabit line rate would arrive from the Ethernet core,
+through a FIFO as deep as UdpDramWriter's. Leaving the Ethernet core out
+keeps the simulation fast enough to show many rows.
+'''
+
+import argparse
+import time
+
+from migen import *
+
+from litex.soc.interconnect import stream
+from litedram.core import LiteDRAMCore
+from litedram.frontend.dma import LiteDRAMDMAReader, LiteDRAMDMAWriter
+from litedram.phy import HalfRateGENSDRPHY
+from litedram.phy.model import SDRAMPHYModel
+
+from bench_udp_ingest import (
+    ETH_CLK_FREQ, FRAME_OVERHEAD, SYS_CLK_FREQ, SDRAMPads, SmallM12L64322A,
+)
+from blit_engine import BlitEngine
+from hub75_controller import Hub75Controller
+from hub75_multi_driver import Hub75MultiDriver
+from mem_stream import MemStreamWriter
+from row_filler import RowFiller
+from udp_dram_writer import BANK_SIZE
+
+
+class IngestLoad(Module):
+    '''
+    64 bit DRAM writes at the rate the payloads of back to back datagrams
+    arrive, with the gaps for the headers and between frames.
+    '''
+    def __init__(self, port, payload=1472, fifo_depth=256):
+        self.submodules.fifo = fifo = stream.SyncFIFO(
+            [('address', port.address_width), ('data', 64)], fifo_depth)
+        self.submodules.dma = dma = LiteDRAMDMAWriter(port, 16)
+        self.comb += fifo.source.connect(dma.sink)
+
+        self.enable = Signal(reset=1)
+        self.dropped = Signal(32)
+
+        # Positions on the wire in 1/64ths of a byte, which arrive at
+        # ETH_CLK_FREQ/SYS_CLK_FREQ = 125/64 bytes a cycle.
+        step = int(ETH_CLK_FREQ / SYS_CLK_FREQ * 64)
+        data_bytes = (payload - 4) // 8 * 8
+        frame_bytes = 14 + 20 + 8 + payload + FRAME_OVERHEAD
+        pos = Signal(max=(frame_bytes + 8) * 64)
+        next_word = Signal(max=(frame_bytes + 8) * 64, reset=8 * 64)
+        address = Signal(port.address_width)
+
+        arrived = Signal()
+        self.comb += [
+            arrived.eq(self.enable & (pos >= next_word) & (next_word <= data_bytes * 64)),
+            fifo.sink.valid.eq(arrived),
+            fifo.sink.address.eq(address),
+            fifo.sink.data.eq(address),
+        ]
+
+        self.sync += [
+            If(pos + step >= frame_bytes * 64,
+                pos.eq(pos + step - frame_bytes * 64),
+                next_word.eq(8 * 64),
+            ).Else(
+                pos.eq(pos + step),
+                If(arrived,
+                    next_word.eq(next_word + 8 * 64),
+                ),
+            ),
+            If(arrived,
+                address.eq(address + 1),
+                If(~fifo.sink.ready,
+                    self.dropped.eq(self.dropped + 1),
+                ),
+            ),
+        ]
+
+
+class Bench(Module):
+    def __init__(self, row_buffers, row_cycles, ingest=True, blit_words=0, load_after=0):
+        module = SmallM12L64322A(SYS_CLK_FREQ, '1:2')
+        module.geom_settings.addressbits = 11
+        settings = HalfRateGENSDRPHY(SDRAMPads(), SYS_CLK_FREQ).settings
+        self.submodules.sdrphy = SDRAMPHYModel(module, settings, clk_freq=SYS_CLK_FREQ)
+        self.submodules.sdram = LiteDRAMCore(
+            self.sdrphy, module.geom_settings, module.timing_settings,
+            SYS_CLK_FREQ,
+        )
+
+        # The load starts after load_after cycles.
+        self.load = Signal()
+        wait = Signal(max=load_after + 1, reset=load_after)
+        self.comb += self.load.eq(wait == 0)
+        self.sync += If(~self.load, wait.eq(wait - 1))
+
+        if ingest:
+            self.submodules.ingest = IngestLoad(
+                self.sdram.crossbar.get_port(data_width=64))
+            self.comb += self.ingest.enable.eq(self.load)
+
+        if blit_words:
+            # One row of blit_words words, from the end of the first bank.
+            self.submodules.blit = BlitEngine(self.sdram)
+            self.comb += [
+                self.blit.src.eq(BANK_SIZE - blit_words),
+                self.blit.dst.eq(BANK_SIZE),
+                self.blit.width.eq(blit_words),
+                self.blit.height.eq(1),
+            ]
+            started = Signal()
+            self.sync += If(self.load & ~started,
+                self.blit.start(),
+                started.eq(1),
+            )
+
+        # The display, as in receiver75.py
+        port = self.sdram.crossbar.get_port(data_width=64)
+        self.submodules.dma_reader = reader = LiteDRAMDMAReader(port, 8)
+        if not hasattr(reader, 'rsv_level'):
+            # Newer litedram no longer counts the reads in flight.
+            reader.rsv_level = Signal(4)
+            self.sync += reader.rsv_level.eq(reader.rsv_level
+                + (port.cmd.valid & port.cmd.ready)
+                - (reader.source.valid & reader.source.ready))
+
+        driver = Hub75MultiDriver(
+            Signal(5), Signal(), Signal(), Signal(),
+            [Signal(6) for _ in range(8)],
+            row_buffers=row_buffers,
+        )
+        self.submodules.writers = [
+            MemStreamWriter(mem.write)
+            for mem in driver.mems
+        ]
+        row_filler = RowFiller(reader, [w.sink for w in self.writers])
+        self.submodules.controller = Hub75Controller(driver, row_filler)
+        self.comb += [
+            self.controller.enable.eq(1),
+            self.controller.cycle_length.eq(row_cycles),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--row-buffers',
+        default='2,3,4',
+        help="Ring depths to compare, comma separated",
+    )
+    parser.add_argument('--row-cycles', type=int, default=2600, help="Cycles each row is shown for")
+    parser.add_argument('--rows', type=int, default=22, help="Rows to display")
+    parser.add_argument('--no-ingest', action='store_true')
+    parser.add_argument(
+        '--blit-words',
+        type=int,
+        default=8192,
+        help="Words to copy with the blit engine, 0 for none",
+    )
+    parser.add_argument(
+        '--load-after',
+        type=int,
+        default=26000,
+        help="Cycles to run the display alone for first",
+    )
+    args = parser.parse_args()
+
+    for row_buffers in (int(n) for n in args.row_buffers.split(',')):
+        bench = Bench(
+            row_buffers, args.row_cycles, not args.no_ingest, args.blit_words,
+            args.load_after,
+        )
+        results = {}
+
+        def gen():
+            rows = 0
+            fills = {False: [], True: []}
+            filling = None
+            cycle = 0
+            while rows < args.rows:
+                if (yield bench.controller.row_start):
+                    rows += 1
+                load = yield bench.load
+                if load and 'before' not in results:
+                    results['before'] = yield bench.controller.underruns
+                busy = yield bench.controller.row_filler.busy
+                if busy and filling is None:
+                    filling = cycle
+                    loaded = load
+                elif not busy and filling is not None:
+                    fills[loaded].append(cycle - filling)
+                    filling = None
+                if args.blit_words and 'blit' not in results and (yield bench.blit.done):
+                    results['blit'] = cycle
+                cycle += 1
+                yield
+            results['cycles'] = cycle
+            results['fills'] = fills
+            results['underruns'] = yield bench.controller.underruns
+            if not args.no_ingest:
+                results['dropped'] = yield bench.ingest.dropped
+
+        start = time.time()
+        run_simulation(bench, gen())
+
+        line = (
+            f'{row_buffers} row buffers: {results["underruns"]} underruns in '
+            f'{args.rows} rows, {results.get("before", 0)} before the load'
+        )
+        for loaded, name in ((False, 'unloaded'), (True, 'loaded')):
+            fills = sorted(results['fills'][loaded][not loaded:])
+            if fills:
+                line += f', {name} row fill median {fills[len(fills) // 2]} max {fills[-1]}'
+        if 'dropped' in results:
+            line += f', {results["dropped"]} ingest words dropped'
+        if args.blit_words:
+            line += f', blit done after {results.get("blit", "more than")} of {results["cycles"]} cycles'
+        print(f'{line} ({time.time() - start:.0f}s)', flush=True)
+
+
+if __name__ == '__main__':
+    main()
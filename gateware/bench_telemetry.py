@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates the display for a few frames, stalling the row filler for a
+while in one of them, as a busy DRAM would, and reports the telemetry
+registers after each frame. Then reads registers back through
+UdpWishboneReader and checks the replies.
+
+The display is the real Hub75Controller with stand-ins for the driver
+and row filler that take fixed times, so frames are quick to simulate.
+The stall shows up as underruns and as the longest row fill.
+'''
+
+import argparse
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+
+from bench_time_sync import DriverModel, FillerModel
+from hub75_controller import Hub75Controller
+from udp_model import UDPModel, receive_datagram, send_datagram
+from udp_wishbone_reader import UdpWishboneReader
+
+
+TELEMETRY = ['frames', 'row_period', 'frame_period', 'underruns', 'filler_max_busy']
+
+
+class Display(Module):
+    def __init__(self, driver_cycles, filler_cycles):
+        self.submodules.filler = CEInserter()(FillerModel(filler_cycles))
+        self.submodules.controller = Hub75Controller(
+            DriverModel(driver_cycles), self.filler)
+        self.stall = Signal()
+        self.comb += [
+            self.controller.enable.eq(1),
+            self.controller.cycle_length.eq(0),
+            self.filler.ce.eq(~self.stall),
+        ]
+
+
+def telemetry(args):
+    display = Display(args.driver_cycles, args.filler_cycles)
+    controller = display.controller
+    results = []
+
+    def gen():
+        frames = 0
+        while frames < args.frames:
+            yield
+            if (yield controller.frames) == frames:
+                continue
+            frames = yield controller.frames
+            values = {}
+            for name in TELEMETRY:
+                values[name] = yield getattr(controller, name)
+            results.append(values)
+            if frames == args.stall_frame:
+                yield display.stall.eq(1)
+                for _ in range(args.stall):
+                    yield
+                yield display.stall.eq(0)
+
+    run_simulation(display, gen())
+
+    for values in results:
+        print(', '.join(f'{name} {value}' for name, value in values.items()))
+
+    before, after = results[args.stall_frame - 1], results[-1]
+    if after['underruns'] <= before['underruns']:
+        raise SystemExit('the stall did not show as underruns')
+    if after['filler_max_busy'] <= before['filler_max_busy']:
+        raise SystemExit('the stall did not show as the longest row fill')
+
+
+class CsrBus:
+    '''Takes the reader's bus master, as SoCCore's bus does.'''
+    data_width = 32
+    address_width = 30
+
+    def add_master(self, name, master):
+        self.master = master
+
+
+class ReadPath(Module):
+    def __init__(self, init):
+        self.udp = UDPModel()
+        bus = CsrBus()
+        self.submodules.reader = UdpWishboneReader(bus, self.udp, 4345)
+        self.submodules.sram = wishbone.SRAM(4*len(init), init=init)
+        self.comb += bus.master.connect(self.sram.bus)
+        self.clock_domains.cd_eth_rx = ClockDomain()
+
+
+def read_path():
+    init = [0x11223300 + i for i in range(256)]
+    bench = ReadPath(init)
+    port = bench.udp.crossbar.ports[4345]
+    # A request is an address and an optional count, and anything after
+    # them is ignored.
+    requests = [[5], [10, 3], [2, 2, 99], [7, 0]]
+    replies = []
+
+    def gen():
+        for request in requests:
+            yield from send_datagram(port, 4345, request)
+            replies.append((yield from receive_datagram(port, 1000)))
+
+    run_simulation(bench, {'eth_rx': gen()}, clocks={'sys': 16, 'eth_rx': 8})
+
+    for request, reply in zip(requests, replies):
+        address = request[0]
+        count = request[1] if len(request) > 1 else 1
+        expected = [address] + init[address:address + max(count, 1)]
+        if reply is None or reply['words'] != expected or reply['length'] != 4*len(expected):
+            raise SystemExit(f'request {request}: got {reply}, expected {expected}')
+        print(f'request {request}: replied {len(expected) - 1} values')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=4)
+    parser.add_argument('--stall-frame', type=int, default=2, help="Stall the DRAM after this frame")
+    parser.add_argument('--stall', type=int, default=3000, help="Cycles to stall the DRAM for")
+    parser.add_argument('--driver-cycles', type=int, default=1000, help="Time to shift out a row")
+    parser.add_argument('--filler-cycles', type=int, default=800, help="Time to fill a row")
+    args = parser.parse_args()
+
+    telemetry(args)
+    read_path()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates a host syncing the time bases of two cards whose clocks are
+--ppm apart, then scheduling a swap on both, and reports how far each
+card's time was from the host's and how far apart the swaps were.
+
+The network is modelled as a fixed delay plus exponential jitter in each
+direction. The host side does what ClockSync and show_bank_at() in
+sender75.py do, and a card stamps a sync request the cycle it arrives,
+as TimeBase's sync port does. The display is the real Hub75Controller
+with stand-ins for the driver and row filler.
+'''
+
+import argparse
+import random
+import time
+
+from migen import *
+
+from hub75_controller import Hub75Controller
+from time_base import TimeBase, ScheduledSwap
+from utils import FastLatch
+
+
+SYS_CLK_FREQ = 64e6
+# Simulation time is in femtoseconds, so the clocks can be ppm apart.
+FS_PER_NS = 10**6
+HOST_TICK = 50 * FS_PER_NS
+HOST_EPOCH = 1_600_000_000 * 10**9
+
+
+class Busy(Module):
+    '''Stays busy for cycles after begin is sent.'''
+    def __init__(self, cycles):
+        self.submodules.begin = FastLatch()
+        self.busy = Signal()
+        count = Signal(max=cycles + 1)
+
+        self.comb += self.busy.eq(self.begin.out)
+        self.sync += If(self.begin.out,
+            count.eq(count + 1),
+            If(count == cycles - 1,
+                count.eq(0),
+                self.begin.reset.send(),
+            ),
+        )
+
+
+class DriverModel(Busy):
+    def __init__(self, cycles, row_buffers=2):
+        super().__init__(cycles)
+        self.addr = Signal(5)
+        self.bank = Signal(3)
+        self.row_buffers = row_buffers
+
+
+class FillerModel(Busy):
+    def __init__(self, cycles):
+        super().__init__(cycles)
+        self.base_addr = Signal(32)
+        self.row = Signal(5)
+        self.bank = Signal(3)
+
+
+class Card(Module):
+    def __init__(self, row_cycles):
+        self.submodules.time_base = TimeBase(SYS_CLK_FREQ)
+        self.submodules.controller = Hub75Controller(
+            DriverModel(row_cycles // 2), FillerModel(row_cycles // 2))
+        self.submodules.swap = ScheduledSwap(self.controller, self.time_base)
+        self.comb += [
+            self.controller.enable.eq(1),
+            self.controller.cycle_length.eq(row_cycles),
+        ]
+
+
+class Network:
+    def __init__(self, delay_ns, jitter_ns, seed=1):
+        self.delay = delay_ns * FS_PER_NS
+        self.jitter = jitter_ns * FS_PER_NS
+        self.random = random.Random(seed)
+
+    def arrival(self, now):
+        return now + self.delay + int(self.random.expovariate(1 / self.jitter))
+
+
+class SimCard:
+    '''The Python side of a simulated card: what arrives and what it did.'''
+    def __init__(self, name, card, period, network):
+        self.name = name
+        self.card = card
+        self.period = period
+        self.network = network
+        self.requests = []
+        self.writes = []
+        self.replies = []
+        self.fired = None
+        self.shown = None
+        self.handed_back = None
+
+    @passive
+    def gen(self):
+        tb = self.card.time_base
+        swap = self.card.swap
+        controller = self.card.controller
+        now = self.period // 2
+        pulses = []
+
+        while True:
+            for signal in pulses:
+                yield signal.eq(0)
+            pulses = []
+
+            # Register writes, as UdpWishboneWriter would make them.
+            while self.writes and self.writes[0][0] <= now:
+                _, name, value = self.writes.pop(0)
+                if name == 'adjust':
+                    yield tb.adjust.eq(value)
+                    yield tb.step.eq(1)
+                    pulses.append(tb.step)
+                elif name == 'increment':
+                    yield tb.increment.eq(value)
+                elif name == 'addr':
+                    yield swap.addr.eq(value)
+                elif name == 'time':
+                    yield swap.time.eq(value)
+                    yield swap.arm.eq(1)
+                    pulses.append(swap.arm)
+                elif name == 'base_addr':
+                    yield controller.base_addr.eq(value)
+                    yield controller.base_addr_write.eq(1)
+                    pulses.append(controller.base_addr_write)
+
+            # Sync requests are answered with the time they arrived.
+            while self.requests and self.requests[0][0] <= now:
+                _, tag = self.requests.pop(0)
+                stamp = yield tb.time
+                self.replies.append((self.network.arrival(now), tag, stamp))
+
+            if self.fired is None and (yield swap.active):
+                self.fired = (now, (yield tb.time))
+            if self.fired is not None and self.shown is None and (yield controller.swap):
+                self.shown = now
+            if self.shown is not None and self.handed_back is None and not (yield swap.active):
+                self.handed_back = now
+
+            now += self.period
+            yield
+
+
+def host_gen(cards, args, results):
+    network = cards[0].network
+    now = HOST_TICK // 2
+    increments = {c.name: round(1e9 / SYS_CLK_FREQ * 2**TimeBase.FRAC_BITS) for c in cards}
+    last_sync = {}
+
+    def host_ns():
+        return HOST_EPOCH + now // FS_PER_NS
+
+    def wait(ns):
+        nonlocal now
+        until = now + ns * FS_PER_NS
+        while now < until:
+            now += HOST_TICK
+            yield
+
+    def exchange(card, tag):
+        nonlocal now
+        t1 = host_ns()
+        card.requests.append((network.arrival(now), tag))
+        while not (card.replies and card.replies[0][0] <= now):
+            now += HOST_TICK
+            yield
+        _, reply_tag, stamp = card.replies.pop(0)
+        assert reply_tag == tag
+        t4 = host_ns()
+        return t4 - t1, stamp - (t1 + t4) // 2
+
+    def sync(card):
+        # The exchange with the shortest round trip has the least room
+        # for the delays to differ each way.
+        samples = []
+        for tag in range(args.samples):
+            samples.append((yield from exchange(card, tag)))
+        _, offset = min(samples)
+
+        now_ns = host_ns()
+        if card.name in last_sync:
+            # Whatever built up since the last step is drift. ClockSync
+            # waits for a longer interval, but the simulation is short.
+            drift = offset / (now_ns - last_sync[card.name])
+            increments[card.name] = round(increments[card.name] / (1 + drift))
+            card.writes.append((network.arrival(now), 'increment', increments[card.name]))
+        card.writes.append((network.arrival(now), 'adjust', -offset))
+        last_sync[card.name] = now_ns
+        return offset
+
+    for i in range(args.syncs):
+        if i:
+            yield from wait(args.interval_us * 1000)
+        for card in cards:
+            offset = yield from sync(card)
+            results.setdefault(card.name, []).append(offset)
+
+    # Both cards are told to swap at the same host time.
+    yield from wait(args.interval_us * 1000)
+    when = host_ns() + args.lead_us * 1000
+    for card in cards:
+        card.writes.append((network.arrival(now), 'addr', 0x1000))
+        card.writes.append((network.arrival(now), 'time', when))
+    results['when'] = when
+
+    while any(c.shown is None for c in cards):
+        now += HOST_TICK
+        yield
+
+    # Writing base_addr hands the display back, even with the value it
+    # already had.
+    for card in cards:
+        card.writes.append((network.arrival(now), 'base_addr', 0))
+    for _ in range(10000):
+        if all(c.handed_back is not None for c in cards):
+            break
+        now += HOST_TICK
+        yield
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ppm', type=float, default=50, help="How much faster card B's clock is")
+    parser.add_argument('--delay-us', type=float, default=30, help="Fixed network delay each way")
+    parser.add_argument('--jitter-us', type=float, default=0.5, help="Mean jitter each way")
+    parser.add_argument('--samples', type=int, default=4, help="Exchanges per sync")
+    parser.add_argument('--syncs', type=int, default=2)
+    parser.add_argument('--interval-us', type=int, default=2000, help="Time between syncs")
+    parser.add_argument('--lead-us', type=int, default=500, help="How far ahead the swap is set")
+    parser.add_argument('--row-cycles', type=int, default=100)
+    args = parser.parse_args()
+
+    network = Network(args.delay_us * 1000, args.jitter_us * 1000)
+    period_a = round(1e15 / SYS_CLK_FREQ)
+    period_b = round(period_a / (1 + args.ppm * 1e-6))
+    cards = []
+    for name, domain, period in (('A', 'card_a', period_a), ('B', 'card_b', period_b)):
+        card = ClockDomainsRenamer(domain)(Card(args.row_cycles))
+        cards.append(SimCard(name, card, period, network))
+
+    bench = Module()
+    bench.clock_domains.cd_card_a = ClockDomain()
+    bench.clock_domains.cd_card_b = ClockDomain()
+    bench.clock_domains.cd_host = ClockDomain()
+    for c in cards:
+        bench.submodules += c.card
+
+    results = {}
+    start = time.time()
+    run_simulation(
+        bench,
+        {
+            'card_a': cards[0].gen(),
+            'card_b': cards[1].gen(),
+            'host': host_gen(cards, args, results),
+        },
+        clocks={'card_a': period_a, 'card_b': period_b, 'host': HOST_TICK},
+    )
+
+    print(f'simulated in {time.time() - start:.0f}s')
+    for c in cards:
+        offsets = ', '.join(f'{o / 1000:+.3f}' for o in results[c.name][1:])
+        print(f'card {c.name}: offsets found after the first sync {offsets} us')
+    for c in cards:
+        fired_at, card_time = c.fired
+        error = card_time - (HOST_EPOCH + fired_at // FS_PER_NS)
+        late = (fired_at - (results['when'] - HOST_EPOCH) * FS_PER_NS) / FS_PER_NS
+        print(f'card {c.name}: time {error:+d} ns from the host\'s, '
+              f'so the swap was taken {late:+.0f} ns from when it was due')
+    fired = [c.fired[0] for c in cards]
+    shown = [c.shown for c in cards]
+    print(f'skew: {abs(fired[0] - fired[1]) / FS_PER_NS:.0f} ns between the swaps, '
+          f'{abs(shown[0] - shown[1]) / FS_PER_NS:.0f} ns between the first frames shown')
+    if any(c.handed_back is None for c in cards):
+        raise SystemExit('writing base_addr with its old value did not end the swap')
+    print('writing base_addr with its old value ended the swap on both cards')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates back to back max size datagrams at gigabit line rate into the
+UDP -> DRAM path, and reports the throughput into DRAM.
+
+The Ethernet side runs at 125MHz through LiteEthPHYModel and the UDP/IP
+core, the DRAM side at 64MHz through the litedram controller and an
+SDRAM model. --display-load adds a reader competing for the SDRAM, as
+the row filler does.
+
+--payload 8972 sends jumbo frames, which with --fifo-depth matching a
+gateware --eth-jumbo build shows whole frames written intact.
+'''
+
+import argparse
+import struct
+import time
+
+from migen import *
+
+from liteeth.common import convert_ip
+from liteeth.core import LiteEthUDPIPCore
+from liteeth.phy.model import LiteEthPHYModel
+from litedram.core import LiteDRAMCore
+from litedram.frontend.dma import LiteDRAMDMAReader
+from litedram.modules import M12L64322A
+from litedram.phy import HalfRateGENSDRPHY
+from litedram.phy.model import SDRAMPHYModel
+
+from udp_dram_writer import UdpDramWriter
+
+
+SYS_CLK_FREQ = 64e6
+ETH_CLK_FREQ = 125e6
+IP_ADDRESS = '192.168.0.39'
+MAC_ADDRESS = 0x10e2d5000000
+
+# Preamble, FCS and the inter frame gap, in byte times.
+FRAME_OVERHEAD = 8 + 4 + 12
+
+
+class SmallM12L64322A(M12L64322A):
+    # The same timings with fewer rows, to keep the simulated memory small.
+    nrows = 64
+
+
+class EthPads:
+    def __init__(self):
+        self.source_valid = Signal()
+        self.source_data = Signal(8)
+        self.sink_valid = Signal()
+        self.sink_data = Signal(8)
+
+
+class SDRAMPads:
+    def __init__(self):
+        self.a = Signal(12)
+        self.ba = Signal(2)
+        self.cs_n = Signal()
+        self.cke = Signal()
+        self.ras_n = Signal()
+        self.cas_n = Signal()
+        self.we_n = Signal()
+        self.dq = Signal(32)
+        self.dm = Signal(4)
+
+
+class Bench(Module):
+    def __init__(self, display_load=False, fifo_depth=256):
+        self.clock_domains.cd_eth_rx = ClockDomain()
+        self.clock_domains.cd_eth_tx = ClockDomain()
+
+        # The model ties its clocks to sys, so leave its CRG out and run
+        # it at the Ethernet rate instead.
+        self.pads = EthPads()
+        phy = LiteEthPHYModel(self.pads)
+        phy._submodules = [(n, m) for n, m in phy._submodules if n != 'crg']
+        self.submodules.phy = ClockDomainsRenamer('eth_rx')(phy)
+
+        ethcore = LiteEthUDPIPCore(
+            phy, MAC_ADDRESS, convert_ip(IP_ADDRESS), ETH_CLK_FREQ,
+            with_icmp=False,
+        )
+        self.submodules.ethcore = ClockDomainsRenamer({'sys': 'eth_rx'})(ethcore)
+
+        module = SmallM12L64322A(SYS_CLK_FREQ, '1:2')
+        module.geom_settings.addressbits = 11
+        settings = HalfRateGENSDRPHY(SDRAMPads(), SYS_CLK_FREQ).settings
+        self.submodules.sdrphy = SDRAMPHYModel(module, settings, clk_freq=SYS_CLK_FREQ)
+        self.submodules.sdram = LiteDRAMCore(
+            self.sdrphy, module.geom_settings, module.timing_settings,
+            SYS_CLK_FREQ,
+        )
+
+        self.submodules.writer = UdpDramWriter(
+            self.sdram, self.ethcore.udp, 4343, fifo_depth=fifo_depth)
+
+        if display_load:
+            # Continuous 64 bit reads, as the row filler during a fill.
+            port = self.sdram.crossbar.get_port(data_width=64)
+            self.submodules.reader = reader = LiteDRAMDMAReader(port, 8)
+            address = Signal(port.address_width)
+            self.comb += [
+                reader.sink.valid.eq(1),
+                reader.sink.address.eq(address),
+                reader.source.ready.eq(1),
+            ]
+            self.sync += If(reader.sink.ready, address.eq(address + 1))
+
+
+def ip_checksum(header):
+    total = sum(struct.unpack(f'!{len(header)//2}H', header))
+    while total > 0xffff:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+def udp_frame(ident, payload, port=4343):
+    udp = struct.pack('!HHHH', 5000, port, 8 + len(payload), 0) + payload
+    ip = bytearray(struct.pack(
+        '!BBHHHBBH4s4s',
+        0x45, 0, 20 + len(udp), ident, 0, 64, 17, 0,
+        bytes([192, 168, 0, 10]), bytes(int(p) for p in IP_ADDRESS.split('.')),
+    ))
+    ip[10:12] = struct.pack('!H', ip_checksum(bytes(ip)))
+    eth = MAC_ADDRESS.to_bytes(6, 'big') + bytes([2, 0, 0, 0, 0, 1]) + b'\x08\x00'
+    return eth + bytes(ip) + udp
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--packets', type=int, default=3)
+    parser.add_argument('--payload', type=int, default=1472, help="UDP payload bytes")
+    parser.add_argument('--display-load', action='store_true')
+    parser.add_argument('--fifo-depth', type=int, default=256, help="UdpDramWriter FIFO depth")
+    args = parser.parse_args()
+
+    bench = Bench(args.display_load, args.fifo_depth)
+
+    words = (args.payload - 4) // 4
+    frames = []
+    expected_data = []
+    for idx in range(args.packets):
+        address = idx * words
+        data = bytes(((address * 4 + k) * 7) & 0xff for k in range(words * 4))
+        frames.append(udp_frame(idx, struct.pack('<I', address) + data))
+        # Each 64 bit write is two big endian 32 bit words, the first
+        # in the low half.
+        for k in range(0, words // 2 * 8, 8):
+            lo, hi = struct.unpack('>II', data[k:k + 8])
+            expected_data.append(hi << 32 | lo)
+
+    eth_cycles = sum(len(frame) + FRAME_OVERHEAD for frame in frames)
+    # Allow the DRAM side twice as long as the wire took.
+    sys_cycles = int(2 * eth_cycles * SYS_CLK_FREQ / ETH_CLK_FREQ) + 1000
+
+    def eth_gen():
+        for _ in range(40):
+            yield
+        for frame in frames:
+            for byte in frame:
+                yield bench.pads.sink_valid.eq(1)
+                yield bench.pads.sink_data.eq(byte)
+                yield
+            yield bench.pads.sink_valid.eq(0)
+            for _ in range(FRAME_OVERHEAD):
+                yield
+
+    writes = []
+    written_data = []
+
+    def sys_gen():
+        port = bench.writer.dma.port
+        for cycle in range(sys_cycles):
+            if (yield port.wdata.valid) and (yield port.wdata.ready):
+                writes.append(cycle)
+                written_data.append((yield port.wdata.data))
+            yield
+
+    start = time.time()
+    run_simulation(
+        bench,
+        {'eth_rx': eth_gen(), 'sys': sys_gen()},
+        clocks={
+            'sys': 1e9 / SYS_CLK_FREQ,
+            'eth_rx': 1e9 / ETH_CLK_FREQ,
+            'eth_tx': 1e9 / ETH_CLK_FREQ,
+        },
+    )
+
+    # Odd trailing words are not written.
+    expected = args.packets * (words // 2)
+    wire_time = eth_cycles / ETH_CLK_FREQ
+    print(f'simulated in {time.time() - start:.0f}s')
+    print(f'offered: {args.packets * words * 32 / wire_time / 1e6:.0f} Mb/s of payload, '
+          f'{100 * args.packets * words * 4 / eth_cycles:.1f}% of the wire')
+    if writes:
+        span = (writes[-1] - writes[0] + 1) / SYS_CLK_FREQ
+        print(f'written: {len(writes) * 64 / span / 1e6:.0f} Mb/s into DRAM')
+    print(f'64 bit writes: {len(writes)} of {expected}, '
+          f'{"no packets dropped" if len(writes) == expected else "packets dropped or backlogged"}')
+    print(f'data: {"intact" if written_data == expected_data else "corrupted"}')
+
+
+if __name__ == '__main__':
+    main()
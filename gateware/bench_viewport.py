@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates RowFiller filling rows from a --hub75-viewport virtual
+framebuffer, at scroll positions that start on odd pixels and odd words
+and that wrap around on both axes, and checks every row buffer word
+against the framebuffer. The bank layout without the viewport is checked
+too. It reports the cycles each row fill took.
+
+The DRAM is a stand-in whose 64 bit words hold their own address, so any
+byte that ends up in the wrong place shows where it came from.
+'''
+
+import argparse
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from bram import BRAM
+from mem_stream import MemStreamWriter
+from row_filler import RowFiller
+
+
+class AddressDMA(Module):
+    '''
+    Stands in for LiteDRAMDMAReader. The 64 bit word at address a holds
+    the 32 bit words 2a and 2a+1, so 32 bit word w holds w.
+    '''
+    def __init__(self, latency=4):
+        self.sink = stream.Endpoint([('address', 22)])
+        self.source = stream.Endpoint([('data', 64)])
+        self.rsv_level = Signal(4)
+
+        pipe = [Signal(65) for _ in range(latency)]
+        self.submodules.fifo = fifo = stream.SyncFIFO([('data', 64)], 16)
+
+        accept = Signal()
+        self.comb += [
+            accept.eq(self.sink.valid & (self.rsv_level < 8)),
+            self.sink.ready.eq(accept),
+        ]
+        low = Signal(32)
+        high = Signal(32)
+        self.comb += [
+            low.eq(self.sink.address << 1),
+            high.eq(low + 1),
+        ]
+        self.sync += pipe[0].eq(Cat(low, high, accept))
+        for a, b in zip(pipe, pipe[1:]):
+            self.sync += b.eq(a)
+        self.comb += [
+            fifo.sink.valid.eq(pipe[-1][64]),
+            fifo.sink.data.eq(pipe[-1][:64]),
+            fifo.source.connect(self.source),
+        ]
+        self.sync += self.rsv_level.eq(
+            self.rsv_level + accept - (self.source.valid & self.source.ready))
+
+
+class Bench(Module):
+    def __init__(self):
+        self.submodules.dma = AddressDMA()
+        self.submodules.mems = [BRAM(32, 256) for _ in range(16)]
+        self.submodules.writers = [MemStreamWriter(m.write) for m in self.mems]
+        self.submodules.filler = RowFiller(
+            self.dma, [w.sink for w in self.writers], with_viewport=True)
+
+
+def byte_at(addr):
+    '''Byte addr of the stand-in DRAM, with 32 bit words big endian.'''
+    return (addr // 4).to_bytes(4, 'big')[addr % 4]
+
+
+def viewport_row(panel, panel_row, base, columns, width, height, x, y):
+    '''The 48 words of a panel row, from the virtual framebuffer.'''
+    stride = width * 3
+    cy = ((panel // columns)*64 + panel_row + y) % height
+    cx = ((panel % columns)*64 + x) % width
+    data = bytes(
+        byte_at(base*4 + cy*stride + ((cx + i // 3) % width)*3 + i % 3)
+        for i in range(192)
+    )
+    return [int.from_bytes(data[4*k:4*k + 4], 'big') for k in range(48)]
+
+
+def bank_row(panel, panel_row, base):
+    '''The 48 words of a panel row, from the bank layout.'''
+    first = base + (panel*64 + panel_row)*48
+    return list(range(first, first + 48))
+
+
+CASES = [
+    # viewport, base_addr, panel_columns, width, height, scroll_x, scroll_y, row
+    (1, 1000, 4, 256, 256, 0, 0, 0),
+    (1, 1000, 4, 256, 256, 1, 0, 0),
+    (1, 1002, 4, 512, 320, 123, 77, 5),
+    (1, 0, 2, 136, 520, 130, 500, 0),
+    (1, 0, 16, 1024, 64, 1021, 63, 31),
+    (0, 2000, 4, 256, 256, 5, 5, 3),
+]
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__).parse_args()
+
+    bench = Bench()
+    filler = bench.filler
+    failed = []
+
+    def gen():
+        for case in CASES:
+            viewport, base, columns, width, height, x, y, row = case
+            for signal, value in (
+                    (filler.viewport, viewport),
+                    (filler.base_addr, base),
+                    (filler.panel_columns, columns),
+                    (filler.virtual_width, width),
+                    (filler.virtual_height, height),
+                    (filler.scroll_x, x),
+                    (filler.scroll_y, y)):
+                yield signal.eq(value)
+            # The scroll position is taken at row 0, once a frame.
+            for fill_row in sorted({0, row}):
+                yield filler.row.eq(fill_row)
+                yield
+                yield filler.begin.set.inp.eq(~(yield filler.begin.set.inp))
+                yield
+                yield
+                cycles = 2
+                while (yield filler.busy):
+                    yield
+                    cycles += 1
+
+            # Each memory holds the top or bottom half rows of a pair of
+            # panels.
+            bad = 0
+            for m, mem in enumerate(bench.mems):
+                pair, half = m >> 1, m & 1
+                for i, panel in enumerate((pair*2, pair*2 + 1)):
+                    panel_row = half*32 + row
+                    got = []
+                    for k in range(48):
+                        got.append((yield mem.mem[i*48 + k]))
+                    if viewport:
+                        expected = viewport_row(panel, panel_row, base, columns, width, height, x, y)
+                    else:
+                        expected = bank_row(panel, panel_row, base)
+                    bad += got != expected
+            print(f'{case}: {cycles} cycles, {bad} bad panel rows')
+            if bad:
+                failed.append(case)
+
+    run_simulation(bench, gen())
+    if failed:
+        raise SystemExit(f'{len(failed)} cases failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Simulates the display running with vsync notifications on, changes the
+base address part way through, and checks the datagrams that come out:
+one per frame with the frame counter and address, the swap flagged on
+the frame that first shows the new address, and only swaps once the
+frame event is masked off.
+
+The display is the real Hub75Controller with stand-ins for the driver
+and row filler.
+'''
+
+import argparse
+
+from migen import *
+
+from bench_time_sync import DriverModel, FillerModel
+from hub75_controller import Hub75Controller
+from udp_model import UDPModel, receive_datagram
+from vsync_notifier import VsyncNotifier
+
+
+HOST_IP = 0xc0a80001
+PORT = 4346
+
+
+class Bench(Module):
+    def __init__(self, row_cycles):
+        self.udp = UDPModel()
+        self.submodules.controller = Hub75Controller(
+            DriverModel(row_cycles // 2), FillerModel(row_cycles // 2))
+        self.last_ip = Signal(32, reset=HOST_IP)
+        self.submodules.vsync = VsyncNotifier(
+            self.controller, self.udp, PORT, self.last_ip)
+        self.comb += [
+            self.controller.enable.eq(1),
+            self.controller.cycle_length.eq(row_cycles),
+        ]
+        self.clock_domains.cd_eth_rx = ClockDomain()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--row-cycles', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=6)
+    args = parser.parse_args()
+
+    bench = Bench(args.row_cycles)
+    controller = bench.controller
+    port = bench.udp.crossbar.ports[PORT]
+    frame_starts = []
+    datagrams = []
+
+    def display():
+        yield bench.vsync.events.eq(VsyncNotifier.FRAME | VsyncNotifier.SWAP)
+        cycle = 0
+        while len(frame_starts) < args.frames:
+            if (yield controller.frame_start):
+                frame_starts.append(cycle)
+                if len(frame_starts) == 2:
+                    yield controller.base_addr.eq(0x1000)
+                if len(frame_starts) == args.frames // 2 + 1:
+                    yield bench.vsync.events.eq(VsyncNotifier.SWAP)
+                    yield controller.base_addr.eq(0x2000)
+            cycle += 1
+            yield
+        # Time for the last datagram to leave.
+        for _ in range(100):
+            yield
+
+    @passive
+    def network():
+        while True:
+            datagrams.append((yield from receive_datagram(port)))
+
+    run_simulation(
+        bench,
+        {'sys': display(), 'eth_rx': network()},
+        clocks={'sys': 16, 'eth_rx': 8},
+    )
+
+    # An address set at the start of a frame is shown from the next one.
+    expected = []
+    addr = 0
+    for frame in range(1, args.frames + 1):
+        new_addr = 0x1000 if frame >= 3 else 0
+        if frame > args.frames // 2 + 1:
+            new_addr = 0x2000
+        events = 0
+        if frame <= args.frames // 2 + 1:
+            events |= VsyncNotifier.FRAME
+        if new_addr != addr:
+            events |= VsyncNotifier.SWAP
+        addr = new_addr
+        if events:
+            expected.append([events, frame, addr])
+
+    got = [d['words'] for d in datagrams]
+    for words in got:
+        print(f'events {words[0]} frame {words[1]} addr {words[2]:#x}')
+    if got != expected:
+        raise SystemExit(f'expected {expected}')
+    for d in datagrams:
+        if (d['length'], d['ip_address'], d['dst_port']) != (12, HOST_IP, PORT):
+            raise SystemExit(f'bad header {d}')
+
+
+if __name__ == '__main__':
+    main()
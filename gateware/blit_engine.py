@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Copies rectangles of DRAM to DRAM.
+'''
+from migen import *
+from litex.soc.interconnect import csr, stream
+
+from litedram.frontend.dma import LiteDRAMDMAReader, LiteDRAMDMAWriter
+
+from csr_mixin import CSRMixin
+from utils import FastLatch
+
+
+class BlockAddresses(Module):
+    def __init__(self, nbits):
+        self.source = stream.Endpoint([('address', nbits)])
+
+        # Interface
+        self.submodules._begin = FastLatch()
+        self.base = Signal(nbits)
+        self.width = Signal(nbits)
+        self.height = Signal(16)
+        self.stride = Signal(nbits)
+        self.busy = Signal()
+
+        # State
+        state = Signal()
+        row = Signal(nbits)
+        x = Signal(nbits)
+        y = Signal(16)
+
+        self.comb += [
+            self.busy.eq(self._begin.out),
+            self.source.valid.eq(state),
+            self.source.address.eq(row + x),
+        ]
+
+        self.sync += If(~state,
+            If(self._begin.out,
+                row.eq(self.base),
+                x.eq(0),
+                y.eq(0),
+                If((self.width == 0) | (self.height == 0),
+                    self._begin.reset.send(),
+                ).Else(
+                    state.eq(1),
+                ),
+            ),
+        ).Elif(self.source.ready,
+            If(x == self.width - 1,
+                x.eq(0),
+                row.eq(row + self.stride),
+                If(y == self.height - 1,
+                    self._begin.reset.send(),
+                    state.eq(0),
+                ).Else(
+                    y.eq(y+1),
+                ),
+            ).Else(
+                x.eq(x+1),
+            ),
+        )
+
+    def begin(self):
+        return self._begin.set.send()
+
+
+class PendingWrites(Module):
+    '''
+    Counts the writes issued on a native DRAM port whose data the
+    controller has not taken yet.
+
+    The controller takes a write's data as it sends the write command to
+    the DRAM, so once this is idle every write issued so far has reached
+    the DRAM, and a read from any port returns it. An empty DMA writer
+    FIFO only means the data has been offered to the port.
+    '''
+    def __init__(self, port, depth):
+        self.count = Signal(max=depth+1)
+        self.idle = Signal()
+
+        self.comb += self.idle.eq(self.count == 0)
+        self.sync += self.count.eq(self.count
+            + (port.cmd.valid & port.cmd.ready)
+            - (port.wdata.valid & port.wdata.ready))
+
+
+class BlitEngine(Module, CSRMixin):
+    '''
+    Copies width x height words from src to dst, through the SDRAM
+    crossbar.
+
+    Addresses, widths and strides are in 32 bit words, like base_addr,
+    and must be even. Rows are read ahead of being written, so the
+    regions must not overlap unless dst comes before src.
+    '''
+    def __init__(self, sdram, with_csr=False):
+        read_port = sdram.crossbar.get_port(mode='read', data_width=64)
+        write_port = sdram.crossbar.get_port(mode='write', data_width=64)
+        nbits = read_port.address_width
+
+        # Interface
+        self.src = Signal(32)
+        self.dst = Signal(32)
+        self.width = Signal(32)
+        self.height = Signal(16)
+        self.src_stride = Signal(32)
+        self.dst_stride = Signal(32)
+        self.submodules.begin = FastLatch()
+        self.busy = Signal()
+        self.done = Signal()
+
+        # DMA
+        self.submodules.reader = reader = LiteDRAMDMAReader(read_port, 16)
+        self.submodules.writer = writer = LiteDRAMDMAWriter(write_port, 16)
+        self.submodules.pending = pending = PendingWrites(write_port, 16)
+        self.submodules.src_addrs = src_addrs = BlockAddresses(nbits)
+        self.submodules.dst_addrs = dst_addrs = BlockAddresses(nbits)
+
+        for addrs, base, stride in [
+                (src_addrs, self.src, self.src_stride),
+                (dst_addrs, self.dst, self.dst_stride)]:
+            self.comb += [
+                addrs.base.eq(base >> 1),
+                addrs.width.eq(self.width >> 1),
+                addrs.height.eq(self.height),
+                addrs.stride.eq(stride >> 1),
+            ]
+
+        # Pair up the data read with the addresses to write it to.
+        self.comb += [
+            src_addrs.source.connect(reader.sink),
+            writer.sink.valid.eq(reader.source.valid & dst_addrs.source.valid),
+            writer.sink.address.eq(dst_addrs.source.address),
+            writer.sink.data.eq(reader.source.data),
+            reader.source.ready.eq(writer.sink.ready & dst_addrs.source.valid),
+            dst_addrs.source.ready.eq(writer.sink.ready & reader.source.valid),
+        ]
+
+        # State
+        state = Signal()
+
+        self.comb += self.busy.eq(self.begin.out)
+
+        self.sync += If(~state,
+            If(self.begin.out,
+                src_addrs.begin(),
+                dst_addrs.begin(),
+                self.done.eq(0),
+                state.eq(1),
+            ),
+        ).Elif(~dst_addrs.busy & pending.idle,
+            self.begin.reset.send(),
+            self.done.eq(1),
+            state.eq(0),
+        )
+
+        if with_csr:
+            self.add_csrs()
+
+    def start(self):
+        return self.begin.set.send()
+
+    def add_csrs(self):
+        # The parameters are followed by start, so a single datagram can
+        # set them all and then start the copy.
+        self.add_storage_csrs(
+            'src',
+            'dst',
+            'width',
+            'height',
+            'src_stride',
+            'dst_stride',
+        )
+        self._start = csr.CSR()
+        self.sync += If(self._start.re,
+            self.start(),
+        )
+        self.add_status_csrs('busy', 'done')
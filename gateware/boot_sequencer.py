@@ -0,0 +1,242 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+
+from litedram.init import get_sdram_phy_init_sequence
+
+
+# Opcodes, each instruction is (op, address, value).
+OP_END = 0
+OP_WRITE = 1    # write value to address
+OP_STORE = 2    # write the accumulator to address
+OP_LOAD = 3     # read address into the accumulator
+OP_WAIT = 4     # read address until (data & value) != 0
+OP_DELAY = 5    # wait for value cycles
+OP_SHR = 6      # shift the accumulator right by value bits
+
+DFII_CONTROL_SOFTWARE = 0x0e
+DFII_CONTROL_HARDWARE = 0x0f
+
+CONFIG_ADDR = 4000000
+
+
+class BootSequencer(Module):
+    '''
+    Does the work of the firmware without a CPU.
+
+    Runs a small program of CSR accesses as a bus master. The program
+    refers to CSRs by name, e.g. ('write', 'sdram_dfii_control', 0x0e),
+    and is resolved once the SoC has placed its CSRs.
+    '''
+    def __init__(self, bus, csr, program=None):
+        self.csr = csr
+        self.program = program if program is not None else []
+
+        self.done = Signal()
+        self.cycles = Signal(32)
+
+        self.wb = wb = wishbone.Interface(data_width=bus.data_width, adr_width=bus.address_width)
+        bus.add_master('boot_sequencer', wb)
+
+        self.rom = rom = Memory(8 + 32 + 32, 256)
+        rd = rom.get_port()
+        self.specials += [rom, rd]
+
+        pc = Signal(8)
+        acc = Signal(32)
+        count = Signal(32)
+        op = Signal(8)
+        address = Signal(32)
+        value = Signal(32)
+
+        # 0: fetch, 1: decode, 2: bus, 3: delay/shift
+        state = Signal(2)
+
+        self.comb += [
+            rd.adr.eq(pc),
+            op.eq(rd.dat_r[0:8]),
+            address.eq(rd.dat_r[8:40]),
+            value.eq(rd.dat_r[40:72]),
+
+            wb.adr.eq(address[2:]),
+            wb.dat_w.eq(Mux(op == OP_STORE, acc, value)),
+            wb.sel.eq(2**len(wb.sel) - 1),
+            wb.we.eq((op == OP_WRITE) | (op == OP_STORE)),
+            wb.cyc.eq(state == 2),
+            wb.stb.eq(state == 2),
+        ]
+
+        self.sync += [
+            If(~self.done,
+                self.cycles.eq(self.cycles + 1),
+            ),
+            Case(state, {
+                0: [
+                    # The ROM has a cycle of read latency.
+                    state.eq(1),
+                ],
+                1: Case(op, {
+                    OP_END: [
+                        self.done.eq(1),
+                    ],
+                    OP_DELAY: [
+                        count.eq(value),
+                        state.eq(3),
+                    ],
+                    OP_SHR: [
+                        count.eq(value),
+                        state.eq(3),
+                    ],
+                    'default': [
+                        state.eq(2),
+                    ],
+                }),
+                2: If(wb.ack,
+                    If(op == OP_LOAD,
+                        acc.eq(wb.dat_r),
+                    ),
+                    If((op != OP_WAIT) | ((wb.dat_r & value) != 0),
+                        pc.eq(pc + 1),
+                        state.eq(0),
+                    ),
+                ),
+                3: If(count == 0,
+                    pc.eq(pc + 1),
+                    state.eq(0),
+                ).Else(
+                    count.eq(count - 1),
+                    If(op == OP_SHR,
+                        acc.eq(acc >> 1),
+                    ),
+                ),
+            }),
+        ]
+
+    def csr_address(self, name):
+        # Names can be (name, offset) to reach the words of wide CSRs.
+        offset = 0
+        if isinstance(name, tuple):
+            name, offset = name
+
+        for region_name, region in self.csr.regions.items():
+            if not name.startswith(region_name + '_'):
+                continue
+            address = region.origin
+            for c in region.obj:
+                if region_name + '_' + c.name == name:
+                    return address + offset
+                address += 4 * ((c.size + region.busword - 1) // region.busword)
+        raise KeyError(name)
+
+    def do_finalize(self):
+        init = []
+        for op, *args in self.program:
+            address, value = 0, 0
+            if op == 'write':
+                code = OP_WRITE
+                name, value = args
+                address = self.csr_address(name)
+            elif op == 'store':
+                code = OP_STORE
+                name, = args
+                address = self.csr_address(name)
+            elif op == 'load':
+                code = OP_LOAD
+                name, = args
+                address = self.csr_address(name)
+            elif op == 'wait':
+                code = OP_WAIT
+                name, value = args
+                address = self.csr_address(name)
+            elif op == 'delay':
+                code = OP_DELAY
+                value, = args
+            elif op == 'shr':
+                code = OP_SHR
+                value, = args
+            else:
+                raise ValueError(op)
+
+            init.append(code | (address << 8) | (value << 40))
+
+        init.append(OP_END)
+        assert len(init) <= self.rom.depth
+        self.rom.init = init
+
+
+def sdram_init_program(phy_settings, timing_settings):
+    '''
+    The same steps as sdram_init() in liblitedram, for PHYs without
+    leveling.
+    '''
+    init_sequence, _ = get_sdram_phy_init_sequence(phy_settings, timing_settings)
+
+    flags = {
+        'DFII_CONTROL_SEL': 0x01,
+        'DFII_CONTROL_CKE': 0x02,
+        'DFII_CONTROL_ODT': 0x04,
+        'DFII_CONTROL_RESET_N': 0x08,
+        'DFII_COMMAND_CS': 0x01,
+        'DFII_COMMAND_WE': 0x02,
+        'DFII_COMMAND_CAS': 0x04,
+        'DFII_COMMAND_RAS': 0x08,
+    }
+
+    program = [('write', 'sdram_dfii_control', DFII_CONTROL_SOFTWARE)]
+    for _, a, ba, cmd, delay in init_sequence:
+        value = 0
+        for flag in cmd.split('|'):
+            value |= flags[flag]
+        program += [
+            ('write', 'sdram_dfii_pi0_address', a),
+            ('write', 'sdram_dfii_pi0_baddress', ba),
+        ]
+        if cmd.startswith('DFII_CONTROL'):
+            program.append(('write', 'sdram_dfii_control', value))
+        else:
+            program += [
+                ('write', 'sdram_dfii_pi0_command', value),
+                ('write', 'sdram_dfii_pi0_command_issue', 1),
+            ]
+        if delay:
+            program.append(('delay', delay))
+    program.append(('write', 'sdram_dfii_control', DFII_CONTROL_HARDWARE))
+
+    return program
+
+
+def flash_read_program(flash_addr):
+    '''
+    Reads 32 bits, big endian, from the SPI flash into the accumulator.
+    '''
+    return [
+        ('write', 'spiflash_spi_cs', 1),
+        ('write', 'spiflash_spi_mosi', (0x03 << 24) | flash_addr),
+        ('write', ('spiflash_spi_mosi', 4), 0),
+        ('write', 'spiflash_spi_control', (64 << 8) | 1),
+        ('wait', 'spiflash_spi_status', 1),
+        ('load', ('spiflash_spi_miso', 4)),
+    ]
+
+
+def config_program(config_addr=CONFIG_ADDR):
+    '''
+    The same as the firmware: the IP address then the MAC address.
+    '''
+    return (
+        flash_read_program(config_addr) + [
+            ('store', 'hub75_soc_ip_address'),
+        ] +
+        # The top 16 bits of the MAC.
+        flash_read_program(config_addr + 4) + [
+            ('shr', 16),
+            ('store', 'hub75_soc_mac_address'),
+        ] +
+        # The bottom 32 bits, which overlap.
+        flash_read_program(config_addr + 6) + [
+            ('store', ('hub75_soc_mac_address', 4)),
+        ]
+    )
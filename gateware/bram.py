@@ -5,10 +5,12 @@ from migen import *
 
 
 class BRAM(Module):
-    def __init__(self, width, depth, init=None, cd_read='sys', cd_write='sys'):
+    def __init__(self, width, depth, init=None, cd_read='sys', cd_write='sys',
+            has_re=False):
         self.width = width
         self.depth = depth
 
         self.specials.mem = Memory(width, depth, init=init)
-        self.specials.read = self.mem.get_port(clock_domain=cd_read, mode=READ_FIRST)
+        self.specials.read = self.mem.get_port(
+            clock_domain=cd_read, mode=READ_FIRST, has_re=has_re)
         self.specials.write = self.mem.get_port(write_capable=True, clock_domain=cd_write)
@@ -0,0 +1,45 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import csr
+
+from litedram.frontend.dma import LiteDRAMDMAWriter
+
+
+class CsrDramWriter(Module, csr.AutoCSR):
+    '''
+    Lets the CPU write to DRAM, which is not on its bus.
+
+    Writing data stores 64 bits at address, then moves address on by two
+    32 bit words. Addresses are in 32 bit words, like base_addr.
+    '''
+    def __init__(self, sdram):
+        port = sdram.crossbar.get_port(mode='write', data_width=64)
+        self.submodules.dma = dma = LiteDRAMDMAWriter(port, 16)
+
+        self._address = csr.CSRStorage(32)
+        self._data = csr.CSRStorage(64)
+
+        address = Signal(32)
+        pending = Signal()
+
+        self.comb += [
+            dma.sink.valid.eq(pending),
+            dma.sink.address.eq(address >> 1),
+            dma.sink.data.eq(self._data.storage),
+        ]
+
+        self.sync += [
+            If(self._address.re,
+                address.eq(self._address.storage),
+            ).Elif(dma.sink.valid & dma.sink.ready,
+                address.eq(address + 2),
+            ),
+            If(self._data.re,
+                pending.eq(1),
+            ).Elif(dma.sink.ready,
+                pending.eq(0),
+            ),
+        ]
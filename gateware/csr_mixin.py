@@ -12,3 +12,10 @@ class CSRMixin(csr.AutoCSR):
             storage = csr.CSRStorage(signal.nbits, signal.reset.value, name=name)
             setattr(self, '_' + name, storage)
             self.comb += signal.eq(storage.storage)
+
+    def add_status_csrs(self, *names):
+        for name in names:
+            signal = getattr(self, name)
+            status = csr.CSRStatus(signal.nbits, name=name)
+            setattr(self, '_' + name, status)
+            self.comb += status.status.eq(signal)
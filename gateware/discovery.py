@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from udp_sender import UdpSender
+
+
+class DiscoveryResponder(Module):
+    '''
+    Answers a datagram to port_num, usually broadcast, with who the card
+    is and how it is doing, so a host can find a whole wall in one round
+    trip.
+
+    The reply goes back to the sender, after 256 cycles for each count of
+    the low byte of the card's IP address so a wall's replies do not all
+    arrive at once. It holds the words:
+
+        0    the request's first word, to match replies to requests
+        1    MAC address, high 16 bits
+        2    MAC address, low 32 bits
+        3    IP address
+        4    multicast group
+        5    enable
+        6    base address
+        7    frame counter
+        8    underruns
+        9    length of the gateware ident in bytes
+        10-  the ident, 4 bytes to a word, first byte in the low bits
+    '''
+    def __init__(self, udp, port_num, ident, mac_address, ip_address,
+            multicast_group, controller):
+        udp_port = udp.crossbar.get_port(port_num, dw=32)
+
+        # UDP port -> (eth_rx) FIFO (sys)
+        renamer = ClockDomainsRenamer({'write': 'eth_rx', 'read': 'sys'})
+        fifo_layout = [("data", 32), ("end", 1), ("ip_address", 32), ("port", 16)]
+        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(fifo_layout, 4))
+
+        source = udp_port.source
+        valid = Signal()
+        self.comb += [
+            valid.eq(source.dst_port == port_num),
+            fifo.sink.valid.eq(source.valid & valid),
+            fifo.sink.data.eq(source.data),
+            fifo.sink.end.eq(source.last),
+            fifo.sink.ip_address.eq(source.ip_address),
+            fifo.sink.port.eq(source.src_port),
+            source.ready.eq(fifo.sink.ready),
+        ]
+
+        # (sys) -> UDP port
+        self.submodules.sender = UdpSender(udp_port, port_num)
+        request = fifo.source
+        reply = self.sender.sink
+
+        ident = ident.encode() if isinstance(ident, str) else bytes(ident)
+        padded = ident + bytes(-len(ident) % 4)
+        ident_words = [
+            int.from_bytes(padded[i:i+4], 'little')
+            for i in range(0, len(padded), 4)
+        ]
+
+        tag = Signal(32)
+        words = [
+            0, tag,
+            mac_address[32:48], mac_address[:32],
+            ip_address, multicast_group,
+            controller.enable, controller.base_addr,
+            controller.frames, controller.underruns,
+            len(ident),
+        ] + ident_words
+        count = len(words) - 1
+
+        first = Signal(reset=1)
+        delay = Signal(17)
+        waiting = Signal()
+        word = Signal(max=count + 1)
+
+        self.comb += [
+            request.ready.eq((word == 0) & ~waiting),
+            reply.valid.eq(word != 0),
+            reply.data.eq(Array(words)[word]),
+            reply.end.eq(word == count),
+            reply.length.eq(count*4),
+        ]
+
+        self.sync += If(waiting,
+            If(delay == 0,
+                waiting.eq(0),
+                word.eq(1),
+            ).Else(
+                delay.eq(delay - 1),
+            ),
+        ).Elif(word == 0,
+            If(request.valid,
+                first.eq(request.end),
+                If(first,
+                    tag.eq(request.data),
+                    reply.ip_address.eq(request.ip_address),
+                    reply.dst_port.eq(request.port),
+                ),
+                If(request.end,
+                    waiting.eq(1),
+                    delay.eq(ip_address[:8] << 8),
+                ),
+            ),
+        ).Elif(reply.ready,
+            If(word == count,
+                word.eq(0),
+            ).Else(
+                word.eq(word+1),
+            ),
+        )
@@ -0,0 +1,191 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import stream
+from litex.soc.interconnect.packet import Arbiter
+
+from liteeth.common import eth_phy_description
+from liteeth.mac.gap import LiteEthMACGap
+
+
+class FrameForwarder(Module):
+    '''
+    Store and forward of whole PHY frames from one clock domain to another.
+
+    The sink takes bytes as a PHY receives them, without back pressure.
+    Each frame is held until its last byte has arrived, so the source
+    never pauses mid frame, as a PHY transmitter requires.
+
+    With a mac_address, frames whose destination is that address are
+    dropped rather than forwarded. mac_offset is where the destination
+    starts in the frame, 8 when the PHY stream includes the preamble.
+
+    Frames that arrive when the buffer is full are truncated.
+    '''
+    def __init__(self, cd_from, cd_to, mac_address=None, mac_offset=8, depth=4096):
+        self.sink = sink = stream.Endpoint(eth_phy_description(8))
+        self.source = source = stream.Endpoint(eth_phy_description(8))
+
+        # One byte per entry, and one token per frame giving its length.
+        # There are enough tokens for a buffer full of the shortest
+        # frames, so a frame is only refused when the tokens run out.
+        data = stream.AsyncFIFO([("data", 8)], depth)
+        tokens = stream.AsyncFIFO([("length", 16), ("forward", 1)], depth // 64)
+        renamer = ClockDomainsRenamer({"write": cd_from, "read": cd_to})
+        self.submodules.data = data = renamer(data)
+        self.submodules.tokens = tokens = renamer(tokens)
+
+        # Receive
+        in_frame = Signal()
+        keep = Signal()
+        length = Signal(16)
+        index = Signal(max=mac_offset + 7)
+        match = Signal()
+
+        kept = Signal()
+        store = Signal()
+        stored = Signal(16)
+        check = Signal()
+        byte_matches = Signal()
+
+        if mac_address is not None:
+            if isinstance(mac_address, int):
+                mac_address = Constant(mac_address, 48)
+            self.comb += Case(index, {
+                mac_offset + i: byte_matches.eq(
+                    sink.data == mac_address[8*(5 - i):8*(6 - i)]
+                )
+                for i in range(6)
+            })
+
+        self.comb += [
+            sink.ready.eq(1),
+            kept.eq(keep | (~in_frame & tokens.sink.ready)),
+            store.eq(sink.valid & kept),
+            stored.eq(Mux(in_frame, length, 0) + (store & data.sink.ready)),
+            check.eq((index >= mac_offset) & (index < mac_offset + 6)),
+
+            data.sink.valid.eq(store),
+            data.sink.data.eq(sink.data),
+
+            # Runt frames are never forwarded.
+            tokens.sink.valid.eq(sink.valid & sink.last & kept),
+            tokens.sink.length.eq(stored),
+            tokens.sink.forward.eq((index == mac_offset + 6) & ~match),
+        ]
+
+        rx_sync = getattr(self.sync, cd_from)
+        rx_sync += If(sink.valid,
+            in_frame.eq(~sink.last),
+            keep.eq(kept & ~sink.last),
+            length.eq(stored),
+            If(check,
+                match.eq((match | (index == mac_offset)) & byte_matches),
+            ),
+            If(sink.last,
+                index.eq(0),
+            ).Elif(index < mac_offset + 6,
+                index.eq(index + 1),
+            ),
+        )
+
+        # Transmit
+        remaining = Signal(16)
+        forward = Signal()
+        busy = Signal()
+        take = Signal()
+
+        self.comb += [
+            take.eq(data.source.valid & (source.ready | ~forward)),
+
+            source.valid.eq(busy & forward & data.source.valid),
+            source.data.eq(data.source.data),
+            source.last.eq(remaining == 1),
+            source.last_be.eq(remaining == 1),
+            data.source.ready.eq(busy & (source.ready | ~forward)),
+
+            tokens.source.ready.eq(~busy),
+        ]
+
+        tx_sync = getattr(self.sync, cd_to)
+        tx_sync += If(~busy,
+            If(tokens.source.valid,
+                remaining.eq(tokens.source.length),
+                forward.eq(tokens.source.forward),
+                busy.eq(tokens.source.length != 0),
+            ),
+        ).Elif(take,
+            remaining.eq(remaining - 1),
+            If(remaining == 1,
+                busy.eq(0),
+            ),
+        )
+
+
+class EthForwarder(Module):
+    '''
+    Passes traffic through a card to a second card, chained off its other
+    Ethernet port.
+
+    Stands in for the upstream PHY in the Ethernet core, so the card still
+    sees every frame from the host. Frames from the host are also stored
+    and forwarded downstream, except those addressed to this card's MAC.
+    Frames from downstream are forwarded to the host, sharing the
+    upstream port with the card's own replies a frame at a time.
+
+    cd_up and cd_down name the clock domains of the two PHYs, as phy_cd in
+    add_udp.
+    '''
+    def __init__(self, phy, downstream, mac_address, cd_up="eth", cd_down="eth1",
+            depth=4096):
+        # The interface the Ethernet core expects of a PHY
+        self.dw = phy.dw
+        self.with_preamble_crc = getattr(phy, "with_preamble_crc", True)
+        self.crg = getattr(phy, "crg", phy)
+        self.rx_clk_freq = getattr(phy, "rx_clk_freq", None)
+        self.tx_clk_freq = getattr(phy, "tx_clk_freq", None)
+
+        self.sink = sink = stream.Endpoint(eth_phy_description(8))
+        self.source = source = stream.Endpoint(eth_phy_description(8))
+
+        mac_offset = 8 if self.with_preamble_crc else 0
+
+        self.submodules.to_down = to_down = FrameForwarder(
+            cd_up + "_rx", cd_down + "_tx",
+            mac_address=mac_address, mac_offset=mac_offset, depth=depth,
+        )
+        self.submodules.to_up = to_up = FrameForwarder(
+            cd_down + "_rx", cd_up + "_tx", depth=depth,
+        )
+
+        # Host -> card and downstream. The receive side of a PHY ignores
+        # ready, so both always take every byte.
+        self.comb += [
+            phy.source.connect(source, omit={"ready"}),
+            phy.source.connect(to_down.sink, omit={"ready"}),
+            phy.source.ready.eq(1),
+        ]
+
+        # Downstream -> host, with a gap after every frame from either
+        # side.
+        up_tx = stream.Endpoint(eth_phy_description(8))
+        self.submodules.up_arbiter = ClockDomainsRenamer(cd_up + "_tx")(
+            Arbiter([sink, to_up.source], up_tx))
+        self.submodules.up_gap = ClockDomainsRenamer(cd_up + "_tx")(
+            LiteEthMACGap(8))
+        self.comb += [
+            up_tx.connect(self.up_gap.sink),
+            self.up_gap.source.connect(phy.sink),
+        ]
+
+        # Host -> downstream
+        self.submodules.down_gap = ClockDomainsRenamer(cd_down + "_tx")(
+            LiteEthMACGap(8))
+        self.comb += [
+            downstream.source.connect(to_up.sink, omit={"ready"}),
+            downstream.source.ready.eq(1),
+            to_down.source.connect(self.down_gap.sink),
+            self.down_gap.source.connect(downstream.sink),
+        ]
@@ -14,19 +14,33 @@ class Hub75Controller(Module, CSRMixin):
         self.submodules.row_filler = row_filler
 
         self.base_addr = Signal(32, reset=base)
+        # Pulses when base_addr is written, even with the same value.
+        self.base_addr_write = Signal()
         self.current_addr = Signal(32, reset=base)
+        self.next_addr = Signal(32, reset=base)
+        self.addr_sources = []
 
         filler_state = Signal()
         row = Signal(5)
-        bank = Signal(1)
+        bank = Signal(3)
         self.enable = Signal()
         cycle_counter = Signal(32)
         self.cycle_length = Signal(32, reset=4100)
 
-        self.buffers_written = Signal(2)
-        self.buffers_read = Signal(2)
-        self.buffers_av = Signal(2)
-        max_buffers = 2 if driver.dbl_buf else 1
+        # The row buffers are a ring, filled ahead of the display by up
+        # to max_buffers rows. The counters wrap, and are wide enough
+        # for their difference to count a full ring.
+        max_buffers = driver.row_buffers
+        self.buffers_written = Signal(bits_for(max_buffers))
+        self.buffers_read = Signal(bits_for(max_buffers))
+        self.buffers_av = Signal(bits_for(max_buffers))
+
+        def next_bank(bank):
+            return If(bank == max_buffers - 1,
+                bank.eq(0),
+            ).Else(
+                bank.eq(bank+1),
+            )
 
         self.comb += [
             self.row_filler.base_addr.eq(self.current_addr),
@@ -46,17 +60,45 @@ class Hub75Controller(Module, CSRMixin):
                 row.eq(driver.addr),#+1),
             ),
             If(row == 0,
-                self.current_addr.eq(self.base_addr),
+                self.current_addr.eq(self.next_addr),
             ),
         ).Elif(~self.row_filler.busy,
             self.buffers_written.eq(self.buffers_written+1),
-            self.row_filler.bank.eq(~self.row_filler.bank),
+            next_bank(self.row_filler.bank),
             row.eq(row+1),
             filler_state.eq(0),
         )
 
+        # The bit planes each buffered row uses, so the driver can skip
+        # those with nothing in them.
+        if hasattr(row_filler, 'planes') and hasattr(driver, 'planes'):
+            row_planes = Array(Signal(8, reset=0xff) for _ in range(max_buffers))
+            self.comb += driver.planes.eq(row_planes[bank])
+            self.sync += If((filler_state == 1) & ~self.row_filler.busy,
+                row_planes[self.row_filler.bank].eq(self.row_filler.planes),
+            )
+
         # Sender
         sender_state = Signal(2)
+        sender_row = Signal(5)
+        self.row_start = Signal()
+        self.frame_start = Signal()
+        self.frame_addr = Signal(32, reset=base)
+        self.swap = Signal()
+
+        self.comb += [
+            self.row_start.eq(
+                (sender_state == 0) & self.enable & (self.buffers_av > 0)
+            ),
+            self.frame_start.eq(self.row_start & (sender_row == 0)),
+            self.swap.eq(self.frame_start & (self.current_addr != self.frame_addr)),
+        ]
+
+        # The base address of the frame being displayed. Row 0 has been
+        # filled by the time it is sent, so current_addr is this frame's.
+        self.sync += If(self.frame_start,
+            self.frame_addr.eq(self.current_addr),
+        )
 
         self.sync += If(sender_state == 0,
             If(self.enable,
@@ -64,17 +106,19 @@ class Hub75Controller(Module, CSRMixin):
                     driver.begin.set.send(),
                     sender_state.eq(1),
                     cycle_counter.eq(0),
+                    sender_row.eq(sender_row+1),
                 )
             ).Else(
                 self.buffers_read.eq(0),
                 bank.eq(0),
+                sender_row.eq(driver.addr),
             ),
         ).Elif(sender_state == 1,
             cycle_counter.eq(cycle_counter+1),
             If(~driver.begin.out,
                 sender_state.eq(2),
                 self.buffers_read.eq(self.buffers_read+1),
-                bank.eq(~bank),
+                next_bank(bank),
             ),
         ).Else(
             cycle_counter.eq(cycle_counter+1),
@@ -83,19 +127,106 @@ class Hub75Controller(Module, CSRMixin):
             ),
         )
 
+        self.add_telemetry(filler_state, sender_state)
+
         if with_csr:
             self.add_csrs()
 
+    def add_addr_source(self, active, addr):
+        '''
+        Adds a source for the frame base address, used instead of
+        base_addr while active. Sources added later take priority.
+        '''
+        self.addr_sources.append((active, addr))
+
+    def do_finalize(self):
+        stmt = self.next_addr.eq(self.base_addr)
+        for active, addr in self.addr_sources:
+            stmt = If(active,
+                self.next_addr.eq(addr),
+            ).Else(stmt)
+        self.comb += stmt
+
+    def add_telemetry(self, filler_state, sender_state):
+        self.frames = Signal(32)
+        self.row_period = Signal(32)
+        self.frame_period = Signal(32)
+        self.underruns = Signal(32)
+        self.filler_max_busy = Signal(32)
+
+        row_counter = Signal(32)
+        frame_counter = Signal(32)
+        filler_counter = Signal(32)
+        running = Signal()
+        starved = Signal()
+
+        # Row and frame periods, measured between row starts.
+        self.sync += [
+            row_counter.eq(row_counter+1),
+            frame_counter.eq(frame_counter+1),
+            If(self.row_start,
+                row_counter.eq(1),
+                If(running,
+                    self.row_period.eq(row_counter),
+                ),
+            ),
+            If(self.frame_start,
+                frame_counter.eq(1),
+                self.frames.eq(self.frames+1),
+                If(running,
+                    self.frame_period.eq(frame_counter),
+                ),
+            ),
+        ]
+
+        # Underruns, counted once each time the sender is left waiting
+        # for a row buffer after it has started displaying.
+        self.sync += [
+            starved.eq(0),
+            If(~self.enable,
+                running.eq(0),
+            ).Elif(self.row_start,
+                running.eq(1),
+            ).Elif(running & (sender_state == 0) & (self.buffers_av == 0),
+                starved.eq(1),
+                If(~starved,
+                    self.underruns.eq(self.underruns+1),
+                ),
+            ),
+        ]
+
+        # Longest time taken to fill a row, since the display was enabled.
+        self.sync += If(~self.enable,
+            self.filler_max_busy.eq(0),
+        ).Elif(filler_state == 1,
+            filler_counter.eq(filler_counter+1),
+        ).Else(
+            filler_counter.eq(0),
+            If(filler_counter > self.filler_max_busy,
+                self.filler_max_busy.eq(filler_counter),
+            ),
+        )
+
     def add_csrs(self):
         self._enable = csr.CSRStorage()
         self.comb += [
             self.enable.eq(self._enable.storage),
         ]
         self.add_storage_csrs('cycle_length', 'base_addr')
+        self.comb += self.base_addr_write.eq(self._base_addr.re)
+        self.add_status_csrs(
+            'frames',
+            'row_period',
+            'frame_period',
+            'underruns',
+            'filler_max_busy',
+            'frame_addr',
+        )
 
     def get_csrs(self):
         csrs = super().get_csrs()
         for csr in csrs:
             csr.name = csr.name.replace('driver_driver_data_driver_', '')
             csr.name = csr.name.replace('driver_driver_enable_driver_', '')
+            csr.name = csr.name.replace('row_filler_', '')
         return csrs
@@ -52,9 +52,68 @@ class MultiRowReader(Module):
         ]
 
 
+class DividedMultiRowReader(Module):
+    '''
+    Reads RGB data from multiple row memories.
+    Outputs a clk signal for the HUB75 connectors as two half cycle
+    values, clk_rise and clk_fall, to be driven out through a DDR
+    output register.
+
+    Everything is done in the 'sys' clock domain, with one pixel shifted
+    every `div` cycles, so the panel clock can run at up to sys rate.
+    The memory read ports must have read enables, which are held with
+    the shifters.
+    '''
+
+    def __init__(self, mem_reads, count=128):
+        # Interface
+        self.div = Signal(8, reset=2)
+        self.clk_rise = Signal()
+        self.clk_fall = Signal()
+
+        # State
+        renamer = ClockDomainsRenamer({'read': 'sys'})
+        self.submodules.reader = reader = CEInserter()(renamer(MultiRowReader(
+            mem_reads,
+            count,
+        )))
+        self.busy = reader.busy
+        self.addr = reader.addr
+        self.outputs = reader.outputs
+        self.shifters = reader.shifters
+
+        div = Signal(8)
+        counter = Signal(8)
+        active = Signal()
+
+        # The shifters advance on the last cycle of each pixel period.
+        # The panel clock rises half way through the period, counted in
+        # half cycles so a divider of 1 still gets a clean edge.
+        self.comb += [
+            div.eq(Mux(self.div == 0, 1, self.div)),
+            reader.ce.eq(counter >= div - 1),
+            active.eq(reader.busy & reader.outputting),
+            self.clk_rise.eq(active & ((counter << 1) >= div)),
+            self.clk_fall.eq(active & (((counter << 1) + 1) >= div)),
+        ]
+        self.comb += [
+            mem_read.re.eq(reader.ce) for mem_read in mem_reads
+        ]
+
+        self.sync += If(counter >= div - 1,
+            counter.eq(0),
+        ).Else(
+            counter.eq(counter+1),
+        )
+
+    def start(self):
+        return self.reader.start()
+
+
 class HUB75DataDriver(Module, CSRMixin):
     def __init__(self, ports, mem_reads,
-            with_csr=False, cd_read='sys', pixel_count=128):
+            with_csr=False, cd_read='sys', pixel_count=128, ddr_clk=False):
+        self.ddr_clk = ddr_clk
         self.plane = Signal(3)
         self.clk = Signal()
         self.lat = Signal()
@@ -66,12 +125,23 @@ class HUB75DataDriver(Module, CSRMixin):
         self.latch_cycles = Signal(8, reset=3)
         self.postlatch_cycles = Signal(8, reset=1)
 
-        # Create a MultiRowReader
-        renamer = ClockDomainsRenamer({'read': cd_read})
-        self.submodules.multi_row_reader = renamer(MultiRowReader(
-            mem_reads,
-            pixel_count,
-        ))
+        if ddr_clk:
+            # Create a DividedMultiRowReader, clocked from sys
+            self.clk_div = Signal(8, reset=2)
+            self.submodules.multi_row_reader = DividedMultiRowReader(
+                mem_reads,
+                pixel_count,
+            )
+            self.clk_rise = self.multi_row_reader.clk_rise
+            self.clk_fall = self.multi_row_reader.clk_fall
+            self.comb += self.multi_row_reader.div.eq(self.clk_div)
+        else:
+            # Create a MultiRowReader
+            renamer = ClockDomainsRenamer({'read': cd_read})
+            self.submodules.multi_row_reader = renamer(MultiRowReader(
+                mem_reads,
+                pixel_count,
+            ))
 
         for idx, port in enumerate(ports):
             m0 = self.multi_row_reader.shifters[idx*2]
@@ -88,8 +158,9 @@ class HUB75DataDriver(Module, CSRMixin):
 
         self.comb += [
             self.busy.eq(self.begin.out),
-            self.clk.eq(self.multi_row_reader.clk),
         ]
+        if not ddr_clk:
+            self.comb += self.clk.eq(self.multi_row_reader.clk)
 
         self.sync += Case(state, {
             0: [ # Idle
@@ -145,6 +216,8 @@ class HUB75DataDriver(Module, CSRMixin):
             'latch_cycles',
             'postlatch_cycles',
         )
+        if self.ddr_clk:
+            self.add_storage_csrs('clk_div')
 
 
 class HUB75EnableDriver(Module, CSRMixin):
@@ -159,6 +232,9 @@ class HUB75EnableDriver(Module, CSRMixin):
         self.output_cycles = Signal(16, reset=6)
         self.addr_switch_cycles = Signal(16, reset=1)
 
+        # Keeps the outputs off for the plane, with the same timing.
+        self.blank = Signal()
+
         counter = Signal(32)
         state = Signal(2)
 
@@ -171,7 +247,7 @@ class HUB75EnableDriver(Module, CSRMixin):
                 If(self.begin.out,
                     state.eq(1),
                     counter.eq(1),
-                    self.oen.eq(0),
+                    self.oen.eq(self.blank),
                 ),
             ],
             1: [ # OEN
@@ -213,20 +289,35 @@ class HUB75EnableDriver(Module, CSRMixin):
 
 
 class Hub75Driver(Module, CSRMixin):
-    '''Drives output for a single row'''
-    def __init__(self, data_driver, enable_driver):
+    '''
+    Drives output for a single row
+
+    Planes whose bit is clear in planes have no bits set anywhere in the
+    row, so with skip_blank_planes they are not shifted out or latched.
+    Their output time is still taken, with the outputs off, so the
+    brightness of the other planes is unchanged.
+    '''
+    def __init__(self, data_driver, enable_driver, with_csr=False):
         self.submodules.data_driver = data_driver
         self.submodules.enable_driver = enable_driver
         self.submodules.begin = FastLatch()
         self.busy = self.begin.out
         self.next_addr = Signal(5)
+        self.planes = Signal(8, reset=0xff)
+        self.skip_blank_planes = Signal(reset=1)
 
         state = Signal(2)
         plane = Signal(3)
+        skip = Signal()
+        next_plane = Signal(3)
+        next_skip = Signal()
+        used = Array(self.planes[i] for i in range(8))
 
         self.comb += [
             self.data_driver.lat_wait.eq(self.enable_driver.busy),
             self.data_driver.plane.eq(plane),
+            next_plane.eq(plane-1),
+            next_skip.eq(self.skip_blank_planes & ~used[next_plane]),
         ]
 
         self.sync += Case(state, {
@@ -234,13 +325,18 @@ class Hub75Driver(Module, CSRMixin):
                 If(self.begin.out,
                     state.eq(1),
                     plane.eq(7),
-                    self.data_driver.start(),
+                    skip.eq(self.skip_blank_planes & ~used[7]),
+                    If(~self.skip_blank_planes | used[7],
+                        self.data_driver.start(),
+                    ),
                 ),
             ],
-            1: [ # Sending data
-                If(~self.data_driver.busy,
+            1: [ # Sending data, or for a skipped plane waiting for the
+                 # last plane's output to finish
+                If(~self.data_driver.busy & ~(skip & self.enable_driver.busy),
                     state.eq(2),
                     self.enable_driver.plane.eq(plane),
+                    self.enable_driver.blank.eq(skip),
                     self.enable_driver.start(),
                     If(plane == 0,
                         self.enable_driver.next_addr.eq(self.next_addr),
@@ -254,10 +350,19 @@ class Hub75Driver(Module, CSRMixin):
                     ).Else(
                         state.eq(1),
                         plane.eq(plane-1),
-                        self.data_driver.start(),
+                        skip.eq(next_skip),
+                        If(~next_skip,
+                            self.data_driver.start(),
+                        ),
                     ),
             ],
         })
 
+        if with_csr:
+            self.add_csrs()
+
     def start(self):
         return self.begin.set.send()
+
+    def add_csrs(self):
+        self.add_storage_csrs('skip_blank_planes')
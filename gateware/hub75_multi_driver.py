@@ -1,5 +1,6 @@
 from migen import *
 
+from litex.build.io import DDROutput
 from litex.soc.interconnect import csr
 
 from bram import BRAM
@@ -8,15 +9,20 @@ from utils import FastLatch
 
 
 class Hub75MultiDriver(Module, csr.AutoCSR):
-    def __init__(self, addrs, clk, lat, oen, ports, cd_read='sys', dbl_buf=False, with_csr=False):
+    def __init__(self, addrs, clk, lat, oen, ports, cd_read='sys', row_buffers=2, ddr_clk=False,
+            with_csr=False):
+        assert 2 <= row_buffers <= 8
         self.ports = ports
-        self.dbl_buf = dbl_buf
+        self.row_buffers = row_buffers
 
         self.submodules.begin = FastLatch()
         self.addr = addrs
 
+        # Each memory holds a ring of row_buffers rows, of 128 24 bit
+        # pixels each.
+        row_words = 128 * 24 // 32
         self.submodules.mems = [
-            BRAM(32, 128 * (2 if dbl_buf else 1), cd_read='read')
+            BRAM(32, max(128, row_words * row_buffers), cd_read='read', has_re=ddr_clk)
             for _ in range(2*len(ports))
         ]
         renamer = ClockDomainsRenamer({'read': cd_read})
@@ -25,29 +31,40 @@ class Hub75MultiDriver(Module, csr.AutoCSR):
             [mem.read for mem in self.mems],
             with_csr=with_csr,
             cd_read=cd_read,
+            ddr_clk=ddr_clk,
         )
         enable_driver = HUB75EnableDriver(
             with_csr=with_csr,
         )
-        self.submodules.driver = Hub75Driver(data_driver, enable_driver)
+        self.submodules.driver = Hub75Driver(
+            data_driver, enable_driver,
+            with_csr=with_csr,
+        )
 
-        self.bank = Signal(1)
-        if dbl_buf:
-            self.comb += If(self.bank,
-                data_driver.multi_row_reader.addr.eq(128 * 24 // 32),
-            ).Else(
-                data_driver.multi_row_reader.addr.eq(0),
-            )
+        # The bit planes used by the row being shown.
+        self.planes = Signal(8, reset=0xff)
+        self.comb += self.driver.planes.eq(self.planes)
+
+        self.bank = Signal(3)
+        self.comb += data_driver.multi_row_reader.addr.eq(self.bank * row_words)
 
         state = Signal()
 
         self.comb += [
             addrs.eq(enable_driver.addr),
-            clk.eq(data_driver.clk),
             lat.eq(data_driver.lat),
             oen.eq(enable_driver.oen),
         ]
 
+        if ddr_clk:
+            self.specials += DDROutput(
+                data_driver.clk_rise,
+                data_driver.clk_fall,
+                clk,
+            )
+        else:
+            self.comb += clk.eq(data_driver.clk)
+
         self.sync += If(state == 0,
             If(self.begin.out,
                 self.driver.next_addr.eq(addrs+1),
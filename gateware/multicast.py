@@ -0,0 +1,170 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from liteeth.common import eth_phy_description
+
+
+ETHERTYPE_IPV4 = 0x0800
+IGMP_PROTOCOL = 2
+IGMP_V2_REPORT = 0x16
+
+
+class MulticastFilter(Module):
+    '''
+    Drops IPv4 multicast frames for groups other than `group`, before
+    the Ethernet core sees them. Everything else passes through, and a
+    group of 0 drops all multicast.
+
+    Stands in for the PHY in the Ethernet core, and runs in the PHY's
+    receive clock domain. Frames are delayed just long enough to see
+    their destination IP address, so nothing is buffered.
+    '''
+    def __init__(self, phy):
+        # The interface the Ethernet core expects of a PHY
+        self.dw = phy.dw
+        self.with_preamble_crc = getattr(phy, "with_preamble_crc", True)
+        self.crg = getattr(phy, "crg", phy)
+        self.rx_clk_freq = getattr(phy, "rx_clk_freq", None)
+        self.tx_clk_freq = getattr(phy, "tx_clk_freq", None)
+        self.sink = phy.sink
+        self.source = source = stream.Endpoint(eth_phy_description(8))
+
+        self.group = Signal(32)
+
+        # Offsets in the frame of what decides it.
+        mac = 8 if self.with_preamble_crc else 0
+        ethertype = mac + 12
+        dst_ip = mac + 14 + 16
+        delay = dst_ip + 4
+
+        # Receive side
+        sink = phy.source
+        byte = sink.data
+        index = Signal(max=delay + 1)
+        in_frame = Signal()
+        mcast = Signal()
+        ipv4 = Signal()
+        member = Signal()
+
+        # Only the 01:00:5e prefix is checked, as the group's own bits are
+        # compared in the IP address.
+        checks = {
+            mac: mcast.eq(byte == 0x01),
+            mac + 1: mcast.eq(mcast & (byte == 0x00)),
+            mac + 2: mcast.eq(mcast & (byte == 0x5e)),
+            ethertype: ipv4.eq(byte == ETHERTYPE_IPV4 >> 8),
+            ethertype + 1: ipv4.eq(ipv4 & (byte == ETHERTYPE_IPV4 & 0xff)),
+        }
+        for i in range(4):
+            group_byte = self.group[8*(3 - i):8*(4 - i)]
+            if i == 0:
+                checks[dst_ip] = member.eq(byte == group_byte)
+            else:
+                checks[dst_ip + i] = member.eq(member & (byte == group_byte))
+
+        # The index is that of the byte arriving, 0 at the start of a frame.
+        position = Signal(max=delay + 1)
+        self.comb += position.eq(Mux(in_frame, index, 0))
+
+        self.sync += If(sink.valid,
+            in_frame.eq(~sink.last),
+            If(position < delay,
+                index.eq(position + 1),
+            ),
+            Case(position, checks),
+        )
+
+        keep = Signal()
+        self.comb += keep.eq(~(mcast & ipv4) | ((self.group != 0) & member))
+
+        # A fixed delay, so the decision for a frame is known by the time
+        # its first byte comes out.
+        fields = Cat(sink.valid, sink.last, sink.data, sink.last_be, sink.error)
+        line = [Signal(len(fields)) for _ in range(delay)]
+        self.sync += line[0].eq(fields)
+        self.sync += [b.eq(a) for a, b in zip(line, line[1:])]
+
+        delayed = stream.Endpoint(eth_phy_description(8))
+        self.comb += Cat(
+            delayed.valid, delayed.last, delayed.data, delayed.last_be, delayed.error,
+        ).eq(line[-1])
+
+        # Send side
+        out_frame = Signal()
+        out_keep = Signal()
+        passing = Signal()
+        self.comb += [
+            sink.ready.eq(1),
+            passing.eq(Mux(out_frame, out_keep, keep)),
+            delayed.connect(source, omit={"valid", "ready"}),
+            source.valid.eq(delayed.valid & passing),
+        ]
+        self.sync += If(delayed.valid,
+            out_frame.eq(~delayed.last),
+            If(~out_frame,
+                out_keep.eq(keep),
+            ),
+        )
+
+
+class IgmpReporter(Module):
+    '''
+    Sends IGMPv2 membership reports for `group`, when it changes and then
+    every `interval` seconds, so switches with IGMP snooping pass the
+    group's traffic to the card.
+
+    Runs in the clock domain of the IP core.
+    '''
+    def __init__(self, ip, group, clk_freq, interval=60):
+        port = ip.crossbar.get_port(IGMP_PROTOCOL, dw=8)
+        sink = port.sink
+        self.comb += port.source.ready.eq(1)
+
+        reported = Signal(32)
+        timer = Signal(max=int(clk_freq*interval) + 1)
+        byte = Signal(3)
+        sending = Signal()
+
+        # Type, max response time, checksum, group.
+        total = Signal(18)
+        folded = Signal(17)
+        checksum = Signal(16)
+        self.comb += [
+            total.eq((IGMP_V2_REPORT << 8) + reported[16:] + reported[:16]),
+            folded.eq(total[:16] + total[16:]),
+            checksum.eq(~(folded[:16] + folded[16])),
+        ]
+        message = Array([
+            IGMP_V2_REPORT, 0, checksum[8:], checksum[:8],
+            reported[24:], reported[16:24], reported[8:16], reported[:8],
+        ])
+
+        self.comb += [
+            sink.valid.eq(sending),
+            sink.protocol.eq(IGMP_PROTOCOL),
+            sink.ip_address.eq(reported),
+            sink.length.eq(8),
+            sink.data.eq(message[byte]),
+            sink.last.eq(byte == 7),
+            sink.last_be.eq(byte == 7),
+        ]
+
+        self.sync += If(~sending,
+            If((group != 0) & ((timer == 0) | (group != reported)),
+                sending.eq(1),
+                byte.eq(0),
+                reported.eq(group),
+                timer.eq(int(clk_freq*interval)),
+            ).Elif(timer != 0,
+                timer.eq(timer - 1),
+            ),
+        ).Elif(sink.ready,
+            byte.eq(byte + 1),
+            If(byte == 7,
+                sending.eq(0),
+            ),
+        )
@@ -0,0 +1,241 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Draws test patterns straight into DRAM.
+'''
+from migen import *
+from litex.soc.interconnect import csr
+
+from litedram.frontend.dma import LiteDRAMDMAWriter
+
+from blit_engine import PendingWrites
+from csr_mixin import CSRMixin
+from udp_dram_writer import BANK_SIZE
+from utils import FastLatch
+
+
+SOLID = 0
+GRADIENT_X = 1
+GRADIENT_Y = 2
+PANEL_ID = 3
+BAR = 4
+
+PANELS = 16
+# A row is 64 pixels of 3 bytes, which is 24 64 bit words.
+ROW_WORDS = 24
+
+
+class PatternGenerator(Module, CSRMixin):
+    '''
+    Fills a bank at addr with a test pattern, through the SDRAM crossbar,
+    so the display can be checked and benchmarked with no network
+    traffic.
+
+    The patterns are:
+
+        SOLID       every pixel color
+        GRADIENT_X  a ramp from black on the left to color on the right
+        GRADIENT_Y  the same from the top of each panel to the bottom
+        PANEL_ID    the panel's position in the chain in binary, as four
+                    16 pixel wide stripes, most significant on the left,
+                    with a white border along the top and left edges
+        BAR         a vertical bar, width pixels wide from position
+
+    Gradient and panel ID pixels are color where lit, but each channel
+    is either on or off.
+
+    With continuous set, the pattern is drawn over and over, alternating
+    between addr and the bank after it, and each finished bank is shown
+    by the controller. position moves on by step each time, so the bar
+    moves across the panels. Clearing continuous hands the display back
+    to base_addr.
+
+    addr is in 32 bit words, like base_addr, and must be even.
+    '''
+    def __init__(self, sdram, controller=None, with_csr=False):
+        port = sdram.crossbar.get_port(mode='write', data_width=64)
+
+        # Interface
+        self.addr = Signal(32)
+        self.pattern = Signal(3)
+        self.color = Signal(24, reset=0xffffff)
+        self.position = Signal(6)
+        self.width = Signal(7, reset=8)
+        self.step = Signal(6, reset=1)
+        self.continuous = Signal()
+        self.submodules.begin = FastLatch()
+        self.busy = Signal()
+        self.frames = Signal(32)
+
+        self.submodules.writer = writer = LiteDRAMDMAWriter(port, 16)
+        self.submodules.pending = pending = PendingWrites(port, 16)
+
+        # State
+        IDLE = 0
+        DRAW = 1
+        FLUSH = 2
+        WAIT = 3
+        state = Signal(2)
+
+        word = Signal(max=ROW_WORDS)
+        y = Signal(6)
+        panel = Signal(4)
+        target = Signal(32)
+        buffer = Signal()
+        position = Signal(6)
+        self.shown = Signal(32)
+        self.showing = Signal()
+
+        if controller is not None:
+            controller.add_addr_source(self.showing, self.shown)
+            displayed = controller.frame_addr == self.shown
+        else:
+            displayed = 1
+
+        # The first pixel and channel of each word of a row.
+        first_pixel = Array((8*j) // 3 for j in range(ROW_WORDS))[word]
+        first_channel = Array((8*j) % 3 for j in range(ROW_WORDS))[word]
+
+        # The four pixels a word can touch.
+        pixels = []
+        for i in range(4):
+            x = Signal(6)
+            self.comb += x.eq(first_pixel + i)
+            pixels.append(self.pixel(x, y, panel, position))
+
+        # Bytes go into the word as the host's datagrams put them there:
+        # big endian within each 32 bit half.
+        data = Signal(64)
+        for c0 in range(3):
+            bytes_ = []
+            for k in range(8):
+                pixel = pixels[(c0 + k) // 3]
+                channel = (c0 + k) % 3
+                # RGB, red first
+                bytes_.append(pixel[8*(2 - channel):8*(3 - channel)])
+            lanes = [None] * 8
+            for k, b in enumerate(bytes_):
+                lanes[4*(k // 4) + 3 - k % 4] = b
+            self.comb += If(first_channel == c0, data.eq(Cat(*lanes)))
+
+        self.comb += [
+            self.busy.eq(self.begin.out),
+            writer.sink.valid.eq(state == DRAW),
+            writer.sink.address.eq((target >> 1) + ((panel*64 + y)*ROW_WORDS) + word),
+            writer.sink.data.eq(data),
+        ]
+
+        last = (word == ROW_WORDS - 1) & (y == 63) & (panel == PANELS - 1)
+        self.sync += Case(state, {
+            IDLE: If(self.begin.out,
+                state.eq(DRAW),
+                buffer.eq(0),
+                target.eq(self.addr),
+                position.eq(self.position),
+                self.showing.eq(0),
+            ),
+            DRAW: If(writer.sink.ready,
+                If(word == ROW_WORDS - 1,
+                    word.eq(0),
+                    y.eq(y+1),
+                    If(y == 63,
+                        panel.eq(panel+1),
+                    ),
+                ).Else(
+                    word.eq(word+1),
+                ),
+                If(last,
+                    state.eq(FLUSH),
+                ),
+            ),
+            # A bank is only counted, and shown, once the controller has
+            # taken every write.
+            FLUSH: If(pending.idle,
+                self.frames.eq(self.frames+1),
+                If(self.continuous,
+                    state.eq(WAIT),
+                    self.shown.eq(target),
+                    self.showing.eq(1),
+                    buffer.eq(~buffer),
+                    target.eq(Mux(buffer, self.addr, self.addr + BANK_SIZE)),
+                    position.eq(position + self.step),
+                ).Else(
+                    state.eq(IDLE),
+                    self.showing.eq(0),
+                    self.begin.reset.send(),
+                ),
+            ),
+            # The next bank is drawn over the one shown before, once the
+            # display has moved off it.
+            WAIT: If(~self.continuous,
+                state.eq(IDLE),
+                self.showing.eq(0),
+                self.begin.reset.send(),
+            ).Elif(displayed,
+                state.eq(DRAW),
+            ),
+        })
+
+        if with_csr:
+            self.add_csrs()
+
+    def pixel(self, x, y, panel, position):
+        '''The 24 bit RGB pixel at x, y of panel.'''
+        pixel = Signal(24)
+        level = Signal(8)
+        lit = Signal()
+        # Each channel of color that is set, at level.
+        ramp = Cat(*[
+            Mux(self.color[8*c:8*(c + 1)] != 0, level, 0)
+            for c in range(3)
+        ])
+
+        self.comb += Case(self.pattern, {
+            SOLID: pixel.eq(self.color),
+            GRADIENT_X: [
+                level.eq(Cat(x[4:], x)),
+                pixel.eq(ramp),
+            ],
+            GRADIENT_Y: [
+                level.eq(Cat(y[4:], y)),
+                pixel.eq(ramp),
+            ],
+            PANEL_ID: [
+                level.eq(0xff),
+                lit.eq((panel >> (3 - x[4:]))[0]),
+                If((x == 0) | (y == 0),
+                    pixel.eq(0xffffff),
+                ).Elif(lit,
+                    pixel.eq(ramp),
+                ),
+            ],
+            BAR: [
+                lit.eq((x - position)[:6] < self.width),
+                If(lit,
+                    pixel.eq(self.color),
+                ),
+            ],
+        })
+        return pixel
+
+    def start(self):
+        return self.begin.set.send()
+
+    def add_csrs(self):
+        # The parameters are followed by start, so a single datagram can
+        # set them all and then start drawing.
+        self.add_storage_csrs(
+            'addr',
+            'pattern',
+            'color',
+            'position',
+            'width',
+            'step',
+            'continuous',
+        )
+        self._start = csr.CSR()
+        self.sync += If(self._start.re,
+            self.start(),
+        )
+        self.add_status_csrs('busy', 'frames')
@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+
+# Wire formats, from bits 24-27 of the packet header.
+FORMAT_RGB888 = 0
+FORMAT_RGB565 = 1
+FORMAT_RGB666 = 2
+
+
+class Gearbox(Module):
+    '''
+    Repacks a stream of iw bit words into ow bit words, LSB first.
+
+    Bits left over when clear is pulsed are dropped.
+    '''
+    def __init__(self, iw, ow):
+        self.sink = sink = stream.Endpoint([("data", iw)])
+        self.source = source = stream.Endpoint([("data", ow)])
+        self.clear = Signal()
+
+        size = iw + ow
+        buf = Signal(size)
+        self.count = count = Signal(max=size + 1)
+
+        pop = Signal()
+        push = Signal()
+        shifted = Signal(size)
+        remaining = Signal(max=size + 1)
+
+        self.comb += [
+            source.valid.eq(count >= ow),
+            source.data.eq(buf[:ow]),
+            sink.ready.eq(count <= size - iw),
+
+            pop.eq(source.valid & source.ready),
+            push.eq(sink.valid & sink.ready),
+
+            If(pop,
+                shifted.eq(buf[ow:]),
+                remaining.eq(count - ow),
+            ).Else(
+                shifted.eq(buf),
+                remaining.eq(count),
+            ),
+        ]
+
+        self.sync += If(self.clear,
+            buf.eq(0),
+            count.eq(0),
+        ).Else(
+            If(push,
+                buf.eq(shifted | (sink.data << remaining)),
+                count.eq(remaining + iw),
+            ).Else(
+                buf.eq(shifted),
+                count.eq(remaining),
+            ),
+        )
+
+
+def expand(value, bits):
+    # Fill the low bits by repeating the top ones, so full scale stays
+    # full scale.
+    return Cat(value[2*bits - 8:], value)
+
+
+class PixelExpander(Module):
+    '''
+    Expands RGB565 or RGB666 pixels to the 24 bit RGB of the framebuffer.
+
+    The input is a bit stream, LSB first, of 16 or 18 bit pixels with blue
+    in the low bits. The output is R, G, B bytes packed into 32 bit words,
+    the first byte in the low bits, as sent for FORMAT_RGB888.
+    '''
+    def __init__(self):
+        self.sink = sink = stream.Endpoint([("data", 32)])
+        self.source = source = stream.Endpoint([("data", 32)])
+        self.format = Signal(4)
+        self.clear = Signal()
+        self.idle = Signal()
+
+        self.submodules.rgb565 = rgb565 = Gearbox(32, 16)
+        self.submodules.rgb666 = rgb666 = Gearbox(32, 18)
+        self.submodules.out = out = Gearbox(24, 32)
+
+        def rgb(pixel, r, g, b):
+            return Cat(
+                expand(pixel[g + b:], r),
+                expand(pixel[b:b + g], g),
+                expand(pixel[:b], b),
+            )
+
+        self.comb += [
+            rgb565.clear.eq(self.clear),
+            rgb666.clear.eq(self.clear),
+            out.clear.eq(self.clear),
+
+            rgb565.sink.data.eq(sink.data),
+            rgb666.sink.data.eq(sink.data),
+            If(self.format == FORMAT_RGB666,
+                rgb666.sink.valid.eq(sink.valid),
+                sink.ready.eq(rgb666.sink.ready),
+                out.sink.valid.eq(rgb666.source.valid),
+                out.sink.data.eq(rgb(rgb666.source.data, 6, 6, 6)),
+                rgb666.source.ready.eq(out.sink.ready),
+                self.idle.eq((rgb666.count < 18) & (out.count < 32)),
+            ).Else(
+                rgb565.sink.valid.eq(sink.valid),
+                sink.ready.eq(rgb565.sink.ready),
+                out.sink.valid.eq(rgb565.source.valid),
+                out.sink.data.eq(rgb(rgb565.source.data, 5, 6, 5)),
+                rgb565.source.ready.eq(out.sink.ready),
+                self.idle.eq((rgb565.count < 16) & (out.count < 32)),
+            ),
+
+            out.source.connect(source),
+        ]
@@ -35,16 +35,30 @@ from liteeth.phy.model import LiteEthPHYModel
 from clockdiv3 import ClockDiv3
 from hub75_multi_driver import Hub75MultiDriver
 from hub75_controller import Hub75Controller
+from animation_sequencer import AnimationSequencer
+from blit_engine import BlitEngine
+from boot_sequencer import BootSequencer, sdram_init_program, config_program
+from csr_dram_writer import CsrDramWriter
+from discovery import DiscoveryResponder
+from eth_forwarder import EthForwarder
+from multicast import MulticastFilter, IgmpReporter
 from row_filler import RowFiller
+from time_base import TimeBase, ScheduledSwap
 from mem_stream import MemStreamWriter
+from pattern_generator import PatternGenerator
 from udp_dram_writer import UdpDramWriter
 from udp_wishbone_writer import UdpWishboneWriter
+from udp_wishbone_reader import UdpWishboneReader
+from vsync_notifier import VsyncNotifier
 
 
 class _CRG(colorlight_5a_75x._CRG):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, with_div3=True, **kwargs):
         super().__init__(*args, **kwargs)
 
+        if not with_div3:
+            return
+
         # Add a sys/3 clock.
         self.submodules.cd3 = ClockDiv3()
         self.clock_domains.cd_sys_div3 = ClockDomain(reset_less=True)
@@ -56,7 +70,10 @@ class _CRG(colorlight_5a_75x._CRG):
 class Receiver75(SoCCore):
     def __init__(self, board, revision, sys_clk_freq=60e6, with_ethernet=False,
             with_etherbone=True, eth_ip="192.168.0.39", eth_phy=0,
-            use_internal_osc=True, sdram_rate="1:1", **kwargs):
+            use_internal_osc=True, sdram_rate="1:1", hub75_ddr_clk=False,
+            hub75_viewport=False, hub75_row_buffers=4, hw_boot=False, eth_forward=False,
+            eth_jumbo=False,
+            **kwargs):
         if board == "5a-75b":
             platform = colorlight_5a_75b.Platform(revision=revision)
         elif board == "5a-75e":
@@ -66,7 +83,7 @@ class Receiver75(SoCCore):
         SoCCore.__init__(self, platform, int(sys_clk_freq),
             ident = "Receiver75 on Colorlight " + board,
             ident_version = True,
-            integrated_main_ram_size=0x1000,
+            integrated_main_ram_size=0 if hw_boot else 0x1000,
             **kwargs)
 
         # CRG
@@ -76,15 +93,17 @@ class Receiver75(SoCCore):
             with_usb_pll=False,
             with_rst=False,
             sdram_rate=sdram_rate,
+            with_div3=not hub75_ddr_clk,
         )
 
         # SDRAM - not used directly by the CPU
         sdrphy_cls = HalfRateGENSDRPHY if sdram_rate == "1:2" else GENSDRPHY
         self.submodules.sdrphy = sdrphy_cls(platform.request("sdram"), sys_clk_freq)
         sdram_cls  = M12L64322A
+        sdram_module = sdram_cls(sys_clk_freq, sdram_rate)
         self.add_sdram("sdram",
             phy           = self.sdrphy,
-            module        = sdram_cls(sys_clk_freq, sdram_rate),
+            module        = sdram_module,
             l2_cache_size = kwargs.get("l2_size", 1024),
             with_soc_interconnect=False,
         )
@@ -95,6 +114,7 @@ class Receiver75(SoCCore):
         self.submodules.hub75_soc = CSRS()
         self.hub75_soc.mac_address = csr.CSRStorage(6*8, 0x10e2d5000000, name='mac_address')
         self.hub75_soc.ip_address = csr.CSRStorage(4*8, convert_ip(eth_ip))
+        self.hub75_soc.multicast_group = csr.CSRStorage(4*8, 0, name='multicast_group')
 
         # Etherbone
         if with_ethernet or with_etherbone:
@@ -102,13 +122,38 @@ class Receiver75(SoCCore):
                 clock_pads = self.platform.request("eth_clocks", eth_phy),
                 pads       = self.platform.request("eth", eth_phy),
                 tx_delay   = 0e-9)
+            ethphy = self.ethphy
+
+            # Second port, to chain another card off this one
+            if eth_forward:
+                self.submodules.ethphy1 = ClockDomainsRenamer({
+                    "eth_rx": "eth1_rx",
+                    "eth_tx": "eth1_tx"})(LiteEthPHYRGMII(
+                        clock_pads = self.platform.request("eth_clocks", eth_phy ^ 1),
+                        pads       = self.platform.request("eth", eth_phy ^ 1),
+                        tx_delay   = 0e-9))
+                self.submodules.ethfwd = ethphy = EthForwarder(
+                    self.ethphy, self.ethphy1,
+                    self.hub75_soc.mac_address.storage,
+                    depth=16384 if eth_jumbo else 4096,
+                )
+
+                eth1_rx_clk = self.ethphy1.crg.cd_eth_rx.clk
+                eth1_tx_clk = self.ethphy1.crg.cd_eth_tx.clk
+                self.platform.add_period_constraint(eth1_rx_clk, 1e9/self.ethphy1.rx_clk_freq)
+                self.platform.add_period_constraint(eth1_tx_clk, 1e9/self.ethphy1.tx_clk_freq)
+                self.platform.add_false_path_constraints(
+                    self.crg.cd_sys.clk, self.ethphy.crg.cd_eth_rx.clk,
+                    eth1_rx_clk, eth1_tx_clk)
+
             if with_ethernet:
-                self.add_ethernet(phy=self.ethphy)
-                self.add_udp(phy=self.ethphy,
+                self.add_ethernet(phy=ethphy)
+                self.add_udp(phy=ethphy,
                     mac_address=self.hub75_soc.mac_address.storage,
-                    ip_address=self.hub75_soc.ip_address.storage)
+                    ip_address=self.hub75_soc.ip_address.storage,
+                    multicast_group=self.hub75_soc.multicast_group.storage)
             else:
-                self.add_etherbone(phy=self.ethphy,
+                self.add_etherbone(phy=ethphy,
                     mac_address=self.hub75_soc.mac_address.storage,
                     ip_address=self.hub75_soc.ip_address.storage)
 
@@ -145,7 +190,8 @@ class Receiver75(SoCCore):
             ],
             cd_read='sys_div3',
             with_csr=True,
-            dbl_buf=True,
+            row_buffers=hub75_row_buffers,
+            ddr_clk=hub75_ddr_clk,
         )
 
         port = self.sdram.crossbar.get_port(data_width=64)
@@ -159,6 +205,8 @@ class Receiver75(SoCCore):
         row_filler = RowFiller(
             self.dma_reader,
             [w.sink for w in self.writers],
+            with_viewport=hub75_viewport,
+            with_csr=True,
         )
 
         c = self.submodules.hub75_controller = Hub75Controller(
@@ -166,10 +214,34 @@ class Receiver75(SoCCore):
             with_csr=True,
         )
 
+        self.submodules.animation = AnimationSequencer(c, with_csr=True)
+
+        # Time base, synced by the host, for swaps at a set time
+        self.submodules.time_base = TimeBase(
+            sys_clk_freq,
+            self.ethcore.udp if with_ethernet or with_etherbone else None,
+            4347,
+            with_csr=True,
+        )
+        self.submodules.scheduled_swap = ScheduledSwap(
+            c, self.time_base, with_csr=True,
+        )
+
+        # DRAM -> DRAM
+        self.submodules.blit = BlitEngine(self.sdram, with_csr=True)
+
+        # Test patterns -> DRAM
+        self.submodules.pattern = PatternGenerator(self.sdram, c, with_csr=True)
+
+        # CPU -> DRAM, for the boot image
+        self.submodules.dram_writer = CsrDramWriter(self.sdram)
+
         if with_ethernet or with_etherbone:
-            # UDP -> DRAM
+            # UDP -> DRAM. A jumbo frame gives the DRAM side fewer gaps
+            # to catch up in, so the FIFO holds most of one.
             self.submodules.mem_streamer = UdpDramWriter(
                 self.sdram, self.ethcore.udp, 4343,
+                fifo_depth=1024 if eth_jumbo else 256,
             )
 
             # UDP -> Wishbone
@@ -177,6 +249,28 @@ class Receiver75(SoCCore):
                 self.bus, self.ethcore.udp, 4344,
             )
 
+            # UDP <-> Wishbone reads
+            self.submodules.udp_wishbone_reader = UdpWishboneReader(
+                self.bus, self.ethcore.udp, 4345,
+            )
+
+            # Vsync -> UDP
+            self.submodules.vsync = VsyncNotifier(
+                c, self.ethcore.udp, 4346,
+                self.udp_wishbone_writer.last_ip,
+                with_csr=True,
+            )
+
+            # Broadcast discovery -> UDP
+            self.submodules.discovery = DiscoveryResponder(
+                self.ethcore.udp, 4348,
+                bytes(self.identifier.mem.init[:-1]),
+                self.hub75_soc.mac_address.storage,
+                self.hub75_soc.ip_address.storage,
+                self.hub75_soc.multicast_group.storage,
+                c,
+            )
+
         # SPI flash for config
         self.submodules.spiflash = ECP5SPIFlash(
             pads         = platform.request("spiflash"),
@@ -185,13 +279,32 @@ class Receiver75(SoCCore):
         )
         self.add_csr("spiflash")
 
+        # Config and SDRAM init without a CPU
+        if hw_boot:
+            self.submodules.boot_sequencer = BootSequencer(
+                self.bus, self.csr,
+                config_program() + sdram_init_program(
+                    self.sdrphy.settings, sdram_module.timing_settings,
+                ),
+            )
+
     def add_udp(self, name="etherbone", phy=None, phy_cd="eth",
         mac_address=0x10e2d5000000,
-        ip_address="192.168.0.39"):
+        ip_address="192.168.0.39",
+        multicast_group=None):
 
         self.check_if_exists(name)
+
+        # The IP core accepts any destination IP, so multicast frames are
+        # filtered by group before they reach it.
+        core_phy = phy
+        if multicast_group is not None:
+            core_phy = ClockDomainsRenamer(phy_cd + "_rx")(MulticastFilter(phy))
+            self.submodules.multicast = core_phy
+            self.comb += core_phy.group.eq(multicast_group)
+
         ethcore = LiteEthUDPIPCore(
-            phy         = phy,
+            phy         = core_phy,
             mac_address = mac_address,
             ip_address  = ip_address,
             clk_freq    = self.clk_freq,
@@ -203,6 +316,11 @@ class Receiver75(SoCCore):
             "sys":    phy_cd + "_rx"})(ethcore)
         self.submodules.ethcore = ethcore
 
+        if multicast_group is not None:
+            self.submodules.igmp = ClockDomainsRenamer(phy_cd + "_rx")(IgmpReporter(
+                ethcore.ip, multicast_group,
+                getattr(phy, "rx_clk_freq", self.clk_freq)))
+
         eth_rx_clk = getattr(phy, "crg", phy).cd_eth_rx.clk
         eth_tx_clk = getattr(phy, "crg", phy).cd_eth_tx.clk
         if not isinstance(phy, LiteEthPHYModel):
@@ -256,6 +374,41 @@ def main():
         default="1:2",
         help="SDRAM Rate: 1:1 Full Rate, 1:2 Half Rate",
     )
+    parser.add_argument(
+        "--hub75-ddr-clk",
+        action="store_true",
+        help="Drive the panel clock through a DDR output at sys/clk_div, "
+             "instead of at sys/3",
+    )
+    parser.add_argument(
+        "--hub75-viewport",
+        action="store_true",
+        help="Add scroll registers for a viewport onto a larger framebuffer",
+    )
+    parser.add_argument(
+        "--hub75-row-buffers",
+        default=4,
+        type=int,
+        help="Rows buffered ahead of the display, 2 to 8 (default: 4, "
+             "up to 5 fit the same block RAM as 2)",
+    )
+    parser.add_argument(
+        "--hw-boot",
+        action="store_true",
+        help="Build without a CPU, loading the config and initialising "
+             "the SDRAM with a hardware sequencer",
+    )
+    parser.add_argument(
+        "--eth-forward",
+        action="store_true",
+        help="Forward traffic not addressed to this card out of the other "
+             "Ethernet port, to chain cards off one host port",
+    )
+    parser.add_argument(
+        "--eth-jumbo",
+        action="store_true",
+        help="Size the ingest buffers for 9000 byte jumbo frames",
+    )
     builder_args(parser)
     soc_core_args(parser)
     trellis_args(parser)
@@ -267,6 +420,9 @@ def main():
     )
 
     args = parser.parse_args()
+    if args.hw_boot:
+        args.cpu_type = None
+        args.integrated_rom_size = 0
     args_dict = soc_core_argdict(args)
 
     soc = Receiver75(board=args.board, revision=args.revision,
@@ -277,6 +433,12 @@ def main():
         eth_phy=args.eth_phy,
         use_internal_osc=True,
         sdram_rate=args.sdram_rate,
+        hub75_ddr_clk=args.hub75_ddr_clk,
+        hub75_viewport=args.hub75_viewport,
+        hub75_row_buffers=args.hub75_row_buffers,
+        hw_boot=args.hw_boot,
+        eth_forward=args.eth_forward,
+        eth_jumbo=args.eth_jumbo,
         **soc_core_argdict(args)
     )
     builder = BiosBuilder(soc, **builder_argdict(args))
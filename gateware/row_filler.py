@@ -8,11 +8,11 @@ from migen import *
 from litex.soc.interconnect import csr, stream
 
 from csr_mixin import CSRMixin
-from utils import FastLatch
+from utils import FastLatch, Pulse
 
 
 class StreamCounter(Module):
-    def __init__(self, layout):
+    def __init__(self, layout, with_wrap=False):
         name, nbits = layout[0]
         self.source = stream.Endpoint(layout)
 
@@ -33,6 +33,14 @@ class StreamCounter(Module):
 
         attr = getattr(self.source, name)
 
+        if with_wrap:
+            # Jumps back to wrap_to instead of reaching wrap_at.
+            self.wrap_at = Signal(nbits)
+            self.wrap_to = Signal(nbits)
+            next_value = Mux(attr + 1 == self.wrap_at, self.wrap_to, attr + 1)
+        else:
+            next_value = attr + 1
+
         self.sync += If(~state,
             If(self._begin.out,
                 attr.eq(self.start),
@@ -40,7 +48,7 @@ class StreamCounter(Module):
                 state.eq(1),
             ),
         ).Elif(self.source.ready,
-            attr.eq(attr+1),
+            attr.eq(next_value),
             If(counter == (self.count-1),
                 self._begin.reset.send(),
                 state.eq(0),
@@ -64,14 +72,76 @@ class Demultiplexer(Module):
         })
 
 
-class RowFiller(Module, csr.AutoCSR):
-    def __init__(self, dma, sinks, depth=48):
+class Realigner(Module):
+    '''
+    Drops the first `skip` words of a stream of big endian words, then
+    moves it along by `shift` bytes. Passes on `count` words, and drops
+    the rest.
+    '''
+    def __init__(self, count):
+        # Interface
+        self.sink = sink = stream.Endpoint([('data', 32)])
+        self.source = source = stream.Endpoint([('data', 32)])
+        self.skip = Signal()
+        self.shift = Signal(2)
+        self.submodules._start = Pulse()
+
+        # State
+        in_count = Signal(8)
+        out_count = Signal(8)
+        last = Signal(32)
+        emit = Signal()
+
+        self.comb += [
+            If(in_count < self.skip,
+                emit.eq(0),
+            ).Elif((self.shift != 0) & (in_count == self.skip),
+                emit.eq(0),
+            ).Else(
+                emit.eq(out_count < count),
+            ),
+            Case(self.shift, {
+                0: source.data.eq(sink.data),
+                1: source.data.eq(Cat(sink.data[24:], last[:24])),
+                2: source.data.eq(Cat(sink.data[16:], last[:16])),
+                3: source.data.eq(Cat(sink.data[8:], last[:8])),
+            }),
+            source.valid.eq(sink.valid & emit),
+            sink.ready.eq(~emit | source.ready),
+        ]
+
+        self.sync += If(self._start.out,
+            in_count.eq(0),
+            out_count.eq(0),
+        ).Elif(sink.valid & sink.ready,
+            in_count.eq(in_count+1),
+            last.eq(sink.data),
+            If(emit,
+                out_count.eq(out_count+1),
+            ),
+        )
+
+    def start(self):
+        return self._start.send()
+
+
+class RowFiller(Module, CSRMixin):
+    '''
+    Copies one row of every panel from DRAM into the row memories.
+
+    Normally each panel's 64 rows are stored one after another, with the
+    panels one after another. With a viewport, the panels instead show a
+    window onto a row major virtual framebuffer. The panels are laid out
+    panel_columns to a row, from (scroll_x, scroll_y), wrapping around
+    at virtual_width and virtual_height.
+    '''
+    def __init__(self, dma, sinks, depth=48, with_viewport=False, with_csr=False):
         # Interface
         self.submodules.begin = FastLatch()
         self.busy = Signal()
         self.base_addr = Signal(32)
         self.row = Signal(5)
-        self.bank = Signal()
+        self.bank = Signal(3)
 
         # State
         count = len(sinks)
@@ -89,7 +159,7 @@ class RowFiller(Module, csr.AutoCSR):
         layout = [('address', dma.sink.address.nbits)]
         self.dma = dma
         self.submodules.dma_converter = stream.Converter(64, 32)
-        self.submodules.addr_counter = StreamCounter(layout)
+        self.submodules.addr_counter = StreamCounter(layout, with_wrap=with_viewport)
 
         # Stream writing
         self.sinks = sinks
@@ -106,7 +176,6 @@ class RowFiller(Module, csr.AutoCSR):
 
             self.addr_counter.source.connect(self.dma.sink),
             self.dma.source.connect(self.dma_converter.sink, omit=['address']),
-            self.dma_converter.source.connect(self.dem.sink),
             self.dem.sink.address.eq(
                 self.addr + scale(self.bank<<1)
             ),
@@ -122,25 +191,57 @@ class RowFiller(Module, csr.AutoCSR):
             memcpys.append((
                 idx,
                 scale(self.row) + offset_0 + self.base_addr,
+                panel*2,
+                line,
             ))
             memcpys.append((
                 idx,
                 scale(self.row) + offset_1 + self.base_addr,
+                panel*2 + 1,
+                line,
             ))
 
+        if with_viewport:
+            self.submodules.realigner = Realigner(depth)
+            self.comb += [
+                self.dma_converter.source.connect(self.realigner.sink),
+                self.realigner.source.connect(self.dem.sink),
+            ]
+            ready = self.add_viewport(memcpys, depth)
+        else:
+            self.comb += self.dma_converter.source.connect(self.dem.sink)
+            ready = 1
+
         cases = {}
         tf_busy = self.addr_counter.busy | (self.dma.rsv_level != 0)
 
-        for idx, (d, s) in enumerate(memcpys):
+        for idx, (d, s, _, _) in enumerate(memcpys):
             if idx == 0:
-                test = self.begin.out
+                test = self.begin.out & ready
             else:
                 test = ~tf_busy
 
-            next = [
+            if with_viewport:
+                next = [
+                    self.addr_counter.start.eq(
+                        Mux(self.viewport, self.vp_start, s>>1)),
+                    self.addr_counter.count.eq(
+                        Mux(self.viewport, self.vp_count, depth>>1)),
+                    self.addr_counter.wrap_at.eq(
+                        Mux(self.viewport, self.vp_wrap_at, 0)),
+                    self.addr_counter.wrap_to.eq(self.vp_wrap_to),
+                    self.realigner.skip.eq(self.viewport & self.vp_skip),
+                    self.realigner.shift.eq(Mux(self.viewport, self.vp_shift, 0)),
+                    self.realigner.start(),
+                ]
+            else:
+                next = [
+                    self.addr_counter.start.eq(s>>1),
+                    self.addr_counter.count.eq(depth>>1),
+                ]
+
+            next += [
                 self.addr_counter.begin(),
-                self.addr_counter.start.eq(s>>1),
-                self.addr_counter.count.eq(depth>>1),
                 self.dem.sel.eq(d),
                 self.state.eq(idx+1),
             ]
@@ -154,6 +255,17 @@ class RowFiller(Module, csr.AutoCSR):
 
         self.sync += Case(self.state, cases)
 
+        # The bit planes the row uses, from an OR of every byte written.
+        self.planes = Signal(8)
+        data = self.dem.sink.data
+        self.sync += If((self.state == 0) & self.begin.out,
+            self.planes.eq(0),
+        ).Elif(self.dem.sink.valid & self.dem.sink.ready,
+            self.planes.eq(
+                self.planes | data[:8] | data[8:16] | data[16:24] | data[24:],
+            ),
+        )
+
         self.sync += If(self.dem.sink.valid & self.dem.sink.ready,
             If(self.addr == 2*depth - 1,
                 self.addr.eq(0),
@@ -161,3 +273,128 @@ class RowFiller(Module, csr.AutoCSR):
                 self.addr.eq(self.addr+1),
             )
         )
+
+        if with_csr:
+            self.add_csrs(with_viewport)
+
+    def add_viewport(self, memcpys, depth):
+        # Interface
+        self.viewport = Signal()
+        self.scroll_x = Signal(16)
+        self.scroll_y = Signal(16)
+        self.virtual_width = Signal(16, reset=256)
+        self.virtual_height = Signal(16, reset=256)
+        self.panel_columns = Signal(5, reset=4)
+
+        self.vp_start = Signal(32)
+        self.vp_count = Signal(8)
+        self.vp_skip = Signal()
+        self.vp_shift = Signal(2)
+        self.vp_wrap_at = Signal(32)
+        self.vp_wrap_to = Signal(32)
+
+        # State
+        slots = max(slot for _, _, slot, _ in memcpys) + 1
+        slot = Signal(max=slots)
+        panel_row = Signal(6)
+        col = Signal(max=slots)
+        wall_row = Signal(max=slots)
+        scroll_x = Signal(16)
+        scroll_y = Signal(16)
+        x_sum = Signal(17)
+        y_sum = Signal(17)
+        x = Signal(16)
+        y = Signal(16)
+        x_bytes = Signal(18)
+        stride = Signal(16)
+        row_start = Signal(32)
+        start_word = Signal(32)
+        col_word = Signal(16)
+        prep = Signal(2)
+
+        # The start of a row waits a few cycles for the pipeline below.
+        # Later copies are issued at least one transfer apart.
+        self.sync += If((self.state == 0) & self.begin.out,
+            If(prep != 3,
+                prep.eq(prep+1),
+            ),
+            # Scroll once per frame, so the panels don't tear.
+            If((prep == 0) & (self.row == 0),
+                scroll_x.eq(self.scroll_x),
+                scroll_y.eq(self.scroll_y),
+            ),
+        ).Else(
+            prep.eq(0),
+        )
+
+        # The panel and panel row of the next copy.
+        self.comb += Case(self.state, {
+            idx: [
+                slot.eq(s),
+                panel_row.eq(Cat(self.row, line)),
+            ]
+            for idx, (_, _, s, line) in enumerate(memcpys)
+        })
+        self.comb += Case(slot, {
+            s: Case(self.panel_columns, {
+                columns: [
+                    col.eq(s % columns),
+                    wall_row.eq(s // columns),
+                ]
+                for columns in range(1, slots+1)
+            })
+            for s in range(slots)
+        })
+
+        # Position in the virtual framebuffer.
+        self.comb += [
+            x_sum.eq((col << 6) + scroll_x),
+            y_sum.eq((wall_row << 6) + panel_row + scroll_y),
+        ]
+        self.sync += [
+            If(x_sum >= self.virtual_width,
+                x.eq(x_sum - self.virtual_width),
+            ).Else(
+                x.eq(x_sum),
+            ),
+            If(y_sum >= self.virtual_height,
+                y.eq(y_sum - self.virtual_height),
+            ).Else(
+                y.eq(y_sum),
+            ),
+        ]
+
+        # Word addresses. 3 bytes a pixel, and the width is a multiple of
+        # 8 pixels, so rows start on a 64 bit boundary.
+        self.comb += [
+            stride.eq(((self.virtual_width << 1) + self.virtual_width) >> 2),
+            x_bytes.eq((x << 1) + x),
+        ]
+        self.sync += [
+            row_start.eq(self.base_addr + y*stride),
+            col_word.eq(x_bytes >> 2),
+            self.vp_shift.eq(x_bytes[:2]),
+        ]
+        self.comb += [
+            start_word.eq(row_start + col_word),
+            self.vp_start.eq(start_word >> 1),
+            self.vp_skip.eq(start_word[0]),
+            self.vp_count.eq(
+                (self.vp_skip + depth + (self.vp_shift != 0) + 1) >> 1
+            ),
+            self.vp_wrap_to.eq(row_start >> 1),
+            self.vp_wrap_at.eq((row_start >> 1) + (stride >> 1)),
+        ]
+
+        return ~self.viewport | (prep == 3)
+
+    def add_csrs(self, with_viewport):
+        if with_viewport:
+            self.add_storage_csrs(
+                'viewport',
+                'scroll_x',
+                'scroll_y',
+                'virtual_width',
+                'virtual_height',
+                'panel_columns',
+            )
@@ -0,0 +1,151 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from csr_mixin import CSRMixin
+from udp_sender import UdpSender
+
+
+class TimeBase(Module, CSRMixin):
+    '''
+    A clock in nanoseconds, counted from the sys clock and kept to the
+    host's by ClockSync in sender75.py.
+
+    Each cycle adds increment, in 1/2**24 ns, so the host can trim the
+    rate to its own. Writing adjust steps the time by that many ns,
+    signed.
+
+    With a UDP core, a datagram to port_num is answered with the time
+    it arrived: the datagram's first word, then the time as two words,
+    high first.
+    '''
+    FRAC_BITS = 24
+
+    def __init__(self, clk_freq, udp=None, port_num=4347, with_csr=False):
+        self.time = Signal(64)
+        self.increment = Signal(32, reset=round(1e9 / clk_freq * 2**self.FRAC_BITS))
+        self.adjust = Signal((64, True))
+        self.step = Signal()
+
+        frac = Signal(self.FRAC_BITS)
+        total = Cat(frac, self.time)
+        self.sync += If(self.step,
+            total.eq(total + self.increment + (self.adjust << self.FRAC_BITS)),
+        ).Else(
+            total.eq(total + self.increment),
+        )
+
+        if udp is not None:
+            self.add_sync_port(udp, port_num)
+
+        if with_csr:
+            self.add_csrs()
+
+    def add_sync_port(self, udp, port_num):
+        udp_port = udp.crossbar.get_port(port_num, dw=32)
+
+        # UDP port -> (eth_rx) FIFO (sys)
+        renamer = ClockDomainsRenamer({'write': 'eth_rx', 'read': 'sys'})
+        fifo_layout = [("data", 32), ("end", 1), ("ip_address", 32), ("port", 16)]
+        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(fifo_layout, 4))
+
+        source = udp_port.source
+        valid = Signal()
+        self.comb += [
+            valid.eq(source.dst_port == port_num),
+            fifo.sink.valid.eq(source.valid & valid),
+            fifo.sink.data.eq(source.data),
+            fifo.sink.end.eq(source.last),
+            fifo.sink.ip_address.eq(source.ip_address),
+            fifo.sink.port.eq(source.src_port),
+            source.ready.eq(fifo.sink.ready),
+        ]
+
+        # (sys) -> UDP port
+        self.submodules.sender = UdpSender(udp_port, port_num)
+        request = fifo.source
+        reply = self.sender.sink
+
+        first = Signal(reset=1)
+        tag = Signal(32)
+        stamp = Signal(64)
+        word = Signal(2)
+
+        # The time is taken as the first word comes out of the FIFO,
+        # which it does as soon as it arrives, so the delay is the same
+        # for every request.
+        self.comb += [
+            request.ready.eq(word == 0),
+            reply.valid.eq(word != 0),
+            reply.data.eq(Array([0, tag, stamp[32:], stamp[:32]])[word]),
+            reply.end.eq(word == 3),
+            reply.length.eq(3*4),
+        ]
+
+        self.sync += If(word == 0,
+            If(request.valid,
+                first.eq(request.end),
+                If(first,
+                    tag.eq(request.data),
+                    stamp.eq(self.time),
+                    reply.ip_address.eq(request.ip_address),
+                    reply.dst_port.eq(request.port),
+                ),
+                If(request.end,
+                    word.eq(1),
+                ),
+            ),
+        ).Elif(reply.ready,
+            If(word == 3,
+                word.eq(0),
+            ).Else(
+                word.eq(word+1),
+            ),
+        )
+
+    def add_csrs(self):
+        self.add_storage_csrs('increment', 'adjust')
+        self.comb += self.step.eq(self._adjust.re)
+
+
+class ScheduledSwap(Module, CSRMixin):
+    '''
+    Shows addr from the first frame boundary after the time base passes
+    time, so cards with synced clocks swap together.
+
+    Writing time arms it, so addr is written first. The address stays
+    on display until base_addr is next written, with any value.
+    '''
+    def __init__(self, controller, time_base, with_csr=False):
+        self.addr = Signal(32)
+        self.time = Signal(64)
+        self.arm = Signal()
+        self.armed = Signal()
+        self.active = Signal()
+
+        shown = Signal(32)
+
+        # The controller takes the address for the next frame as it
+        # starts filling row 0.
+        controller.add_addr_source(self.active, shown)
+
+        self.sync += If(self.arm,
+            self.armed.eq(1),
+        ).Elif(self.armed & (time_base.time >= self.time),
+            self.armed.eq(0),
+            self.active.eq(1),
+            shown.eq(self.addr),
+        ).Elif(controller.base_addr_write,
+            self.active.eq(0),
+        )
+
+        if with_csr:
+            self.add_csrs()
+
+    def add_csrs(self):
+        self.add_storage_csrs('addr', 'time')
+        self.add_status_csrs('armed')
+        self.comb += self.arm.eq(self._time.re)
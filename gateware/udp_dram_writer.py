@@ -5,11 +5,16 @@ from migen import *
 from migen.genlib.cdc import MultiReg
 
 from liteeth.common import convert_ip, eth_udp_user_description
-from litedram.frontend.dma import LiteDRAMDMAWriter
 from litex.gen.common import reverse_bytes
 from litex.soc.interconnect import csr, stream
 
-from utils import FastLatch
+from pixel_expander import PixelExpander, FORMAT_RGB888, FORMAT_RGB666
+from utils import FastLatch, Pulse
+
+
+# 48 words per row, 64 rows per panel, 16 panels per bank.
+BANK_SIZE = 48*64*16
+ROW_BYTES = 64*3
 
 
 class Conv32to64(Module):
@@ -46,71 +51,295 @@ class Conv32to64(Module):
         return self._reset.set.send()
 
 
+class RectPlacer(Module):
+    '''
+    Writes a rectangle of a bank, sent as 32 bit words of its rows one
+    after another, to where its pixels go in DRAM.
+
+    The rows of a bank are 64 pixels of 3 bytes, so a rectangle's rows
+    rarely start or end on a word. The bytes are placed one a cycle,
+    which keeps up with a gigabit PHY for RGB888, and words only partly
+    covered are written with byte enables. Bytes after the last row are
+    dropped.
+
+    Reduced formats expand to more than a byte a cycle, so rectangles are
+    RGB888 only.
+    '''
+    def __init__(self):
+        self.source = source = stream.Endpoint([("data", 64), ("we", 8), ("address", 21)])
+
+        # Words arrive once every 4 bytes and have to be taken at once,
+        # but are only done with after their last byte.
+        self.submodules.fifo = fifo = stream.SyncFIFO([("data", 32)], 4)
+        self.sink = fifo.sink
+        sink = fifo.source
+
+        # Interface, loaded by start
+        self.submodules.start = Pulse()
+        self.base = Signal(21)
+        self.x = Signal(16)
+        self.y = Signal(16)
+        self.width = Signal(16)
+        self.height = Signal(16)
+
+        # State, with positions in bytes
+        pos = Signal(24)
+        row = Signal(24)
+        left = Signal(18)
+        rows = Signal(16)
+        byte = Signal(2)
+        data = Signal(64)
+        we = Signal(8)
+
+        # Each 64 bit word holds two 32 bit words, each byte reversed, as
+        # Conv32to64 writes them.
+        lane = Signal(3)
+        value = Signal(8)
+        merged = Signal(64)
+        merged_we = Signal(8)
+        done = Signal()
+        flush = Signal()
+        consume = Signal()
+
+        self.comb += [
+            lane.eq(Cat(~pos[0], ~pos[1], pos[2])),
+            value.eq(Array([sink.data[8*i:8*(i + 1)] for i in range(4)])[byte]),
+            merged.eq(data | (value << (lane << 3))),
+            merged_we.eq(we | (1 << lane)),
+            done.eq(rows == 0),
+            flush.eq((pos[:3] == 7) | (left == 1)),
+
+            source.valid.eq(sink.valid & ~self.start.out & ~done & flush),
+            source.data.eq(merged),
+            source.we.eq(merged_we),
+            source.address.eq(pos[3:]),
+
+            consume.eq(sink.valid & ~self.start.out & (done | ~flush | source.ready)),
+            sink.ready.eq(consume & (byte == 3)),
+        ]
+
+        start = Signal(24)
+        self.comb += start.eq((self.base << 2) + self.y*ROW_BYTES + self.x*3)
+
+        self.sync += If(self.start.out,
+            pos.eq(start),
+            row.eq(start),
+            left.eq(self.width*3),
+            rows.eq(Mux(self.width == 0, 0, self.height)),
+            byte.eq(0),
+            data.eq(0),
+            we.eq(0),
+        ).Elif(consume,
+            byte.eq(byte + 1),
+            If(~done,
+                If(flush,
+                    data.eq(0),
+                    we.eq(0),
+                ).Else(
+                    data.eq(merged),
+                    we.eq(merged_we),
+                ),
+                If(left == 1,
+                    left.eq(self.width*3),
+                    rows.eq(rows - 1),
+                    row.eq(row + ROW_BYTES),
+                    pos.eq(row + ROW_BYTES),
+                ).Else(
+                    left.eq(left - 1),
+                    pos.eq(pos + 1),
+                ),
+            ),
+        )
+
+
 class ProtocolHandler(Module):
+    '''
+    Each packet starts with a header word: the address in bits 0-20 and
+    the wire format in bits 24-27, see pixel_expander.py. Packets in a
+    format this does not know are dropped.
+
+    With bit 31 set, the packet is a rectangle of a bank instead, with
+    the bank in bits 0-7 and two more header words, x | y << 16 and
+    width | height << 16, in pixels. See RectPlacer. Rectangles in any
+    format but RGB888 are dropped.
+    '''
     def __init__(self, source, sink):
-        state = Signal(2)
+        state = Signal(3)
         STREAM = 1
         SKIP = 2
-        address = Signal(18)
+        RECT_POS = 3
+        RECT_SIZE = 4
+        address = Signal(21)
+        wire_format = Signal(4)
+        raw = Signal()
+        rect = Signal()
 
+        # Linear packets
         sink32 = stream.Endpoint([("data", 32), ("address", 32)])
-        self.submodules.conv = Conv32to64(sink32, sink, reverse=True)
+        linear = stream.Endpoint([("data", 64), ("address", 21)])
+        self.submodules.conv = Conv32to64(sink32, linear, reverse=True)
+        self.comb += [
+            linear.address.eq(sink32.address[1:22]),
+        ]
+
+        # Rectangles
+        self.submodules.placer = placer = RectPlacer()
+
+        self.comb += If(rect,
+            placer.source.connect(sink),
+        ).Else(
+            sink.valid.eq(linear.valid),
+            sink.data.eq(linear.data),
+            sink.we.eq(0xff),
+            sink.address.eq(linear.address),
+            linear.ready.eq(sink.ready),
+        )
+
+        # Reduced formats are expanded to RGB888 words.
+        self.submodules.expander = expander = PixelExpander()
         self.comb += [
-            sink.address.eq(sink32.address[1:19]),
+            raw.eq(wire_format == FORMAT_RGB888),
+            expander.format.eq(wire_format),
+            expander.sink.valid.eq((state == STREAM) & source.valid & ~raw),
+            expander.sink.data.eq(source.data),
+            expander.clear.eq((state == 0) & source.valid & source.ready),
         ]
 
+        # Pixel words, as sent or expanded, to whichever writes them.
+        words = stream.Endpoint([("data", 32)])
         self.comb += [
-            sink32.valid.eq((state == STREAM) & source.valid),
-            sink32.data.eq(source.data),
+            If(raw,
+                words.valid.eq((state == STREAM) & source.valid),
+                words.data.eq(source.data),
+            ).Else(
+                words.valid.eq(expander.source.valid),
+                words.data.eq(expander.source.data),
+            ),
+            expander.source.ready.eq(~raw & words.ready),
+            If(rect,
+                words.connect(placer.sink),
+            ).Else(
+                words.connect(sink32),
+            ),
             sink32.address.eq(address),
-            source.ready.eq((state != STREAM) | sink32.ready),
+            If(state == STREAM,
+                source.ready.eq(Mux(raw, words.ready, expander.sink.ready)),
+            ).Elif(state == 0,
+                # The previous packet has to be through the expander
+                # before it is cleared.
+                source.ready.eq(expander.idle),
+            ).Else(
+                source.ready.eq(1),
+            ),
         ]
 
-        self.sync += If(source.valid,
-            If(state == 0,
-                address.eq(source.data[0:18]),
-                state.eq(STREAM),
-                self.conv.reset(),
-            ).Elif(state==SKIP,
-                If(source.end,
-                    state.eq(0),
-                ),
-            ).Elif(sink32.ready,
+        self.sync += [
+            If(sink32.valid & sink32.ready,
                 address.eq(address + 1),
-                If(source.end,
+            ),
+            If(source.valid & source.ready,
+                If(state == 0,
+                    address.eq(source.data[0:21]),
+                    wire_format.eq(source.data[24:28]),
+                    rect.eq(source.data[31]),
+                    placer.base.eq(source.data[0:8] * BANK_SIZE),
+                    If(source.data[24:28] > FORMAT_RGB666,
+                        state.eq(SKIP),
+                    ).Elif(source.data[31] & (source.data[24:28] != FORMAT_RGB888),
+                        state.eq(SKIP),
+                    ).Elif(source.data[31],
+                        state.eq(RECT_POS),
+                    ).Else(
+                        state.eq(STREAM),
+                    ),
+                    self.conv.reset(),
+                ).Elif(source.end,
                     state.eq(0),
+                ).Elif(state == RECT_POS,
+                    placer.x.eq(source.data[:16]),
+                    placer.y.eq(source.data[16:]),
+                    state.eq(RECT_SIZE),
+                ).Elif(state == RECT_SIZE,
+                    placer.width.eq(source.data[:16]),
+                    placer.height.eq(source.data[16:]),
+                    placer.start.send(),
+                    state.eq(STREAM),
                 ),
             ),
-        )
+        ]
+
+
+class MaskedDMAWriter(Module):
+    '''
+    LiteDRAMDMAWriter for a native port, with a byte enable for each byte
+    written.
+    '''
+    def __init__(self, port, fifo_depth=16):
+        self.port = port
+        nbytes = port.data_width//8
+        self.sink = sink = stream.Endpoint([
+            ("address", port.address_width),
+            ("data", port.data_width),
+            ("we", nbytes),
+        ])
+
+        # The data waits here for the controller to take it, after the
+        # command has gone.
+        self.submodules.fifo = fifo = stream.SyncFIFO(
+            [("data", port.data_width), ("we", nbytes)], fifo_depth)
+
+        self.comb += [
+            port.cmd.we.eq(1),
+            port.cmd.addr.eq(sink.address),
+            port.cmd.valid.eq(fifo.sink.ready & sink.valid),
+            sink.ready.eq(fifo.sink.ready & port.cmd.ready),
+            fifo.sink.valid.eq(sink.valid & port.cmd.ready),
+            fifo.sink.data.eq(sink.data),
+            fifo.sink.we.eq(sink.we),
+
+            port.wdata.valid.eq(fifo.source.valid),
+            port.wdata.data.eq(fifo.source.data),
+            port.wdata.we.eq(fifo.source.we),
+            fifo.source.ready.eq(port.wdata.ready),
+        ]
 
 
 class UdpDramWriter(Module, csr.AutoCSR):
-    def __init__(self, sdram, udp, port_num):
-        # UDP port -> (eth_rx) FIFO (sys) -> UpConverter -> DMA writer
+    def __init__(self, sdram, udp, port_num, fifo_depth=256, dma_depth=16):
+        # UDP port -> (eth_rx) ProtocolHandler -> 64 bit FIFO (sys) -> DMA writer
+        #
+        # The header is parsed and the words paired up at the UDP side, so
+        # the sys side only sees 64 bit writes and can keep up with back
+        # to back packets at line rate.
         udp_port = udp.crossbar.get_port(port_num, dw=32)
 
-        # FIFO
-        renamer = ClockDomainsRenamer({'write': 'eth_rx', 'read': 'sys'})
-        fifo_layout = [("data", 32), ("end", 1)]
-        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(fifo_layout, 512, buffered=True))
-        self.connect_udp_to_fifo(udp_port.source, fifo, port_num)
+        rx = stream.Endpoint([("data", 32), ("end", 1)])
+        self.connect_udp(udp_port.source, rx, port_num)
 
         # Converter
-        dma_layout = [("data", 64), ("address", 32)]
+        dma_layout = [("data", 64), ("we", 8), ("address", 32)]
         converter = stream.Endpoint(dma_layout)
-        self.submodules.handler = ProtocolHandler(fifo.source, converter)
+        self.submodules.handler = ClockDomainsRenamer('eth_rx')(
+            ProtocolHandler(rx, converter)
+        )
+
+        # FIFO
+        renamer = ClockDomainsRenamer({'write': 'eth_rx', 'read': 'sys'})
+        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(dma_layout, fifo_depth, buffered=True))
+        self.comb += converter.connect(fifo.sink)
 
-        # DMA writer
+        # DMA writer, with enough writes in flight to cover the
+        # controller's latency.
         sdram_port = sdram.crossbar.get_port(mode='write', data_width=64)
-        self.submodules.dma = LiteDRAMDMAWriter(sdram_port, fifo_depth=1, fifo_buffered=False)
-        self.comb += converter.connect(self.dma.sink)
+        self.submodules.dma = MaskedDMAWriter(sdram_port, fifo_depth=dma_depth)
+        self.comb += fifo.source.connect(self.dma.sink)
 
-    def connect_udp_to_fifo(self, udp, fifo, port_num):
+    def connect_udp(self, udp, sink, port_num):
         valid = Signal()
         self.comb += [
             valid.eq(udp.dst_port == port_num),
-            fifo.sink.valid.eq(udp.valid & valid),
-            fifo.sink.data.eq(udp.data),
-            fifo.sink.end.eq(udp.last),
-            udp.ready.eq(fifo.sink.ready),
+            sink.valid.eq(udp.valid & valid),
+            sink.data.eq(udp.data),
+            sink.end.eq(udp.last),
+            udp.ready.eq(sink.ready),
         ]
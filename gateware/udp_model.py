@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Stands in for LiteEthUDPIPCore in the benches, for the modules that take
+a udp core and get ports from its crossbar.
+
+The ports are in the eth_rx clock domain, as the real ones are, and the
+generators below send and receive datagrams on them from there.
+'''
+from migen import *
+
+from litex.soc.interconnect import stream
+from liteeth.common import eth_udp_user_description
+
+
+class UDPPortModel:
+    def __init__(self, dw=32):
+        self.source = stream.Endpoint(eth_udp_user_description(dw))
+        self.sink = stream.Endpoint(eth_udp_user_description(dw))
+
+
+class UDPCrossbarModel:
+    def __init__(self):
+        self.ports = {}
+
+    def get_port(self, port_num, dw=32):
+        port = UDPPortModel(dw)
+        self.ports[port_num] = port
+        return port
+
+
+class UDPModel:
+    def __init__(self):
+        self.crossbar = UDPCrossbarModel()
+
+
+def send_datagram(port, port_num, words, ip_address=0xc0a80001, src_port=5555):
+    '''Offers words to the card as one datagram to port_num.'''
+    source = port.source
+    for i, word in enumerate(words):
+        yield source.valid.eq(1)
+        yield source.data.eq(word)
+        yield source.last.eq(i == len(words) - 1)
+        yield source.dst_port.eq(port_num)
+        yield source.src_port.eq(src_port)
+        yield source.ip_address.eq(ip_address)
+        yield source.length.eq(len(words)*4)
+        yield
+        while not (yield source.ready):
+            yield
+    yield source.valid.eq(0)
+
+
+def receive_datagram(port, timeout=None):
+    '''
+    Waits for the card to send a datagram, and returns a dict of its
+    words, length, ip_address and dst_port, or None if none has started
+    after timeout cycles.
+    '''
+    sink = port.sink
+    yield sink.ready.eq(1)
+    words = []
+    cycle = 0
+    while timeout is None or cycle < timeout or words:
+        cycle += 1
+        yield
+        if (yield sink.valid):
+            words.append((yield sink.data))
+            if (yield sink.last):
+                return {
+                    'words': words,
+                    'length': (yield sink.length),
+                    'ip_address': (yield sink.ip_address),
+                    'dst_port': (yield sink.dst_port),
+                }
+    return None
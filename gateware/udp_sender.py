@@ -0,0 +1,44 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+
+udp_sender_layout = [
+    ("data", 32),
+    ("end", 1),
+    ("ip_address", 32),
+    ("dst_port", 16),
+    ("length", 16),
+]
+
+
+class UdpSender(Module):
+    '''
+    Sends UDP datagrams that are built in the sys clock domain.
+
+    Every word pushed into the sink carries the destination and the
+    length in bytes of its datagram, with end set on the last word.
+    '''
+    def __init__(self, udp_port, port_num, depth=16):
+        self.sink = sink = stream.Endpoint(udp_sender_layout)
+
+        # (sys) FIFO (eth_rx) -> UDP port
+        renamer = ClockDomainsRenamer({'write': 'sys', 'read': 'eth_rx'})
+        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(udp_sender_layout, depth))
+        self.comb += sink.connect(fifo.sink)
+
+        udp = udp_port.sink
+        self.comb += [
+            udp.valid.eq(fifo.source.valid),
+            udp.last.eq(fifo.source.end),
+            udp.data.eq(fifo.source.data),
+            udp.last_be.eq(0b1000),
+            udp.src_port.eq(port_num),
+            udp.dst_port.eq(fifo.source.dst_port),
+            udp.ip_address.eq(fifo.source.ip_address),
+            udp.length.eq(fifo.source.length),
+            fifo.source.ready.eq(udp.ready),
+        ]
@@ -0,0 +1,126 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from litex.soc.cores.dma import WishboneDMAReader
+from litex.soc.interconnect import wishbone, stream
+from litex.gen.common import reverse_bytes
+
+from udp_sender import UdpSender
+
+
+class UdpWishboneReader(Module):
+    '''
+    Answers read requests for the wishbone bus.
+
+    A request is a word address, optionally followed by a word count.
+    The reply goes back to the sender and holds the address followed by
+    the values read.
+    '''
+    def __init__(self, bus, udp, port_num, max_count=64):
+        udp_port = udp.crossbar.get_port(port_num, dw=32)
+
+        # UDP port -> (eth_rx) FIFO (sys)
+        renamer = ClockDomainsRenamer({'write': 'eth_rx', 'read': 'sys'})
+        fifo_layout = [("data", 32), ("end", 1), ("ip_address", 32), ("port", 16)]
+        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(fifo_layout, 16))
+
+        source = udp_port.source
+        valid = Signal()
+        self.comb += [
+            valid.eq(source.dst_port == port_num),
+            fifo.sink.valid.eq(source.valid & valid),
+            fifo.sink.data.eq(source.data),
+            fifo.sink.end.eq(source.last),
+            fifo.sink.ip_address.eq(source.ip_address),
+            fifo.sink.port.eq(source.src_port),
+            source.ready.eq(fifo.sink.ready),
+        ]
+
+        # Wishbone reads (sys) -> UDP port
+        self.wb = wishbone.Interface(data_width=bus.data_width, adr_width=bus.address_width)
+        bus.add_master('udp_wishbone_reader', self.wb)
+        self.submodules.dma = WishboneDMAReader(self.wb)
+        self.submodules.sender = UdpSender(udp_port, port_num)
+
+        self.handle_requests(fifo.source, self.dma, self.sender.sink, max_count)
+
+    def handle_requests(self, request, dma, reply, max_count):
+        IDLE = 0
+        COUNT = 1
+        SKIP = 2
+        REPLY = 3
+        state = Signal(2)
+
+        address = Signal(32)
+        count = Signal(max=max_count+1)
+        issued = Signal(max=max_count+1)
+        received = Signal(max=max_count+1)
+        header = Signal()
+
+        self.comb += [
+            request.ready.eq(state != REPLY),
+
+            # Address header first, then the values as they are read.
+            reply.valid.eq((state == REPLY) & (header | dma.source.valid)),
+            If(header,
+                reply.data.eq(address),
+            ).Else(
+                reply.data.eq(reverse_bytes(dma.source.data)),
+            ),
+            reply.end.eq(~header & (received == count - 1)),
+            reply.length.eq((count + 1) << 2),
+            dma.source.ready.eq((state == REPLY) & ~header & reply.ready),
+
+            dma.sink.valid.eq((state == REPLY) & (issued != count)),
+            dma.sink.address.eq(address + issued),
+        ]
+
+        self.sync += Case(state, {
+            IDLE: If(request.valid,
+                address.eq(request.data),
+                reply.ip_address.eq(request.ip_address),
+                reply.dst_port.eq(request.port),
+                count.eq(1),
+                If(request.end,
+                    state.eq(REPLY),
+                ).Else(
+                    state.eq(COUNT),
+                ),
+            ),
+            COUNT: If(request.valid,
+                If((request.data > 0) & (request.data <= max_count),
+                    count.eq(request.data),
+                ),
+                If(request.end,
+                    state.eq(REPLY),
+                ).Else(
+                    state.eq(SKIP),
+                ),
+            ),
+            SKIP: If(request.valid & request.end,
+                state.eq(REPLY),
+            ),
+            REPLY: [
+                If(dma.sink.valid & dma.sink.ready,
+                    issued.eq(issued + 1),
+                ),
+                If(reply.valid & reply.ready,
+                    If(header,
+                        header.eq(0),
+                    ).Elif(reply.end,
+                        state.eq(IDLE),
+                    ).Else(
+                        received.eq(received + 1),
+                    ),
+                ),
+            ],
+        })
+
+        # Reset the counters for the next request.
+        self.sync += If(state != REPLY,
+            header.eq(1),
+            issued.eq(0),
+            received.eq(0),
+        )
@@ -15,7 +15,8 @@ class UdpWishboneWriter(Module):
 
         self.sink = sink = stream.Endpoint(eth_udp_user_description(32))
         renamer = ClockDomainsRenamer({'write': 'eth_rx', 'read': 'sys'})
-        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO([("data", 32), ("end", 1)], 64))
+        fifo_layout = [("data", 32), ("end", 1), ("ip_address", 32)]
+        self.submodules.fifo = fifo = renamer(stream.AsyncFIFO(fifo_layout, 64))
 
         self.comb += udp_port.source.connect(sink)
 
@@ -27,11 +28,15 @@ class UdpWishboneWriter(Module):
             fifo.sink.valid.eq(sink.valid & valid),
             fifo.sink.data.eq(sink.data),
             fifo.sink.end.eq(sink.last),
+            fifo.sink.ip_address.eq(sink.ip_address),
 
             # Ready to accept data?
             sink.ready.eq(fifo.sink.ready),
         ]
 
+        # The IP address of whoever last wrote a register.
+        self.last_ip = Signal(32)
+
         self.wb = wishbone.Interface(data_width=bus.data_width, adr_width=bus.address_width)
         bus.add_master('udp_wishbone_writer', self.wb)
         self.submodules.dma = WishboneDMAWriter(self.wb)
@@ -55,6 +60,7 @@ class UdpWishboneWriter(Module):
         self.sync += If(fifo.source.valid,
             If(~stream,
                 dma.sink.address.eq(fifo.source.data),
+                self.last_ip.eq(fifo.source.ip_address),
                 stream.eq(1),
             ).Elif(dma.sink.ready,
                 If(fifo.source.end,
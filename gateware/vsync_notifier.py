@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+from migen import *
+
+from csr_mixin import CSRMixin
+from udp_sender import UdpSender
+
+
+class VsyncNotifier(Module, CSRMixin):
+    '''
+    Sends a datagram at frame boundaries and/or when a new base address
+    is first displayed.
+
+    The datagram holds three words: the events (bit 0 frame, bit 1 swap),
+    the frame counter and the base address being displayed. It goes to
+    ip_address, or to whoever last wrote a register if that is 0.
+    '''
+    FRAME = 1
+    SWAP = 2
+
+    def __init__(self, controller, udp, port_num, last_ip, with_csr=False):
+        self.events = Signal(2)
+        self.ip_address = Signal(32)
+        self.port = Signal(16, reset=port_num)
+
+        udp_port = udp.crossbar.get_port(port_num, dw=32)
+        self.submodules.sender = UdpSender(udp_port, port_num)
+        self.comb += udp_port.source.ready.eq(1)
+
+        trigger = Signal(2)
+        flags = Signal(2)
+        word = Signal(2)
+        sink = self.sender.sink
+
+        self.comb += [
+            trigger.eq(
+                Cat(controller.frame_start, controller.swap) & self.events
+            ),
+
+            sink.valid.eq(word != 0),
+            sink.data.eq(Array([
+                0, flags, controller.frames, controller.frame_addr,
+            ])[word]),
+            sink.end.eq(word == 3),
+            sink.length.eq(3*4),
+            sink.dst_port.eq(self.port),
+            If(self.ip_address != 0,
+                sink.ip_address.eq(self.ip_address),
+            ).Else(
+                sink.ip_address.eq(last_ip),
+            ),
+        ]
+
+        # The frame counter and address are updated along with the
+        # trigger, so they are sent from the following cycle.
+        self.sync += If(word == 0,
+            If(trigger != 0,
+                flags.eq(trigger),
+                word.eq(1),
+            ),
+        ).Elif(sink.ready,
+            If(word == 3,
+                word.eq(0),
+            ).Else(
+                word.eq(word+1),
+            ),
+        )
+
+        if with_csr:
+            self.add_csrs()
+
+    def add_csrs(self):
+        self.add_storage_csrs('events', 'ip_address', 'port')
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Times TemporalDither against the plain gamma lookup sender75d does, per
+card bank and for a whole wall of cards, and reports how much of the
+frame budget each takes.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from temporal_dither import TemporalDither, gamma_table
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=50, help="Cards in the wall")
+    parser.add_argument('--panels', type=int, default=16, help="Panels per card")
+    parser.add_argument('--frac-bits', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=60, help="Frame rate to budget for")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    height = 64 * args.panels
+    rng = np.random.default_rng(1)
+    frames = [
+        rng.integers(0, 256, (height, 64, 3), dtype=np.uint8)
+        for _ in range(args.cards)
+    ]
+
+    table = gamma_table()
+    out = np.empty((height * 64, 3), dtype=np.uint8)
+
+    def lookup():
+        for im in frames:
+            im = im.reshape(out.shape)
+            for c in range(3):
+                np.take(table[c], im[..., c], out=out[..., c], mode='clip')
+
+    dithers = [
+        TemporalDither(height, frac_bits=args.frac_bits)
+        for _ in range(args.cards)
+    ]
+
+    def dither():
+        for d, im in zip(dithers, frames):
+            d.frame(im)
+
+    budget = 1 / args.fps
+    for name, fn in (('gamma lookup', lookup), ('temporal dither', dither)):
+        wall = best_of(fn, args.repeat)
+        print(
+            f'{name}: {wall / args.cards * 1e3:.2f} ms per card, '
+            f'{wall * 1e3:.1f} ms for {args.cards} cards, '
+            f'{wall / budget:.0%} of a {args.fps:g} fps frame'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Records of the datagrams sent to cards.
+
+Two file formats are supported, chosen by the file name:
+
+*.pcap: standard pcap of IPv4/UDP packets, for Wireshark and tcpdump.
+        Source addresses are not known to the sender and are zero.
+
+otherwise: a compact log. A header of "R75L" and a 32 bit version, then
+        one record per datagram: timestamp (64 bit float, seconds since
+        the start), payload length (32 bits), destination IP (4 bytes),
+        destination port (16 bits), then the payload. All little endian.
+'''
+
+import socket
+import struct
+import time
+
+
+LOG_MAGIC = b'R75L'
+LOG_VERSION = 1
+LOG_RECORD = struct.Struct('<dI4sH')
+
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_HEADER = struct.Struct('<IHHiIII')
+PCAP_RECORD = struct.Struct('<IIII')
+LINKTYPE_IPV4 = 228
+
+
+def is_pcap(path):
+    return path.endswith('.pcap')
+
+
+def ip_checksum(header):
+    total = sum(struct.unpack(f'!{len(header)//2}H', header))
+    while total > 0xffff:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+class Recorder:
+    '''Writes each datagram passed to record() to a capture file.'''
+    def __init__(self, path):
+        self.path = path
+        self.pcap = is_pcap(path)
+        self.stream = open(path, 'wb')
+        self.start = time.perf_counter()
+        self.ident = 0
+
+        if self.pcap:
+            self.stream.write(PCAP_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, 65535, LINKTYPE_IPV4))
+        else:
+            self.stream.write(LOG_MAGIC + struct.pack('<I', LOG_VERSION))
+
+    def record(self, eth_ip, port, buffers):
+        payload = b''.join(bytes(buf) for buf in buffers)
+        now = time.perf_counter() - self.start
+
+        if not self.pcap:
+            self.stream.write(
+                LOG_RECORD.pack(now, len(payload), socket.inet_aton(eth_ip), port)
+            )
+            self.stream.write(payload)
+            return
+
+        udp = struct.pack('!HHHH', 0, port, 8 + len(payload), 0) + payload
+        ip = bytearray(struct.pack(
+            '!BBHHHBBH4s4s',
+            0x45, 0, 20 + len(udp), self.ident & 0xffff, 0, 64, 17, 0,
+            bytes(4), socket.inet_aton(eth_ip),
+        ))
+        ip[10:12] = struct.pack('!H', ip_checksum(bytes(ip)))
+        self.ident += 1
+
+        packet = bytes(ip) + udp
+        seconds = int(now)
+        self.stream.write(PCAP_RECORD.pack(
+            seconds, int((now - seconds) * 1e6), len(packet), len(packet),
+        ))
+        self.stream.write(packet)
+
+    def close(self):
+        self.stream.close()
+
+
+def read_capture(path):
+    '''Yields (timestamp, destination IP, port, payload) for each datagram.'''
+    with open(path, 'rb') as stream:
+        if is_pcap(path):
+            magic, _, _, _, _, _, linktype = PCAP_HEADER.unpack(stream.read(PCAP_HEADER.size))
+            if magic != PCAP_MAGIC or linktype != LINKTYPE_IPV4:
+                raise ValueError(f'{path} is not an IPv4 pcap')
+            while True:
+                record = stream.read(PCAP_RECORD.size)
+                if len(record) < PCAP_RECORD.size:
+                    return
+                seconds, micros, length, _ = PCAP_RECORD.unpack(record)
+                packet = stream.read(length)
+                header_len = (packet[0] & 0xf) * 4
+                if packet[9] != 17:
+                    continue
+                eth_ip = socket.inet_ntoa(packet[16:20])
+                port, = struct.unpack('!H', packet[header_len + 2:header_len + 4])
+                yield seconds + micros / 1e6, eth_ip, port, packet[header_len + 8:]
+        else:
+            if stream.read(4) != LOG_MAGIC:
+                raise ValueError(f'{path} is not a capture log')
+            version, = struct.unpack('<I', stream.read(4))
+            if version != LOG_VERSION:
+                raise ValueError(f'{path} has unknown version {version}')
+            while True:
+                record = stream.read(LOG_RECORD.size)
+                if len(record) < LOG_RECORD.size:
+                    return
+                timestamp, length, addr, port = LOG_RECORD.unpack(record)
+                yield timestamp, socket.inet_ntoa(addr), port, stream.read(length)
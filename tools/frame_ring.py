@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+A ring of frame slots in shared memory, between producers and sender75d.
+
+Only the standard library is needed, so producers start quickly. Each
+ring has one producer and one consumer, and no locks: the producer owns
+write_seq and the consumer owns read_seq, each in its own cache line.
+
+    offset 0     magic "R75R", version, slot count, slot size, width,
+                 height, all 32 bit little endian
+    offset 64    write_seq, 64 bits, frames committed by the producer
+    offset 128   read_seq, 64 bits, frames released by the consumer
+    offset 4096  the slots, each a width x height x 3 RGB frame, rounded
+                 up to a whole page
+'''
+
+import mmap
+import os
+import struct
+import time
+
+
+MAGIC = b'R75R'
+VERSION = 1
+
+HEADER = struct.Struct('<4sIIIII')
+SEQ = struct.Struct('<Q')
+WRITE_SEQ = 64
+READ_SEQ = 128
+SLOTS = 4096
+
+RING_DIR = '/dev/shm'
+
+
+def ring_path(name):
+    if os.path.sep in name:
+        return name
+    return os.path.join(RING_DIR, 'receiver75-' + name)
+
+
+class FrameRing:
+    '''
+    A ring created here is only open to its owner unless mode says
+    otherwise, and is removed by unlink().
+    '''
+    def __init__(self, path, create=False, width=64, height=64*16,
+            slot_count=4, mode=0o600):
+        self.path = path
+
+        if create:
+            frame_size = width * height * 3
+            slot_size = (frame_size + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, mode)
+            # A ring left by an earlier run keeps its mode otherwise.
+            os.fchmod(fd, mode)
+            os.ftruncate(fd, SLOTS + slot_count * slot_size)
+        else:
+            fd = os.open(path, os.O_RDWR)
+
+        try:
+            self.mem = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+        if create:
+            HEADER.pack_into(
+                self.mem, 0,
+                MAGIC, VERSION, slot_count, slot_size, width, height,
+            )
+
+        magic, version, self.slot_count, self.slot_size, self.width, self.height = (
+            HEADER.unpack_from(self.mem, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a frame ring')
+
+        self.frame_size = self.width * self.height * 3
+
+    @classmethod
+    def create(cls, name, **kwargs):
+        return cls(ring_path(name), create=True, **kwargs)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(ring_path(name))
+
+    def close(self):
+        self.mem.close()
+
+    def unlink(self):
+        '''Removes the ring, producers already attached keep their mapping.'''
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    @property
+    def write_seq(self):
+        return SEQ.unpack_from(self.mem, WRITE_SEQ)[0]
+
+    @property
+    def read_seq(self):
+        return SEQ.unpack_from(self.mem, READ_SEQ)[0]
+
+    def slot(self, seq):
+        '''A writable view of the frame slot used for sequence number seq.'''
+        start = SLOTS + (seq % self.slot_count) * self.slot_size
+        return memoryview(self.mem)[start:start + self.frame_size]
+
+    # Producer side.
+
+    def reserve(self, timeout=None):
+        '''
+        Returns the next free slot to fill, or None if the ring stays full
+        for timeout seconds. Call commit once the frame is written.
+        '''
+        seq = self.write_seq
+        end = None if timeout is None else time.monotonic() + timeout
+        while seq - self.read_seq >= self.slot_count:
+            if end is not None and time.monotonic() > end:
+                return None
+            time.sleep(0.001)
+        return self.slot(seq)
+
+    def commit(self):
+        # The frame data is in place before the sequence number moves.
+        SEQ.pack_into(self.mem, WRITE_SEQ, self.write_seq + 1)
+
+    def write(self, data, timeout=None):
+        '''Copies a whole RGB frame into the ring.'''
+        slot = self.reserve(timeout)
+        if slot is None:
+            return False
+        slot[:] = data
+        self.commit()
+        return True
+
+    # Consumer side.
+
+    def pending(self):
+        return self.write_seq - self.read_seq
+
+    def release(self, count=1):
+        SEQ.pack_into(self.mem, READ_SEQ, self.read_seq + count)
@@ -4,8 +4,25 @@
 # SPDX-License-Identifier: MIT
 
 import argparse
+import socket
 import struct
 
+from sender75 import lookup_csr, np, process_image
+
+
+# The config is flashed at this offset, in a 4 MiB flash by default.
+CONFIG_ADDR = 4000000
+FLASH_SIZE = 4 * 1024 * 1024
+
+# The extended config follows the IP and MAC addresses.
+CONFIG_MAGIC = b'R75C'
+CONFIG_VERSION = 1
+
+# Boot image flags.
+IMAGE_REPLICATE = 1
+
+PANEL_WORDS = 64*48
+
 
 def hex_line(address, record_type, data):
     byte_count = len(data) & 0xff
@@ -16,10 +33,17 @@ def hex_line(address, record_type, data):
 
 def write_hex_file(config):
     with open('config.hex', 'w') as stream:
-        # Set 32bit address to 4000000.
-        stream.write(hex_line(0, 5, struct.pack('!i', 4000000)) + '\n')
-        # Data record.
-        stream.write(hex_line(0, 0, config) + '\n')
+        # Set 32bit address to CONFIG_ADDR.
+        stream.write(hex_line(0, 5, struct.pack('!i', CONFIG_ADDR)) + '\n')
+        # Data records, with an extended address for each 64KB.
+        for offset in range(0, len(config), 32):
+            if offset and offset % 0x10000 == 0:
+                stream.write(
+                    hex_line(0, 4, struct.pack('!H', offset >> 16)) + '\n'
+                )
+            stream.write(
+                hex_line(offset & 0xffff, 0, config[offset:offset+32]) + '\n'
+            )
         # EOF record.
         stream.write(hex_line(0, 1, b'') + '\n')
 
@@ -29,6 +53,39 @@ def write_bin_file(config):
         stream.write(config)
 
 
+def make_extended_config(presets, image=b'', image_addr=0, image_flags=0):
+    '''
+    The extended config is read by the firmware at boot. All fields are
+    big endian:
+
+        magic          4 bytes, "R75C"
+        version        1 byte
+        preset count   1 byte
+        image flags    2 bytes
+        image words    4 bytes, 0 for no image
+        image address  4 bytes, in DRAM words
+        presets        (CSR address, value) pairs, 4 bytes each
+        image          raw pixel data, as sent to UDP port 4343
+
+    The presets are applied after the image has been written, in order.
+    '''
+    assert len(presets) <= 255
+    assert len(image) % 4 == 0
+
+    config = CONFIG_MAGIC + struct.pack(
+        '!BBHII',
+        CONFIG_VERSION,
+        len(presets),
+        image_flags,
+        len(image) // 4,
+        image_addr,
+    )
+    for addr, value in presets:
+        config += struct.pack('!II', addr, value)
+
+    return config + image
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -42,6 +99,46 @@ def main():
         choices=['bin', 'hex'],
         help="The type of flash file to write"
     )
+    parser.add_argument(
+        "--csr-csv",
+        default=None,
+        help="The csr.csv file used to look up preset names"
+    )
+    parser.add_argument(
+        "--preset",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="A CSR to write at boot, can be given many times"
+    )
+    parser.add_argument(
+        "--multicast-group",
+        default=None,
+        help="A multicast group to take datagrams from as well, e.g. 239.1.2.3"
+    )
+    parser.add_argument(
+        "--flash-size",
+        type=int,
+        default=FLASH_SIZE,
+        help="The size of the SPI flash, in bytes"
+    )
+    parser.add_argument(
+        "--enable",
+        action="store_true",
+        help="Enable the display at boot, after the presets"
+    )
+    if np is not None:
+        parser.add_argument(
+            "--boot-image",
+            default=None,
+            help="A numpy file with one 64x64x3 panel or 16 of them"
+        )
+        parser.add_argument(
+            "--boot-bank",
+            type=int,
+            default=0,
+            help="The bank to write the boot image to, and to show at boot"
+        )
     args = parser.parse_args()
 
     # Get the IP address components.
@@ -61,6 +158,52 @@ def main():
         parts
     )
 
+    image = b''
+    image_addr = 0
+    image_flags = 0
+    if getattr(args, 'boot_image', None):
+        im = np.load(args.boot_image)
+        if im.size == 64*64*3:
+            # A single panel, copied to the rest of the bank at boot.
+            image_flags |= IMAGE_REPLICATE
+        else:
+            assert im.size == 16*64*64*3
+        image = process_image(im.reshape((-1, 64, 64, 3))).tobytes()
+        image_addr = args.boot_bank * 16 * PANEL_WORDS
+
+    presets = []
+    if image:
+        # Show the bank the image is in, unless a preset says otherwise.
+        presets.append(
+            (lookup_csr('hub75_controller_base_addr', args.csr_csv), image_addr)
+        )
+    for preset in args.preset:
+        name, value = preset.split('=')
+        presets.append(
+            (lookup_csr(name, args.csr_csv), int(value, base=0))
+        )
+    if args.multicast_group is not None:
+        group, = struct.unpack('!I', socket.inet_aton(args.multicast_group))
+        presets.append(
+            (lookup_csr('hub75_soc_multicast_group', args.csr_csv), group)
+        )
+    if args.enable:
+        presets.append(
+            (lookup_csr('hub75_controller_enable', args.csr_csv), 1)
+        )
+
+    if presets or image:
+        config += make_extended_config(
+            presets, image, image_addr, image_flags,
+        )
+
+    if CONFIG_ADDR + len(config) > args.flash_size:
+        parser.error(
+            f'the config is {len(config)} bytes, but only '
+            f'{args.flash_size - CONFIG_ADDR} fit in the flash after offset '
+            f'{CONFIG_ADDR}, use a single panel --boot-image'
+        )
+
     if args.format == 'bin':
         write_bin_file(config)
     elif args.format == 'hex':
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Resends a capture made with sender75.py --record.
+
+The datagrams go out with their original timing, scaled by --speed, or
+as fast as possible with --max-speed. --target sends everything to one
+address, e.g. a card on the bench or a local stand-in, and --map moves
+single cards.
+'''
+
+import argparse
+import socket
+import time
+
+from capture import read_capture
+from sender75 import add_diagnostic_args, run_with_diagnostics, send_packet
+
+
+def replay(path, speed=1.0, max_speed=False, target=None, mapping={}):
+    '''Returns (datagrams, bytes, seconds taken).'''
+    sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    count = 0
+    size = 0
+    start = time.perf_counter()
+
+    for timestamp, eth_ip, port, payload in read_capture(path):
+        if target is not None:
+            eth_ip = target
+        else:
+            eth_ip = mapping.get(eth_ip, eth_ip)
+
+        if not max_speed:
+            delay = start + timestamp / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        send_packet(sock, eth_ip, port, [payload])
+        count += 1
+        size += len(payload)
+
+    return count, size, max(time.perf_counter() - start, 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('capture', help="A .pcap file or a compact log")
+    parser.add_argument(
+        '--speed',
+        type=float,
+        default=1.0,
+        help="Scale the original timing, 2 is twice as fast",
+    )
+    parser.add_argument('--max-speed', action='store_true')
+    parser.add_argument('--target', help="Send every datagram to this IP address")
+    parser.add_argument(
+        '--map',
+        action='append',
+        default=[],
+        metavar="OLD=NEW",
+        help="Send datagrams for one IP address to another",
+    )
+    parser.add_argument('--loop', type=int, default=1)
+    add_diagnostic_args(parser)
+    args = parser.parse_args()
+
+    run_with_diagnostics(run, args)
+
+
+def run(args):
+    mapping = dict(m.split('=') for m in args.map)
+
+    for _ in range(args.loop):
+        count, size, seconds = replay(
+            args.capture,
+            speed=args.speed,
+            max_speed=args.max_speed,
+            target=args.target,
+            mapping=mapping,
+        )
+        print(
+            f'{count} datagrams, {size} bytes in {seconds:.3f}s: '
+            f'{count / seconds:.0f} datagrams/s, {size * 8 / seconds / 1e6:.1f} Mb/s'
+        )
+
+
+if __name__ == "__main__":
+    main()
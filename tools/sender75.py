@@ -4,25 +4,209 @@
 # SPDX-License-Identifier: MIT
 
 import argparse
+import contextlib
+import cProfile
 import csv
+import errno
+import json
 import os.path
 import socket
 import struct
 import time
 
+from capture import Recorder
+
 try:
     import numpy as np
+    from temporal_dither import TemporalDither
 except:
     np = None
 
 
 csrs = None
+card_csrs = {}
 
 
-def lookup_csr(name, csv_file=None):
-    global csrs
+class Histogram:
+    # Seconds, from 10us to 1s.
+    BUCKETS = (
+        1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+        1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2,
+        0.1, 0.25, 0.5, 1.0,
+    )
 
-    if csrs is None:
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        idx = 0
+        while idx < len(self.BUCKETS) and value > self.BUCKETS[idx]:
+            idx += 1
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+class Metrics:
+    '''
+    Counters and timing histograms, keyed by name and labels.
+
+    Names follow Prometheus: counters end in _total and timings in
+    _seconds. Nothing is kept until enabled, which --metrics does.
+    '''
+    def __init__(self, prefix='sender75'):
+        self.prefix = prefix
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, value=1, **labels):
+        if self.enabled:
+            key = (name, tuple(sorted(labels.items())))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            key = (name, tuple(sorted(labels.items())))
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def as_dict(self):
+        def entry(key, **values):
+            return dict(name=key[0], labels=dict(key[1]), **values)
+
+        return {
+            'counters': [
+                entry(key, value=value)
+                for key, value in sorted(self.counters.items())
+            ],
+            'histograms': [
+                entry(
+                    key,
+                    count=h.count, sum=h.sum, max=h.max,
+                    buckets=dict(zip([str(b) for b in Histogram.BUCKETS] + ['+Inf'], h.counts)),
+                )
+                for key, h in sorted(self.histograms.items())
+            ],
+        }
+
+    def to_prometheus(self):
+        def labels(pairs):
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        lines = []
+        typed = set()
+        for (name, pairs), value in sorted(self.counters.items()):
+            name = f'{self.prefix}_{name}'
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{labels(pairs)} {value}')
+
+        for (name, pairs), h in sorted(self.histograms.items()):
+            name = f'{self.prefix}_{name}'
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            total = 0
+            for le, count in zip(list(Histogram.BUCKETS) + ['+Inf'], h.counts):
+                total += count
+                lines.append(f'{name}_bucket{labels(pairs + (("le", le),))} {total}')
+            lines.append(f'{name}_sum{labels(pairs)} {h.sum}')
+            lines.append(f'{name}_count{labels(pairs)} {h.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        '''Writes JSON for a .json path, otherwise Prometheus text.'''
+        if path.endswith('.json'):
+            text = json.dumps(self.as_dict(), indent=2)
+        else:
+            text = self.to_prometheus()
+
+        # Replace the file in one go, for scrapers.
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as stream:
+            stream.write(text)
+        os.replace(tmp, path)
+
+
+metrics = Metrics()
+
+# Set by start_recording to log every datagram sent.
+recorder = None
+
+
+def start_recording(path):
+    global recorder
+    recorder = Recorder(path)
+
+
+def stop_recording():
+    global recorder
+    if recorder is not None:
+        recorder.close()
+        recorder = None
+
+
+def send_packet(sock, eth_ip, port, buffers):
+    if not metrics.enabled:
+        # This is once per datagram, so keep it to the send.
+        sent = sock.sendmsg(buffers, [], 0, (eth_ip, port))
+        if recorder is not None:
+            recorder.record(eth_ip, port, buffers)
+        return sent
+
+    start = time.perf_counter()
+    try:
+        sent = sock.sendmsg(buffers, [], 0, (eth_ip, port))
+    except OSError as e:
+        # e.g. ENOBUFS when the socket buffer is full.
+        metrics.count(
+            'send_errors_total',
+            card=eth_ip,
+            error=errno.errorcode.get(e.errno, str(e.errno)),
+        )
+        raise
+    metrics.observe('send_seconds', time.perf_counter() - start)
+    metrics.count('packets_total', card=eth_ip)
+    metrics.count('bytes_total', sent, card=eth_ip)
+    if recorder is not None:
+        recorder.record(eth_ip, port, buffers)
+    return sent
+
+
+# UdpWishboneWriter writes a word to the bus slower than they arrive, so
+# longer bursts would fill its FIFO.
+MAX_BURST = 32
+
+
+class RegisterMap:
+    '''
+    The CSRs of a gateware build, read from its csr.csv.
+
+    Writes to registers at consecutive addresses are coalesced into one
+    datagram, which UdpWishboneWriter writes in address order.
+    '''
+    def __init__(self, csv_file=None):
         if csv_file is None:
             csv_file = os.path.join(
                 os.path.dirname(__file__),
@@ -30,45 +214,432 @@ def lookup_csr(name, csv_file=None):
                 'prebuilt/csr.csv',
             )
 
-        csrs = {}
+        self.csv_file = csv_file
+        self.addrs = {}
+        self.sizes = {}
         with open(csv_file, 'r') as stream:
             reader = csv.reader(stream)
             for row in reader:
                 if len(row) < 3:
                     continue
                 if row[0] == 'csr_register':
-                    csrs[row[1]] = int(row[2], base=0)
+                    self.addrs[row[1]] = int(row[2], base=0)
+                    self.sizes[row[1]] = int(row[3]) if len(row) > 3 and row[3] else 1
+
+    def __getitem__(self, name):
+        return self.addrs[name]
+
+    def __contains__(self, name):
+        return name in self.addrs
+
+    def words(self, name, value):
+        '''The 32 bit words of a register's value, most significant first.'''
+        size = self.sizes[name]
+        return [(value >> (32*(size - 1 - i))) & 0xffffffff for i in range(size)]
+
+    def bursts(self, values):
+        '''
+        Groups a {name: value} dict into (addr, words) runs of consecutive
+        addresses, lowest first.
+        '''
+        words = {}
+        for name, value in values.items():
+            addr = self.addrs[name]
+            for word in self.words(name, value):
+                words[addr] = word
+                addr += 4
+
+        runs = []
+        for addr in sorted(words):
+            if runs and addr == runs[-1][0] + 4*len(runs[-1][1]) and len(runs[-1][1]) < MAX_BURST:
+                runs[-1][1].append(words[addr])
+            else:
+                runs.append((addr, [words[addr]]))
+        return runs
 
-    return csrs[name]
+    def write(self, eth_ip, values, sock=None):
+        '''
+        Writes a {name: value} dict to a card, in as few datagrams as the
+        register layout allows. Registers are written in address order,
+        so one whose write starts something should come after the ones it
+        uses, as the gateware lays them out.
+        '''
+        if sock is None:
+            sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        runs = self.bursts(values)
+        for addr, words in runs:
+            send_packet(sock, eth_ip, 4344, [struct.pack(f'<{len(words) + 1}I', addr>>2, *words)])
+        return len(runs)
+
+
+def load_csrs(csv_file=None, eth_ip=None):
+    '''
+    Loads the CSR map of a gateware build, for all cards or, when a fleet
+    runs mixed builds, for just the card at eth_ip.
+    '''
+    global csrs
+
+    regs = RegisterMap(csv_file)
+    if eth_ip is None:
+        csrs = regs
+    else:
+        card_csrs[eth_ip] = regs
+    return regs
+
+
+def register_map(eth_ip=None):
+    '''The CSR map of the build a card runs.'''
+    if eth_ip in card_csrs:
+        return card_csrs[eth_ip]
+    if csrs is None:
+        load_csrs()
+    return csrs
+
+
+def lookup_csr(name, csv_file=None, eth_ip=None):
+    if csrs is None and csv_file is not None:
+        load_csrs(csv_file)
+
+    return register_map(eth_ip)[name]
 
 
 def poke(eth_ip, addr, *vals):
+    '''Writes vals to consecutive registers from addr, in one datagram.'''
     if isinstance(addr, str):
-        addr = lookup_csr(addr)
+        addr = lookup_csr(addr, eth_ip=eth_ip)
 
     sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
-    for val in vals:
-        sock.sendto(struct.pack('<II', addr>>2, val), (eth_ip, 4344))
-        addr += 4
+    for i in range(0, len(vals), MAX_BURST):
+        words = vals[i:i + MAX_BURST]
+        send_packet(sock, eth_ip, 4344, [
+            struct.pack(f'<{len(words) + 1}I', (addr>>2) + i, *words),
+        ])
+
+
+def write_csrs(eth_ip, values):
+    '''Writes a {name: value} dict of CSRs, see RegisterMap.write().'''
+    return register_map(eth_ip).write(eth_ip, values)
+
+
+# Timing profiles set the hub75_controller registers named, without the
+# prefix. The default is what the gateware comes up with.
+TIMING_PROFILES = {
+    'default': {
+        'prelatch_cycles': 1,
+        'latch_cycles': 3,
+        'postlatch_cycles': 1,
+        'output_cycles': 6,
+        'addr_switch_cycles': 1,
+        'cycle_length': 4100,
+    },
+}
+
+
+def load_profiles(path):
+    '''Adds the timing profiles in a JSON file of {name: {register: value}}.'''
+    with open(path, 'r') as stream:
+        TIMING_PROFILES.update(json.load(stream))
+
+
+def apply_profile(eth_ip, profile, enable=True):
+    '''
+    Sets a card's display timing from a profile, by name or as a dict.
+
+    The timing registers sit either side of enable, so it is written too
+    and the whole profile takes one datagram. Registers the card's build
+    lacks, such as clk_div without DDR output, are left out.
+    '''
+    if isinstance(profile, str):
+        profile = TIMING_PROFILES[profile]
+    regs = register_map(eth_ip)
+    values = {'hub75_controller_enable': int(enable)}
+    for name, value in profile.items():
+        name = 'hub75_controller_' + name
+        if name in regs:
+            values[name] = value
+    return regs.write(eth_ip, values)
+
+
+def peek(eth_ip, addr, count=1, timeout=1.0):
+    if isinstance(addr, str):
+        addr = lookup_csr(addr, eth_ip=eth_ip)
+
+    sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    send_packet(sock, eth_ip, 4345, [struct.pack('<II', addr>>2, count)])
+
+    # The reply starts with the address, so stale replies can be skipped.
+    while True:
+        data = sock.recv(4 * (count + 1))
+        reply = struct.unpack(f'<{len(data)//4}I', data)
+        if reply[0] == addr>>2:
+            return list(reply[1:])
+
+
+def read_status(eth_ip):
+    names = [
+        'frames',
+        'row_period',
+        'frame_period',
+        'underruns',
+        'filler_max_busy',
+    ]
+    return {
+        name: peek(eth_ip, 'hub75_controller_' + name)[0]
+        for name in names
+    }
+
+
+DISCOVERY_PORT = 4348
+
+
+def discover(broadcast='255.255.255.255', timeout=0.5):
+    '''
+    Finds every card that hears a broadcast, in one round trip, and
+    returns a dict for each of its addresses, gateware ident and status,
+    in order of IP address.
+
+    Cards stagger their replies by the low byte of their IP address, by
+    up to 1ms, so timeout only has to cover that and the network.
+    '''
+    def ip_string(value):
+        return socket.inet_ntoa(struct.pack('!I', value))
+
+    tag = int.from_bytes(os.urandom(4), 'little')
+    sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    send_packet(sock, broadcast, DISCOVERY_PORT, [struct.pack('<I', tag)])
+
+    cards = {}
+    end = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data = sock.recv(2048)
+            except socket.timeout:
+                break
+            if len(data) < 40:
+                continue
+            fields = struct.unpack('<10I', data[:40])
+            if fields[0] != tag:
+                continue
+
+            mac = ((fields[1] & 0xffff) << 32 | fields[2]).to_bytes(6, 'big')
+            ip = ip_string(fields[3])
+            cards[ip] = {
+                'ip': ip,
+                'mac': ':'.join(f'{b:02x}' for b in mac),
+                'ident': data[40:40 + fields[9]].decode(errors='replace'),
+                'multicast_group': ip_string(fields[4]),
+                'enabled': bool(fields[5]),
+                'base_addr': fields[6],
+                'frames': fields[7],
+                'underruns': fields[8],
+            }
+    finally:
+        sock.close()
+
+    return [cards[ip] for ip in sorted(cards, key=socket.inet_aton)]
+
+
+def set_multicast_group(eth_ip, group):
+    '''
+    Has a card also take datagrams sent to a multicast group, so one send
+    drives many cards. A group of '0.0.0.0' leaves it.
+    '''
+    poke(eth_ip, 'hub75_soc_multicast_group',
+        struct.unpack('!I', socket.inet_aton(group))[0])
 
 
 def set_base_addr(eth_ip, addr):
     poke(eth_ip, 'hub75_controller_base_addr', addr)
 
 
+# 48 integers per row
+# 64 rows per panel
+# 16 panels per bank
+BANK_SIZE = 48*64*16
+
+# Banks that fit in the card's 21 bit word addresses.
+BANKS = (1 << 21) // BANK_SIZE
+
+
 def show_bank(eth_ip, bank):
-    # 48 integers per row
-    # 64 rows per panel
-    # 16 panels per bank
-    set_base_addr(eth_ip, bank*48*64*16)
+    set_base_addr(eth_ip, bank*BANK_SIZE)
+
+
+def show_bank_at(eth_ip, bank, when):
+    '''
+    Has a card show bank from its first frame after when, in
+    time.time_ns() nanoseconds. The card's clock has to be kept in sync
+    by a ClockSync, and cards told the same time swap together.
+    '''
+    write_csrs(eth_ip, {
+        'scheduled_swap_addr': bank*BANK_SIZE,
+        'scheduled_swap_time': when,
+    })
+
+
+TIME_PORT = 4347
+TIME_FRAC_BITS = 24
+
+
+class ClockSync:
+    '''
+    Keeps a card's time base to this host's clock, time.time_ns().
+
+    Each sync() makes a few exchanges with the card and takes the offset
+    from the one with the shortest round trip, which has the least room
+    for the delays each way to differ. The card's time is stepped by the
+    offset, and when the last sync was at least drift_interval seconds
+    before, its rate is trimmed by the drift since.
+    '''
+    def __init__(self, eth_ip, sys_clk_freq=64e6, samples=8,
+            drift_interval=1.0, timeout=0.1):
+        self.eth_ip = eth_ip
+        self.samples = samples
+        self.drift_interval = drift_interval
+        self.increment = round(1e9 / sys_clk_freq * 2**TIME_FRAC_BITS)
+        self.last_sync = None
+        self.tag = 0
+        self.sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.sock.settimeout(timeout)
+
+    def measure(self):
+        '''
+        Returns the round trip and the card's offset, in ns. Exchanges
+        that time out are left out, and socket.timeout is raised if all
+        of them do.
+        '''
+        best = None
+        for _ in range(self.samples):
+            self.tag = (self.tag + 1) & 0xffffffff
+            sent = time.time_ns()
+            send_packet(self.sock, self.eth_ip, TIME_PORT, [struct.pack('<I', self.tag)])
+
+            # The reply starts with the tag, so stale replies can be skipped.
+            try:
+                while True:
+                    data = self.sock.recv(12)
+                    received = time.time_ns()
+                    if len(data) != 12:
+                        continue
+                    tag, high, low = struct.unpack('<III', data)
+                    if tag == self.tag:
+                        break
+            except socket.timeout:
+                metrics.count('clock_sync_timeouts_total', card=self.eth_ip)
+                continue
+
+            sample = (received - sent, (high << 32 | low) - (sent + received) // 2)
+            if best is None or sample < best:
+                best = sample
+        if best is None:
+            raise socket.timeout(f'no time replies from {self.eth_ip}')
+        return best
+
+    def sync(self):
+        '''Steps the card's time to this host's, and returns the offset.'''
+        round_trip, offset = self.measure()
+        now = time.time_ns()
+
+        if self.last_sync is not None and now - self.last_sync >= self.drift_interval * 1e9:
+            # Anything built up since the last step is drift, unless it is
+            # more than a crystal could be out, e.g. the card was reset.
+            drift = offset / (now - self.last_sync)
+            if abs(drift) < 1e-3:
+                self.increment = round(self.increment / (1 + drift))
+                poke(self.eth_ip, 'time_base_increment', self.increment)
+
+        step = -offset & 0xffffffffffffffff
+        poke(self.eth_ip, 'time_base_adjust', step >> 32, step & 0xffffffff)
+        self.last_sync = now
+
+        metrics.observe('clock_round_trip_seconds', round_trip / 1e9, card=self.eth_ip)
+        return offset
+
+    def close(self):
+        self.sock.close()
+
+
+VSYNC_FRAME = 1
+VSYNC_SWAP = 2
+
+
+class VsyncListener:
+    '''
+    Receives the vsync datagrams of one card.
+
+    Enabling the events makes this host the last sender, so the card
+    sends them here unless vsync_ip_address is set.
+    '''
+    def __init__(self, eth_ip, events=VSYNC_FRAME|VSYNC_SWAP, port=4346,
+            timeout=1.0):
+        self.eth_ip = eth_ip
+        self.sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.sock.bind(('', port))
+        self.sock.settimeout(timeout)
+        poke(eth_ip, 'vsync_port', port)
+        poke(eth_ip, 'vsync_events', events)
+
+    def wait(self):
+        '''Returns (events, frame counter, base address displayed).'''
+        while True:
+            data, addr = self.sock.recvfrom(12)
+            if addr[0] == self.eth_ip and len(data) == 12:
+                return struct.unpack('<III', data)
+
+    def close(self):
+        poke(self.eth_ip, 'vsync_events', 0)
+        self.sock.close()
+
+
+def play_frames(eth_ip, frames, listener, interval=1, banks=(0, 1)):
+    '''
+    Double buffers frames, showing each one for interval display frames.
+
+    A frame is only drawn into a bank once the card reports the other
+    bank on display, and the next bank is staged just before the frame
+    it should appear in.
+    '''
+    idx = 1
+    shown = None
+    for im in frames:
+        bank = banks[idx]
+        draw_all_panels(eth_ip, im, bank)
+
+        if shown is not None:
+            while True:
+                _, frame, _ = listener.wait()
+                if frame - shown >= interval - 1:
+                    break
+        show_bank(eth_ip, bank)
+        swapped = time.perf_counter()
+
+        while True:
+            _, frame, addr = listener.wait()
+            if addr == bank*BANK_SIZE:
+                shown = frame
+                break
+        metrics.observe(
+            'swap_latency_seconds', time.perf_counter() - swapped, card=eth_ip,
+        )
+
+        idx ^= 1
 
 
 def process_image(im, gamma=2.5, scales=[1, 1, 1]):
-    im = im * scales
-    if gamma != 1:
-        im = (((im / 255) ** gamma) * 255)
-    im = np.clip(im, 0, 255)
-    return im.astype(np.uint8)
+    with metrics.timer('process_image_seconds'):
+        im = im * scales
+        if gamma != 1:
+            im = (((im / 255) ** gamma) * 255)
+        im = np.clip(im, 0, 255)
+        return im.astype(np.uint8)
 
 
 def draw_panel(eth_ip, im, panel=0):
@@ -80,16 +651,126 @@ def draw_panel(eth_ip, im, panel=0):
     sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
 
     for r in range(16):
+        start = time.perf_counter()
         offset = (r*4*ints_per_row + panel*64*ints_per_row)
-        sock.sendmsg(
-            [
-                struct.pack('<i', offset),
-                im[r*4:r*4+4].flatten(),
-            ],
-            [],
-            0,
-            (eth_ip, 4343),
-        )
+        buffers = [
+            struct.pack('<i', offset),
+            im[r*4:r*4+4].flatten(),
+        ]
+        metrics.observe('pack_seconds', time.perf_counter() - start)
+        send_packet(sock, eth_ip, 4343, buffers)
+
+
+# Wire formats, selected by bits 24-27 of the packet header. The card
+# expands the reduced ones back to 24 bit RGB.
+WIRE_RGB888 = 0
+WIRE_RGB565 = 1
+WIRE_RGB666 = 2
+
+WIRE_FORMATS = {
+    'rgb888': WIRE_RGB888,
+    'rgb565': WIRE_RGB565,
+    'rgb666': WIRE_RGB666,
+}
+
+
+def encode_pixels(data, wire_format):
+    '''
+    Packs RGB bytes into a reduced wire format.
+
+    Pixels are a bit stream, LSB first, of 16 bit (5:6:5) or 18 bit
+    (6:6:6) values with blue in the low bits.
+    '''
+    px = np.frombuffer(data, dtype=np.uint8).reshape((-1, 3))
+    r, g, b = (px[:, c].astype(np.uint32) for c in range(3))
+
+    if wire_format == WIRE_RGB565:
+        return ((r >> 3) << 11 | (g >> 2) << 5 | (b >> 3)).astype('<u2').tobytes()
+
+    assert wire_format == WIRE_RGB666
+    assert len(px) % 4 == 0
+    p = ((r >> 2) << 12 | (g >> 2) << 6 | (b >> 2)).astype(np.uint64).reshape((-1, 4))
+
+    # 4 pixels are 72 bits: 64 in one word and 8 in a byte.
+    out = np.empty((len(p), 9), dtype=np.uint8)
+    lo = p[:, 0] | p[:, 1] << 18 | p[:, 2] << 36 | p[:, 3] << 54
+    out[:, :8] = lo.astype('<u8').view(np.uint8).reshape((-1, 8))
+    out[:, 8] = p[:, 3] >> 10
+    return out.tobytes()
+
+
+def draw_bank(eth_ip, data, bank=0, sock=None, wire_format=WIRE_RGB888,
+        jumbo=False):
+    '''
+    Sends whole panels of RGB bytes, as laid out in DRAM, to a bank.
+
+    The panels of a bank are contiguous, so this is 4 rows per packet
+    from start to end, or 8 rows for the reduced wire formats. With jumbo,
+    for gateware built with --eth-jumbo and a network with a 9000 byte
+    MTU, it is 44 or 56 rows per packet.
+    '''
+    if sock is None:
+        sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+
+    data = memoryview(data).cast('B')
+    offset = bank * BANK_SIZE
+
+    if wire_format == WIRE_RGB888:
+        packet_bytes = (44 if jumbo else 4) * 48 * 4
+        for start in range(0, len(data), packet_bytes):
+            send_packet(sock, eth_ip, 4343, [
+                struct.pack('<i', offset + start // 4),
+                data[start:start + packet_bytes],
+            ])
+        return
+
+    start = time.perf_counter()
+    wire = encode_pixels(data, wire_format)
+    metrics.observe('pack_seconds', time.perf_counter() - start)
+
+    # 8 rows of 64 pixels, in 1024 or 1152 bytes, or 56 rows in 7168 or
+    # 8064 bytes.
+    packet_pixels = (56 if jumbo else 8) * 64
+    pixel_bits = 16 if wire_format == WIRE_RGB565 else 18
+    packet_bytes = packet_pixels * pixel_bits // 8
+    header = wire_format << 24
+    for idx, start in enumerate(range(0, len(wire), packet_bytes)):
+        send_packet(sock, eth_ip, 4343, [
+            struct.pack('<I', header | (offset + idx * packet_pixels * 3 // 4)),
+            wire[start:start + packet_bytes],
+        ])
+
+
+# Bit 31 of the header marks a rectangle packet.
+RECT = 1 << 31
+
+
+def draw_rect(eth_ip, im, x, y, bank=0, sock=None):
+    '''
+    Draws a height x width x 3 image at x, y of a bank, in the layout
+    draw_bank sends, with rectangle packets that the card places itself.
+
+    Each datagram holds as many whole rows as fit, so small updates go
+    in one. Rectangles are always sent as RGB888, as the card places
+    them a byte a cycle and could not keep up with expanded pixels.
+    '''
+    if sock is None:
+        sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+
+    im = np.asarray(im, dtype=np.uint8)
+    height, width = im.shape[:2]
+    assert 0 <= x and x + width <= 64
+
+    # 1472 bytes, less the 3 header words.
+    rows = max(1, 1460 // (width * 3))
+
+    header = RECT | WIRE_RGB888 << 24 | bank
+    for top in range(0, height, rows):
+        part = im[top:top + rows]
+        send_packet(sock, eth_ip, 4343, [
+            struct.pack('<III', header, x | (y + top) << 16, width | len(part) << 16),
+            part.tobytes(),
+        ])
 
 
 def draw_all_panels(eth_ip, im, bank=0):
@@ -97,6 +778,201 @@ def draw_all_panels(eth_ip, im, bank=0):
         draw_panel(eth_ip, im, panel + bank*16)
 
 
+def blit(eth_ip, src, dst, width, height=1, src_stride=None, dst_stride=None):
+    '''
+    Copies width x height words from src to dst on the card.
+
+    All values are in 32 bit words, and must be even. The parameters and
+    the start register are written in a single datagram.
+    '''
+    if src_stride is None:
+        src_stride = width
+    if dst_stride is None:
+        dst_stride = width
+
+    addr = lookup_csr('blit_src', eth_ip=eth_ip)
+    sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    send_packet(sock, eth_ip, 4344, [
+        struct.pack(
+            '<8I',
+            addr>>2,
+            src, dst, width, height, src_stride, dst_stride,
+            1,
+        ),
+    ])
+
+
+def wait_blit(eth_ip, timeout=1.0):
+    end = time.monotonic() + timeout
+    while peek(eth_ip, 'blit_busy')[0]:
+        if time.monotonic() > end:
+            raise TimeoutError('blit did not finish')
+
+
+def copy_bank(eth_ip, src_bank, dst_bank):
+    blit(eth_ip, src_bank*BANK_SIZE, dst_bank*BANK_SIZE, BANK_SIZE)
+
+
+# The card's test patterns, see pattern_generator.py.
+PATTERNS = {
+    'solid': 0,
+    'gradient-x': 1,
+    'gradient-y': 2,
+    'panel-id': 3,
+    'bar': 4,
+}
+
+
+def show_pattern(eth_ip, pattern, color=0xffffff, bank=0, position=0,
+        width=8, step=1, continuous=False):
+    '''
+    Has the card draw a test pattern into bank itself, with no pixel data
+    sent. pattern is a name from PATTERNS.
+
+    With continuous, the card keeps redrawing it into bank and the bank
+    after, showing each in turn and moving a bar on by step pixels a
+    frame, until stop_pattern(). Otherwise, wait_pattern() and then
+    show_bank() to see it.
+
+    The parameters and the start register are written in a single
+    datagram. Colors are sent to the panels as they are, without gamma.
+    '''
+    addr = lookup_csr('pattern_addr', eth_ip=eth_ip)
+    sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    send_packet(sock, eth_ip, 4344, [
+        struct.pack(
+            '<9I',
+            addr>>2,
+            bank*BANK_SIZE, PATTERNS[pattern], color, position, width, step,
+            int(continuous),
+            1,
+        ),
+    ])
+
+
+def stop_pattern(eth_ip):
+    '''Stops a continuous pattern, handing the display back to base_addr.'''
+    poke(eth_ip, 'pattern_continuous', 0)
+
+
+def wait_pattern(eth_ip, timeout=1.0):
+    end = time.monotonic() + timeout
+    while peek(eth_ip, 'pattern_busy')[0]:
+        if time.monotonic() > end:
+            raise TimeoutError('pattern did not finish')
+
+
+class Scroller:
+    '''
+    Pans the panels over a virtual framebuffer, for gateware built with
+    --hub75-viewport.
+
+    The framebuffer is a row major RGB image of width x height pixels,
+    with the width a multiple of 8. The panels are laid out columns to a
+    row, each showing 64x64 pixels from the scroll position.
+    '''
+    def __init__(self, eth_ip, width, height, columns=4, addr=0):
+        assert width % 8 == 0
+        self.eth_ip = eth_ip
+        self.width = width
+        self.height = height
+        self.addr = addr
+
+        poke(eth_ip, 'hub75_controller_virtual_width', width)
+        poke(eth_ip, 'hub75_controller_virtual_height', height)
+        poke(eth_ip, 'hub75_controller_panel_columns', columns)
+        set_base_addr(eth_ip, addr)
+        self.scroll_to(0, 0)
+        poke(eth_ip, 'hub75_controller_viewport', 1)
+
+    def draw(self, im):
+        data = np.ascontiguousarray(im, dtype=np.uint8).reshape(-1)
+        assert len(data) == self.width * self.height * 3
+
+        # 1440 bytes is a whole number of 64 bit words.
+        chunk = 1440
+        sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        for offset in range(0, len(data), chunk):
+            send_packet(sock, self.eth_ip, 4343, [
+                struct.pack('<i', self.addr + offset // 4),
+                data[offset:offset+chunk],
+            ])
+
+    def scroll_to(self, x, y):
+        # scroll_y follows scroll_x, so both go in one datagram and a
+        # frame never sees half of a move.
+        poke(
+            self.eth_ip, 'hub75_controller_scroll_x',
+            x % self.width, y % self.height,
+        )
+
+    def close(self):
+        poke(self.eth_ip, 'hub75_controller_viewport', 0)
+
+
+def upload_animation(eth_ip, frames, first_bank=2, interval=1, loop=True):
+    '''
+    Draws frames into consecutive banks from first_bank, then has the
+    card play them back with no further traffic.
+    '''
+    poke(eth_ip, 'animation_enable', 0)
+
+    count = 0
+    for im in frames:
+        draw_all_panels(eth_ip, im, first_bank + count)
+        count += 1
+
+    poke(eth_ip, 'animation_first_addr', first_bank*BANK_SIZE)
+    poke(eth_ip, 'animation_stride', BANK_SIZE)
+    poke(eth_ip, 'animation_count', count)
+    poke(eth_ip, 'animation_interval', interval)
+    poke(eth_ip, 'animation_loop', 1 if loop else 0)
+    poke(eth_ip, 'animation_enable', 1)
+
+
+def stop_animation(eth_ip):
+    poke(eth_ip, 'animation_enable', 0)
+
+
+def add_diagnostic_args(parser):
+    parser.add_argument(
+        '--metrics',
+        help="Write counters and timings here, as JSON for a .json file "
+             "and Prometheus text otherwise",
+    )
+    parser.add_argument('--profile', help="Write cProfile stats here")
+    parser.add_argument(
+        '--record',
+        help="Record every datagram sent, as pcap for a .pcap file and a "
+             "compact log otherwise",
+    )
+
+
+def run_with_diagnostics(fn, args):
+    '''
+    Calls fn(args), recording datagrams for --record, and saving --metrics
+    and --profile output at the end.
+    '''
+    if args.record:
+        start_recording(args.record)
+    metrics.enabled = bool(args.metrics)
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        return fn(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.metrics:
+            metrics.write(args.metrics)
+        stop_recording()
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -109,10 +985,168 @@ def main():
     parser.add_argument('--enable', action='store_true')
     parser.add_argument('--brightness', type=int)
     parser.add_argument('--bank', type=int, default=0)
+    parser.add_argument('--status', action='store_true')
+    parser.add_argument(
+        '--discover',
+        action='store_true',
+        help="List every card that answers a broadcast, with its status",
+    )
+    parser.add_argument('--inventory', help="Write what --discover finds here, as JSON")
+    parser.add_argument('--broadcast', default='255.255.255.255', help="Address --discover sends to")
+    parser.add_argument('--timeout', type=float, default=0.5, help="How long --discover waits")
+    parser.add_argument('--vsync', action='store_true')
+    parser.add_argument('--csr-csv', help="CSR map of the gateware build")
+    parser.add_argument(
+        '--timing-profile',
+        help="Set the display timing from a named profile, in one datagram",
+    )
+    parser.add_argument('--timing-profiles', help="JSON file of more timing profiles")
+    parser.add_argument('--sys-clk-freq', type=float, default=64e6)
+    parser.add_argument('--stop-animation', action='store_true')
+    parser.add_argument('--copy-bank', type=int, help="Copy this bank to --bank")
+    parser.add_argument(
+        '--pattern',
+        choices=PATTERNS,
+        help="Have the card draw a test pattern into --bank itself",
+    )
+    parser.add_argument('--color', default='0xffffff', help="RGB color of --pattern")
+    parser.add_argument('--bar-width', type=int, default=8)
+    parser.add_argument(
+        '--continuous',
+        action='store_true',
+        help="Keep redrawing --pattern, moving the bar, until --stop-pattern",
+    )
+    parser.add_argument('--stop-pattern', action='store_true')
+    parser.add_argument(
+        '--join',
+        metavar='GROUP',
+        help="Have the card take datagrams sent to this multicast group, "
+             "which can then be given as --eth-ip",
+    )
+    parser.add_argument(
+        '--sync-clock',
+        action='store_true',
+        help="Set the card's time base to this host's clock",
+    )
     if np is not None:
         parser.add_argument('--solid')
+        parser.add_argument('--animation', help="NumPy file of 64x64 RGB frames")
+        parser.add_argument('--interval', type=int, default=1)
+        parser.add_argument('--one-shot', action='store_true')
+        parser.add_argument(
+            '--dither-bits',
+            type=int,
+            default=0,
+            help="With --solid, temporally dither this many bits below the "
+                 "panels' 8, as an animation of 2**N banks the card cycles "
+                 "from --bank",
+        )
+    add_diagnostic_args(parser)
     args = parser.parse_args()
 
+    dither_bits = getattr(args, 'dither_bits', 0)
+    if dither_bits and args.bank + (1 << dither_bits) > BANKS:
+        parser.error(
+            f'--dither-bits {dither_bits} needs {1 << dither_bits} banks from '
+            f'--bank {args.bank}, and only {BANKS} fit')
+
+    run_with_diagnostics(run, args)
+
+
+def run(args):
+    if args.csr_csv is not None:
+        load_csrs(args.csr_csv)
+
+    if args.timing_profiles is not None:
+        load_profiles(args.timing_profiles)
+
+    if args.timing_profile is not None:
+        apply_profile(args.eth_ip, args.timing_profile, enable=not args.disable)
+        return
+
+    if args.discover or args.inventory is not None:
+        cards = discover(args.broadcast, args.timeout)
+        for card in cards:
+            print(
+                f'{card["ip"]:15} {card["mac"]} '
+                f'{"enabled " if card["enabled"] else "disabled"} '
+                f'addr {card["base_addr"]:#08x} frames {card["frames"]} '
+                f'underruns {card["underruns"]}  {card["ident"]}'
+            )
+        print(f'{len(cards)} cards')
+        if args.inventory is not None:
+            with open(args.inventory, 'w') as f:
+                json.dump(cards, f, indent=2)
+        return
+
+    if args.status:
+        status = read_status(args.eth_ip)
+        for name, value in status.items():
+            print(f'{name}: {value}')
+        if status['frame_period']:
+            print(f'refresh: {args.sys_clk_freq / status["frame_period"]:.1f}Hz')
+        return
+
+    if args.vsync:
+        listener = VsyncListener(args.eth_ip)
+        try:
+            while True:
+                events, frame, addr = listener.wait()
+                print(f'events: {events} frame: {frame} addr: {addr:#x}')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+        return
+
+    if args.join is not None:
+        set_multicast_group(args.eth_ip, args.join)
+        return
+
+    if args.sync_clock:
+        clock = ClockSync(args.eth_ip, args.sys_clk_freq)
+        print(f'clock offset: {clock.sync() / 1e3:.1f} us')
+        clock.close()
+        return
+
+    if args.copy_bank is not None:
+        copy_bank(args.eth_ip, args.copy_bank, args.bank)
+        wait_blit(args.eth_ip)
+
+    if args.stop_animation:
+        stop_animation(args.eth_ip)
+
+    if args.stop_pattern:
+        stop_pattern(args.eth_ip)
+
+    if args.pattern is not None:
+        show_pattern(
+            args.eth_ip,
+            args.pattern,
+            color=int(args.color, 0),
+            bank=args.bank,
+            width=args.bar_width,
+            continuous=args.continuous,
+        )
+        if args.continuous:
+            if args.enable:
+                poke(args.eth_ip, 'hub75_controller_enable', 1)
+            return
+        wait_pattern(args.eth_ip)
+
+    if np is not None and args.animation is not None:
+        frames = np.load(args.animation).reshape((-1, 64, 64, 3))
+        upload_animation(
+            args.eth_ip,
+            (process_image(im) for im in frames),
+            first_bank=args.bank,
+            interval=args.interval,
+            loop=not args.one_shot,
+        )
+        if args.enable:
+            poke(args.eth_ip, lookup_csr('hub75_controller_enable'), 1)
+        return
+
     if args.reset:
         poke(args.eth_ip, lookup_csr('ctrl_reset'), 1)
         time.sleep(4)
@@ -131,6 +1165,12 @@ def main():
             (rgb >> 8) & 0xff,
             rgb & 0xff,
         ]
+        if args.dither_bits:
+            dither = TemporalDither(64, frac_bits=args.dither_bits)
+            upload_animation(args.eth_ip, dither.cycle(im), first_bank=args.bank)
+            if args.enable:
+                poke(args.eth_ip, 'hub75_controller_enable', 1)
+            return
         im = process_image(im)
         draw_all_panels(args.eth_ip, im, args.bank)
 
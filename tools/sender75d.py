@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+A long running sender, which owns the network for all cards on a host.
+
+Producers write frames into a shared memory ring per card (see
+frame_ring.py), and this does the gamma, packing, pacing and bank
+swapping. For example, from a producer:
+
+    from frame_ring import FrameRing
+    ring = FrameRing.attach('192.168.0.39')
+    slot = ring.reserve()
+    slot[:] = rgb_bytes    # or render straight into slot
+    ring.commit()
+
+With --layout, producers write an image of the whole wall instead, and
+it is mapped to the panels as described in wall_layout.py.
+'''
+
+import argparse
+import socket
+import time
+
+import numpy as np
+
+from frame_ring import FrameRing
+from wall_layout import WallLayout
+from temporal_dither import TemporalDither, gamma_table
+from sender75 import (
+    BANK_SIZE, WIRE_FORMATS, WIRE_RGB888, add_diagnostic_args, apply_profile,
+    draw_bank, load_csrs, load_profiles, metrics, peek, poke, register_map,
+    run_with_diagnostics, show_bank,
+)
+
+
+class Card:
+    def __init__(self, eth_ip, ring, banks=(0, 1), gamma=2.5,
+            scales=(1, 1, 1), max_fps=None, wire_format=WIRE_RGB888,
+            layout=None, jumbo=False, dither_bits=0):
+        self.eth_ip = eth_ip
+        self.wire_format = wire_format
+        self.jumbo = jumbo
+        self.ring = ring
+        self.layout = layout
+        self.banks = banks
+        self.idx = 1
+        self.min_interval = 1 / max_fps if max_fps else 0
+        self.last_swap = 0
+        # The address last swapped to, until the display is showing it.
+        self.showing = None
+
+        self.table = gamma_table(gamma, scales)
+        self.identity = (self.table == np.arange(256)).all()
+        if layout is not None:
+            size = len(layout.index)
+        else:
+            size = ring.height * ring.width * 3
+        self.out = np.empty((size // 3, 3), dtype=np.uint8)
+
+        self.dither = None
+        self.held_frame = False
+        if dither_bits:
+            self.dither = TemporalDither(size // (64*3), 64, gamma, scales, dither_bits)
+            self.held = np.empty(size, dtype=np.uint8)
+
+        self.sock = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+
+    def poll(self, now):
+        '''
+        Sends the newest frame, if there is one and it is time to. When
+        dithering, the last frame is sent again if there is no new one.
+        '''
+        if now - self.last_swap < self.min_interval:
+            return False
+        pending = self.ring.pending()
+        if not pending and not self.held_frame:
+            return False
+        if not self.swapped():
+            return False
+
+        start = time.perf_counter()
+        data = None
+        if pending:
+            # Only the newest frame is worth sending.
+            if pending > 1:
+                self.ring.release(pending - 1)
+                metrics.count('frames_dropped_total', pending - 1, card=self.eth_ip)
+
+            slot = self.ring.slot(self.ring.read_seq)
+            # Without a layout or gamma, straight from shared memory to the
+            # socket.
+            data = slot
+            if self.layout is not None:
+                with metrics.timer('layout_seconds'):
+                    data = self.layout.map(slot)
+
+        if self.dither is not None:
+            # The frame is kept, as each one sent shows a step of the
+            # dither and the average is what is seen.
+            if data is not None:
+                self.held[:] = np.frombuffer(data, dtype=np.uint8)
+                self.held_frame = True
+                data = slot = None
+                self.ring.release()
+                pending = 0
+            with metrics.timer('dither_seconds'):
+                data = self.dither.frame(self.held)
+        elif not self.identity:
+            with metrics.timer('process_image_seconds'):
+                im = np.frombuffer(data, dtype=np.uint8).reshape(self.out.shape)
+                for c in range(3):
+                    np.take(self.table[c], im[..., c], out=self.out[..., c], mode='clip')
+            data = self.out
+
+        bank = self.banks[self.idx]
+        draw_bank(self.eth_ip, data, bank, self.sock, self.wire_format, self.jumbo)
+        if pending:
+            data = slot = None
+            self.ring.release()
+
+        show_bank(self.eth_ip, bank)
+        self.showing = bank*BANK_SIZE
+        metrics.count('frames_total', card=self.eth_ip)
+        metrics.observe('frame_seconds', time.perf_counter() - start, card=self.eth_ip)
+        self.idx ^= 1
+        self.last_swap = now
+        return True
+
+    def swapped(self):
+        '''
+        Whether the display has moved on to the bank last swapped to, so
+        the other one can be drawn into. The card takes a new base address
+        at the start of a frame, and until then keeps showing the old one.
+        Builds without the frame_addr register are not waited for.
+        '''
+        if self.showing is None:
+            return True
+        if 'hub75_controller_frame_addr' not in register_map(self.eth_ip):
+            return True
+        try:
+            frame_addr, = peek(self.eth_ip, 'hub75_controller_frame_addr', timeout=0.1)
+        except socket.timeout:
+            return False
+        if frame_addr != self.showing:
+            return False
+        self.showing = None
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--card",
+        action="append",
+        required=True,
+        help="IP address of a card, can be given many times",
+    )
+    parser.add_argument('--panels', type=int, default=16)
+    parser.add_argument(
+        '--layout',
+        help="A wall description, see wall_layout.py, to take whole wall "
+             "images instead of stacked panels",
+    )
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument(
+        '--ring-mode',
+        type=lambda value: int(value, 8),
+        default=0o600,
+        help="File mode of the frame rings, in octal, e.g. 660 for "
+             "producers in the same group",
+    )
+    parser.add_argument('--gamma', type=float, default=2.5)
+    parser.add_argument('--max-fps', type=float)
+    parser.add_argument('--banks', default='0,1', help="The two banks to swap between")
+    parser.add_argument('--csr-csv', help="CSR map of the gateware build")
+    parser.add_argument(
+        '--card-csr-csv',
+        action='append',
+        default=[],
+        metavar='IP=CSV',
+        help="CSR map of the build one card runs, when it differs from "
+             "--csr-csv, can be given many times",
+    )
+    parser.add_argument('--enable', action='store_true')
+    parser.add_argument(
+        '--timing-profile',
+        help="Set every card's display timing from a named profile, and "
+             "enable it, at start",
+    )
+    parser.add_argument('--timing-profiles', help="JSON file of more timing profiles")
+    parser.add_argument(
+        '--wire-format',
+        default='rgb888',
+        choices=WIRE_FORMATS.keys(),
+        help="Pixel format on the network, the card expands it to RGB888",
+    )
+    parser.add_argument(
+        '--jumbo',
+        action='store_true',
+        help="Send ~8.5KB datagrams, for cards built with --eth-jumbo on a "
+             "network with a 9000 byte MTU",
+    )
+    parser.add_argument(
+        '--dither-bits',
+        type=int,
+        default=0,
+        help="Temporally dither with this many bits below the panels' 8, "
+             "sending frames at --max-fps (default 60) even when none are new",
+    )
+    add_diagnostic_args(parser)
+    parser.add_argument(
+        '--metrics-interval',
+        type=float,
+        default=10,
+        help="Seconds between writes of the --metrics file",
+    )
+    args = parser.parse_args()
+
+    run_with_diagnostics(run, args)
+
+
+def run(args):
+    if args.csr_csv is not None:
+        load_csrs(args.csr_csv)
+    for card_csv in args.card_csr_csv:
+        eth_ip, csv_file = card_csv.split('=', 1)
+        load_csrs(csv_file, eth_ip)
+    if args.timing_profiles is not None:
+        load_profiles(args.timing_profiles)
+
+    max_fps = args.max_fps
+    if args.dither_bits and not max_fps:
+        max_fps = 60
+
+    banks = tuple(int(bank) for bank in args.banks.split(','))
+    if args.layout is not None:
+        layout = WallLayout.load(args.layout)
+        width, height = layout.width, layout.height
+    else:
+        layout = None
+        width, height = 64, 64*args.panels
+
+    cards = [
+        Card(
+            eth_ip,
+            FrameRing.create(
+                eth_ip, width=width, height=height, slot_count=args.slots,
+                mode=args.ring_mode,
+            ),
+            banks=banks,
+            gamma=args.gamma,
+            max_fps=max_fps,
+            wire_format=WIRE_FORMATS[args.wire_format],
+            layout=layout,
+            jumbo=args.jumbo,
+            dither_bits=args.dither_bits,
+        )
+        for eth_ip in args.card
+    ]
+
+    # A profile writes enable too, so each card takes one datagram.
+    if args.timing_profile is not None:
+        for card in cards:
+            apply_profile(card.eth_ip, args.timing_profile)
+    elif args.enable:
+        for card in cards:
+            poke(card.eth_ip, 'hub75_controller_enable', 1)
+
+    next_metrics = time.monotonic() + args.metrics_interval
+    try:
+        while True:
+            now = time.monotonic()
+            busy = False
+            for card in cards:
+                busy |= card.poll(now)
+            if not busy:
+                time.sleep(0.001)
+            if args.metrics and now > next_metrics:
+                metrics.write(args.metrics)
+                next_metrics = now + args.metrics_interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for card in cards:
+            card.ring.unlink()
+            card.ring.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Temporal dithering, to show more levels than the panels' 8 bit planes.
+
+After gamma, the dark end of the 8 bit range is only a handful of levels.
+TemporalDither keeps each subpixel with frac_bits more bits, and sends 8
+bit frames whose average over 2**frac_bits frames is that value: what is
+left over below the 8 bit level is carried into the next frame, so it is
+never lost. Neighbouring pixels start at different points of the cycle,
+from a 4x4 Bayer matrix, so they do not all step up together.
+
+A still image dithers to a cycle of 2**frac_bits frames that repeats
+exactly, so it can be uploaded with upload_animation() in sender75.py
+and played by the card with no further traffic.
+
+Everything is preallocated, and a frame is a handful of vectorized
+operations over the whole bank.
+'''
+
+import numpy as np
+
+
+BAYER_4X4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+])
+
+
+def gamma_table(gamma=2.5, scales=(1, 1, 1), frac_bits=0):
+    '''
+    The same mapping as process_image in sender75.py, as a 3x256 lookup
+    table. With frac_bits the values are kept in 1/2**frac_bits steps of
+    the 8 bit levels, as uint16, and otherwise truncated to uint8 as
+    process_image does.
+    '''
+    values = np.arange(256)[None, :] * np.array(scales, dtype=float)[:, None]
+    if gamma != 1:
+        values = ((values / 255) ** gamma) * 255
+    values = np.clip(values, 0, 255)
+    if not frac_bits:
+        return values.astype(np.uint8)
+    return np.round(values * (1 << frac_bits)).astype(np.uint16)
+
+
+class TemporalDither:
+    def __init__(self, height, width=64, gamma=2.5, scales=(1, 1, 1), frac_bits=4):
+        # The sum of a value and what was carried has to fit 16 bits.
+        if not 1 <= frac_bits <= 8:
+            raise ValueError('frac_bits must be 1 to 8')
+
+        self.frac_bits = frac_bits
+        self.mask = (1 << frac_bits) - 1
+        self.size = height * width * 3
+
+        # One table for the three channels, indexed by value + 256*channel.
+        self.table = gamma_table(gamma, scales, frac_bits).reshape(-1)
+        self.offsets = np.tile(np.arange(3, dtype=np.uint16) * 256, height * width)
+
+        phase = np.tile(BAYER_4X4, (height // 4 + 1, width // 4 + 1))[:height, :width]
+        phase = (phase << frac_bits) >> 4
+        self.carry = np.repeat(phase.reshape(-1), 3).astype(np.uint16)
+
+        self.index = np.empty(self.size, dtype=np.uint16)
+        self.high = np.empty(self.size, dtype=np.uint16)
+        self.out = np.empty(self.size, dtype=np.uint8)
+
+    def frame(self, im):
+        '''
+        Returns the next 8 bit frame for an RGB image of height x width,
+        as flat bytes.
+
+        The result is reused by the next call.
+        '''
+        flat = np.asarray(im, dtype=np.uint8).reshape(-1)
+        if len(flat) != self.size:
+            raise ValueError(f'expected {self.size // 3} RGB pixels')
+
+        np.add(flat, self.offsets, out=self.index)
+        np.take(self.table, self.index, out=self.high, mode='clip')
+        np.add(self.carry, self.high, out=self.carry)
+        np.right_shift(self.carry, self.frac_bits, out=self.high)
+        np.bitwise_and(self.carry, self.mask, out=self.carry)
+        np.copyto(self.out, self.high, casting='unsafe')
+        return self.out
+
+    def cycle(self, im):
+        '''The 2**frac_bits frames that average to a still image.'''
+        return [self.frame(im).copy() for _ in range(1 << self.frac_bits)]
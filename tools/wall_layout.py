@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: 2021 Jim Bailey <dgym.bailey@gmail.com>
+# SPDX-License-Identifier: MIT
+
+'''
+Maps an image of a whole wall to the panels of a bank, as laid out in DRAM.
+
+A wall is described by where each panel sits in the image, how it is
+mounted and where it is in the chain, e.g. as JSON:
+
+    {
+        "width": 256,
+        "height": 128,
+        "panels": [
+            {"chain": 0, "x": 0, "y": 0},
+            {"chain": 1, "x": 64, "y": 0, "rotation": 180, "mirror": true},
+            ...
+        ]
+    }
+
+rotation is how far the panel is turned clockwise as mounted, in steps of
+90 degrees, and mirror reverses its columns. The chain indices must be
+0 to one less than the number of panels, and are the panel positions in
+the bank.
+
+The layout is compiled once into a gather index, so mapping a frame is a
+single np.take, however the panels are arranged.
+'''
+
+import functools
+import json
+from collections import namedtuple
+
+import numpy as np
+
+
+PANEL_SIZE = 64
+
+Panel = namedtuple('Panel', 'chain x y rotation mirror', defaults=(0, False))
+
+
+@functools.lru_cache(maxsize=16)
+def compile_layout(width, height, panels):
+    '''
+    Returns the byte offsets into a width x height RGB image for each byte
+    of the panels, in chain order.
+
+    panels is a tuple of Panel, so compiled layouts can be cached.
+    '''
+    if sorted(p.chain for p in panels) != list(range(len(panels))):
+        raise ValueError('panel chain indices must be 0 to %d' % (len(panels) - 1))
+
+    rows, columns = np.mgrid[0:PANEL_SIZE, 0:PANEL_SIZE]
+    index = np.empty((len(panels), PANEL_SIZE, PANEL_SIZE), dtype=np.intp)
+
+    for p in panels:
+        if p.rotation % 90:
+            raise ValueError(f'panel {p.chain}: rotation must be a multiple of 90')
+        if not (0 <= p.x <= width - PANEL_SIZE and 0 <= p.y <= height - PANEL_SIZE):
+            raise ValueError(f'panel {p.chain} is outside the {width}x{height} wall')
+
+        # The pixel of the wall under each pixel of the panel area, then
+        # turned back the way the panel was turned.
+        pixels = (p.y + rows) * width + (p.x + columns)
+        pixels = np.rot90(pixels, (p.rotation // 90) % 4)
+        if p.mirror:
+            pixels = pixels[:, ::-1]
+        index[p.chain] = pixels
+
+    index = index[..., None] * 3 + np.arange(3)
+    index = index.reshape(-1)
+    index.flags.writeable = False
+    return index
+
+
+def serpentine(columns, rows, x=0, y=0, flip_odd_rows=True):
+    '''
+    Panels in a grid, chained left to right along the first row, right to
+    left along the next and so on.
+
+    With flip_odd_rows, the panels on the way back are upside down, as
+    when the chain cable is kept short.
+    '''
+    panels = []
+    for row in range(rows):
+        order = range(columns) if row % 2 == 0 else reversed(range(columns))
+        flipped = flip_odd_rows and row % 2 == 1
+        for column in order:
+            panels.append(Panel(
+                chain=len(panels),
+                x=x + column * PANEL_SIZE,
+                y=y + row * PANEL_SIZE,
+                rotation=180 if flipped else 0,
+            ))
+    return panels
+
+
+class WallLayout:
+    def __init__(self, width, height, panels):
+        self.width = width
+        self.height = height
+        self.panels = tuple(Panel(*p) for p in panels)
+        self.index = compile_layout(width, height, self.panels)
+        self.out = np.empty(len(self.index), dtype=np.uint8)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            desc = json.load(f)
+        return cls(desc['width'], desc['height'], [
+            Panel(
+                chain=p['chain'],
+                x=p['x'],
+                y=p['y'],
+                rotation=p.get('rotation', 0),
+                mirror=p.get('mirror', False),
+            )
+            for p in desc['panels']
+        ])
+
+    def map(self, im):
+        '''
+        Returns the bank data for a height x width x 3 image, or the same
+        bytes flat.
+
+        The result is reused by the next call.
+        '''
+        flat = np.asarray(im, dtype=np.uint8).reshape(-1)
+        if len(flat) != self.width * self.height * 3:
+            raise ValueError(f'expected a {self.width}x{self.height} RGB image')
+        return np.take(flat, self.index, out=self.out)